@@ -0,0 +1,152 @@
+"""
+Artifact index at scale: session timelines and keyword search over
+--turns synthetic utterances spread across --sessions sessions.
+
+The rows go straight into a scratch database through the index's batch
+writer (the path live turns take). Then --files of them are also written
+out as data/ artifact files, to time the backfill command and the old way
+of building a timeline (glob the prompts, open every file, keep the
+session's). Reported: insert rate, backfill rate, and p50/p95 for
+
+  timeline        newest page (50) of a random session
+  timeline deep   the page after a cursor halfway through a session
+  search          2 keywords (Zipf-distributed, like real text) across every session
+  search common   2 of the most frequent words (matches most rows: worst case)
+  search session  2 keywords, narrowed to one session
+  glob timeline   the file-scan baseline, on the --files subset only
+
+    python bench/artifact_index.py --turns 100000 --sessions 1000 --files 5000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+# src/ first: this script shares its name with src/artifact_index.py
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from artifact_index import COLUMNS, ArtifactIndex  # noqa: E402
+from load_driver import percentiles  # noqa: E402
+
+TOPICS = ("kafka migration latency outage postgres replication team leadership deadline incident "
+          "rollback kubernetes cache throughput python java design review mentoring conflict customer "
+          "metrics alerting budget roadmap hiring testing security compliance streaming batch").split()
+# Zipf-like word frequencies, as in real transcripts: a few very common words, a long tail
+VOCAB = TOPICS + [f"w{i}" for i in range(5000)]
+WEIGHTS = [1.0 / (rank + 10) for rank in range(len(VOCAB))]
+
+
+def sentence(rng, n):
+    return " ".join(rng.choices(VOCAB, WEIGHTS, k=n))
+
+
+def keywords(rng):
+    return " ".join(rng.choices(VOCAB, WEIGHTS, k=2))
+
+
+def make_turns(n, sessions, rng):
+    start = 1735689600  # 2025-01-01
+    for i in range(n):
+        t = time.gmtime(start + i * 7)
+        slug = time.strftime("%Y%m%d_%H%M%S", t)
+        uid = f"{slug}_{i:032x}"
+        yield {"uid": uid, "session_id": f"s{rng.randrange(sessions)}", "ts": time.strftime("%Y-%m-%d %H:%M:%S", t),
+               "source": "ws", "transcript": "Tell me about " + sentence(rng, 8),
+               "response": sentence(rng, 120), "recording": f"data/recordings/{uid}.wav",
+               "transcript_file": f"data/transcripts/{uid}.txt", "response_file": f"data/responses/{uid}.txt",
+               "prompt_file": f"data/prompts/{uid}.json"}
+
+
+def timed(fn, runs):
+    out = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - start)
+    return percentiles(out)
+
+
+def glob_timeline(data_dir, session_id):
+    """What finding a session's turns took before the index."""
+    turns = []
+    prompts = os.path.join(data_dir, "prompts")
+    for name in os.listdir(prompts):
+        with open(os.path.join(prompts, name), encoding="utf-8") as f:
+            p = json.load(f)
+        if p.get("session_id") == session_id:
+            turns.append((name, p))
+    turns.sort(reverse=True)
+    return turns[:50]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=100000)
+    ap.add_argument("--sessions", type=int, default=1000)
+    ap.add_argument("--files", type=int, default=5000, help="turns also written as files for backfill/glob")
+    ap.add_argument("--runs", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+    rng = random.Random(args.seed)
+    work = tempfile.mkdtemp(prefix="agent_bob_index_")
+
+    index = ArtifactIndex(os.path.join(work, "artifacts.db"))
+    turns = list(make_turns(args.turns, args.sessions, rng))
+    start = time.perf_counter()
+    for turn in turns:
+        index.record(**turn)
+    index.flush()
+    insert_s = time.perf_counter() - start
+    print(f"{args.turns} turns indexed in {insert_s:.1f} s ({args.turns / insert_s:.0f}/s, "
+          f"{index.batches} batches), fts={index.fts}")
+
+    sessions = [f"s{i}" for i in range(args.sessions)]
+    cursors = {}
+    for s in sessions[:50]:
+        page = index.timeline(s, limit=10 ** 6)
+        cursors[s] = page[len(page) // 2]["uid"] if page else None
+    results = {
+        "timeline": timed(lambda: index.timeline(rng.choice(sessions)), args.runs),
+        "timeline deep": timed(lambda: index.timeline((s := rng.choice(list(cursors))), before=cursors[s]),
+                               args.runs),
+        "search": timed(lambda: index.search(keywords(rng)), args.runs),
+        "search common": timed(lambda: index.search(" ".join(rng.sample(TOPICS[:5], 2))), args.runs),
+        "search session": timed(lambda: index.search(keywords(rng), session_id=rng.choice(sessions)), args.runs),
+    }
+
+    # File-based baseline and backfill on a subset
+    data_dir = os.path.join(work, "data")
+    for sub in ("prompts", "transcripts", "responses"):
+        os.makedirs(os.path.join(data_dir, sub))
+    for turn in turns[:args.files]:
+        uid = turn["uid"]
+        with open(os.path.join(data_dir, "prompts", f"{uid}.json"), "w", encoding="utf-8") as f:
+            json.dump({"timestamp": turn["ts"], "session_id": turn["session_id"],
+                       "transcript": turn["transcript"], "prompt": "..."}, f)
+        with open(os.path.join(data_dir, "transcripts", f"{uid}.txt"), "w", encoding="utf-8") as f:
+            f.write(turn["transcript"])
+        with open(os.path.join(data_dir, "responses", f"{uid}.txt"), "w", encoding="utf-8") as f:
+            f.write(turn["response"])
+    if args.files:
+        results["glob timeline"] = timed(lambda: glob_timeline(data_dir, rng.choice(sessions)), 5)
+        fresh = ArtifactIndex(os.path.join(work, "backfill.db"))
+        start = time.perf_counter()
+        added = fresh.backfill(data_dir)
+        backfill_s = time.perf_counter() - start
+        fresh.close()
+        print(f"backfill: {added} turns from {args.files} files in {backfill_s:.1f} s "
+              f"({added / backfill_s:.0f}/s)")
+
+    for name, p in results.items():
+        scope = f" ({args.files} files)" if name == "glob timeline" else ""
+        print(f"{name:<15} p50 {p.get('p50_ms')} ms  p95 {p.get('p95_ms')} ms{scope}")
+    print(f"database: {os.path.getsize(index.path) / 1e6:.0f} MB ({len(COLUMNS)} columns + FTS)")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
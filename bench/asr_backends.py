@@ -0,0 +1,98 @@
+"""
+Real-time factor and latency of the ASR backends.
+
+Each WAV file (or --synthetic N generated question) is transcribed once
+per backend, one at a time, then again with --concurrency clients at once
+(as several sessions finishing utterances together would); the local
+backend batches those concurrent requests. Reported per backend and phase:
+latency percentiles, RTF (processing seconds per second of audio, per
+request) and throughput in audio seconds per wall second.
+
+    python bench/asr_backends.py --backends openai,local --concurrency 8 data/recordings/
+    OPENAI_BASE_URL=http://127.0.0.1:8011/v1 python bench/asr_backends.py --synthetic 4
+
+Backends are configured from the same AGENT_BOB_ASR_* variables as the
+app (e.g. AGENT_BOB_ASR_MODEL=tiny.en AGENT_BOB_ASR_COMPUTE_TYPE=int8).
+The first request of each backend (model load / connection setup) is a
+warm-up and not counted.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# src/ first: this script shares its name with src/asr_backends.py
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from artifact_writer import wav_bytes  # noqa: E402
+from asr_backends import build_backend  # noqa: E402
+from load_driver import load_questions, percentiles  # noqa: E402
+
+
+def timed(backend, wav, seconds):
+    start = time.perf_counter()
+    text = backend.transcribe(wav, "question.wav")
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed / seconds, text
+
+
+def phase(backend, clips, concurrency):
+    start = time.perf_counter()
+    if concurrency <= 1:
+        results = [timed(backend, wav, seconds) for wav, seconds in clips]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda c: timed(backend, *c), clips))
+    wall = time.perf_counter() - start
+    rtf = sorted(r[1] for r in results)
+    return {
+        "requests": len(results),
+        "latency": percentiles([r[0] for r in results]),
+        "rtf_p50": round(rtf[len(rtf) // 2], 3),
+        "rtf_max": round(rtf[-1], 3),
+        "audio_s_per_wall_s": round(sum(s for _, s in clips) / wall, 2),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("paths", nargs="*", help="WAV files or directories")
+    ap.add_argument("--synthetic", type=int, default=0)
+    ap.add_argument("--synthetic-seconds", type=float, default=3.0)
+    ap.add_argument("--backends", default="openai,local")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--repeat", type=int, default=2, help="passes over the clips per phase")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    questions = load_questions(args.paths, args.synthetic, args.synthetic_seconds)
+    clips = [(wav_bytes(pcm, rate), len(pcm) / 2 / rate) for rate, pcm in questions] * args.repeat
+
+    report = {}
+    for name in args.backends.split(","):
+        backend = build_backend(name)
+        backend.warm(background=False)
+        timed(backend, *clips[0])
+        report[name] = {
+            "sequential": phase(backend, clips, 1),
+            "concurrent": phase(backend, clips, args.concurrency),
+            "backend": backend.stats(),
+        }
+        backend.close()
+        for key in ("sequential", "concurrent"):
+            r = report[name][key]
+            print(f"{name:<7} {key:<11} p50 {r['latency'].get('p50_ms')} ms  p95 {r['latency'].get('p95_ms')} ms  "
+                  f"RTF p50 {r['rtf_p50']}  {r['audio_s_per_wall_s']} audio s/s")
+        if "mean_batch" in report[name]["backend"]:
+            print(f"{name:<7} mean batch {report[name]['backend']['mean_batch']}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Cost of keeping the UI's chat history current over one long session.
+
+After every answer the old client refetched /get_chat_history (the whole
+history, newest first); the current one gets the new turn pushed as a
+'history' event and only asks /chat_history?since=<cursor> after a gap or
+reconnect. For a session of --turns answers this reports, per strategy,
+server time and bytes per refresh early and late in the session, and the
+totals:
+
+  full      GET /get_chat_history after every turn
+  delta     GET /chat_history?since=<cursor> after every turn
+  revalid   the delta request repeated with If-None-Match (nothing new: 304)
+
+    python bench/chat_history.py --turns 500 --answer-chars 1500
+
+Runs the app in-process (Flask test client) in a scratch directory.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+os.chdir(tempfile.mkdtemp(prefix="agent_bob_history_"))
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+import app as agent_app  # noqa: E402
+from load_driver import percentiles  # noqa: E402
+
+SESSION = "bench-history"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=500)
+    ap.add_argument("--answer-chars", type=int, default=1500)
+    args = ap.parse_args()
+
+    client = agent_app.app.test_client()
+    headers = {"X-Session-Id": SESSION}
+    answer = ("I led the migration of our streaming pipeline. " * 64)[:args.answer_chars]
+    results = {name: {"ms": [], "bytes": []} for name in ("full", "delta", "revalid")}
+    cursor, etag = 0, None
+
+    for i in range(args.turns):
+        agent_app.append_chat_history(SESSION, f"2025-01-01 00:{i // 60:02d}:{i % 60:02d}",
+                                      f"Question {i}: tell me about a project?", answer)
+        for name in results:
+            if name == "full":
+                url, extra = "/get_chat_history", {}
+            elif name == "delta":
+                url, extra = f"/chat_history?since={cursor}", {}
+            else:
+                url, extra = f"/chat_history?since={cursor}", {"If-None-Match": etag}
+            start = time.perf_counter()
+            response = client.get(url, headers=dict(headers, **extra))
+            results[name]["ms"].append(time.perf_counter() - start)
+            results[name]["bytes"].append(len(response.data))
+            if name == "delta":
+                cursor, etag = response.get_json()["next"], response.headers["ETag"]
+
+    n = args.turns
+    print(f"{n} turns, {args.answer_chars}-char answers")
+    for name, r in results.items():
+        early, late = slice(0, max(1, n // 10)), slice(n - max(1, n // 10), n)
+        print(f"{name:<8} first 10%: {percentiles(r['ms'][early]).get('p50_ms')} ms "
+              f"{sum(r['bytes'][early]) // len(r['bytes'][early])} B   "
+              f"last 10%: {percentiles(r['ms'][late]).get('p50_ms')} ms "
+              f"{sum(r['bytes'][late]) // len(r['bytes'][late])} B   "
+              f"total {sum(r['ms']):.2f} s {sum(r['bytes']) / 1e6:.2f} MB")
+    agent_app.artifacts.close()
+
+
+if __name__ == "__main__":
+    main()
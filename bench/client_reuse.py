@@ -0,0 +1,69 @@
+"""
+Time-to-first-token: a fresh OpenAI client per call (old behaviour) versus
+the shared pooled client from src/openai_client.py.
+
+    python bench/client_reuse.py --base-url http://127.0.0.1:8001/v1 --calls 20
+
+Works against the real API (omit --base-url) or any OpenAI-compatible
+stand-in server.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import openai  # noqa: E402
+import openai_client  # noqa: E402
+
+
+def first_token_latency(client, model):
+    start = time.perf_counter()
+    stream = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": "Say hi."}],
+        stream=True,
+    )
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                return time.perf_counter() - start
+    finally:
+        stream.close()
+    return time.perf_counter() - start
+
+
+def summarize(label, samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+    print(f"{label:<18} median {statistics.median(samples) * 1000:8.1f} ms   "
+          f"p95 {p95 * 1000:8.1f} ms   n={len(samples)}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base-url", default=os.getenv("OPENAI_BASE_URL"))
+    ap.add_argument("--model", default="gpt-3.5-turbo")
+    ap.add_argument("--calls", type=int, default=20)
+    args = ap.parse_args()
+
+    api_key = os.getenv("OPENAI_API_KEY", "sk-bench")
+
+    per_call = []
+    for _ in range(args.calls):
+        client = openai.OpenAI(api_key=api_key, base_url=args.base_url)
+        per_call.append(first_token_latency(client, args.model))
+        client.close()
+
+    shared_client = openai_client.configure(api_key=api_key, base_url=args.base_url)
+    shared = [first_token_latency(shared_client, args.model) for _ in range(args.calls)]
+    openai_client.close_client()
+
+    summarize("client per call", per_call)
+    summarize("shared client", shared)
+
+
+if __name__ == "__main__":
+    main()
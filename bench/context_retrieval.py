@@ -0,0 +1,97 @@
+"""
+Prompt size (and optionally time to first token) with retrieval-selected
+context versus the full resume + job description in every prompt.
+
+    python bench/context_retrieval.py --resume resume.txt --jd jd.txt \
+        --questions questions.txt --base-url http://127.0.0.1:8001/v1
+
+`--questions` is one interviewer question per line. Without --base-url only
+prompt tokens are compared; with it each prompt is also streamed once per
+mode and the time to first token recorded (real API or a stand-in server).
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import app  # noqa: E402
+import openai_client  # noqa: E402
+from context_retrieval import estimate_tokens  # noqa: E402
+from llm import LLMStream  # noqa: E402
+
+DEFAULT_QUESTIONS = [
+    "Tell me about yourself.",
+    "Walk me through a project where you improved performance.",
+    "How have you used Kubernetes in production?",
+    "What experience do you have with data pipelines?",
+    "Can you elaborate on that?",
+    "Why do you want this role?",
+]
+
+
+def first_token_latency(prompt):
+    start = time.perf_counter()
+    stream = LLMStream(prompt)
+    try:
+        for _ in stream:
+            return time.perf_counter() - start
+    finally:
+        stream.cancel()
+    return time.perf_counter() - start
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--resume", required=True)
+    ap.add_argument("--jd", required=True)
+    ap.add_argument("--questions")
+    ap.add_argument("--top-k", type=int, default=app.CONTEXT_TOP_K)
+    ap.add_argument("--budget", type=int, default=app.CONTEXT_TOKEN_BUDGET)
+    ap.add_argument("--base-url", default=None)
+    args = ap.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        questions = [q.strip() for q in read(args.questions).splitlines() if q.strip()]
+
+    session_id = "bench-context-retrieval"
+    ctx = app.context_cache.put(session_id, read(args.resume), read(args.jd))
+    print(f"context: {ctx.prefix_tokens} tokens in full, {len(ctx.index.chunks)} chunks")
+
+    if args.base_url:
+        openai_client.configure(api_key=os.getenv("OPENAI_API_KEY", "sk-bench"), base_url=args.base_url)
+
+    rows = []
+    for q in questions:
+        full = app.build_messages_text(session_id, q, mode="full")
+        sel = app.build_messages_text(session_id, q, mode="retrieval", top_k=args.top_k, budget=args.budget)
+        row = {"q": q, "full": estimate_tokens(full), "sel": estimate_tokens(sel)}
+        if args.base_url:
+            row["ttft_full"] = first_token_latency(full)
+            row["ttft_sel"] = first_token_latency(sel)
+        rows.append(row)
+        line = f"{row['full']:6d} -> {row['sel']:6d} tokens ({100 * (1 - row['sel'] / row['full']):5.1f}% smaller)"
+        if args.base_url:
+            line += f"   ttft {row['ttft_full'] * 1000:7.1f} -> {row['ttft_sel'] * 1000:7.1f} ms"
+        print(f"{line}   {q[:50]}")
+
+    full_total = sum(r["full"] for r in rows)
+    sel_total = sum(r["sel"] for r in rows)
+    print(f"\nprompt tokens: full {full_total}, retrieval {sel_total} "
+          f"({100 * (1 - sel_total / full_total):.1f}% fewer)")
+    if args.base_url:
+        print(f"median ttft: full {statistics.median(r['ttft_full'] for r in rows) * 1000:.1f} ms, "
+              f"retrieval {statistics.median(r['ttft_sel'] for r in rows) * 1000:.1f} ms")
+    openai_client.close_client()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+End-of-turn latency on a labeled corpus: the fixed silence timer against
+AdaptiveEndpointer (learned pauses plus transcript cues).
+
+A corpus is a directory of WAV files (16-bit mono), each with a JSON
+sidecar of the same name listing its turns and the speech inside them:
+
+    {"turns": [{"chunks": [[0.50, 1.40, "So tell me about"],
+                           [1.85, 3.10, "the last outage you handled?"]]}, ...]}
+
+Times are seconds; the gaps between a turn's chunks are within-turn
+pauses, the gaps between turns are where an answer belongs. Each file is
+one speaker (one /ws-audio connection, one endpointer). --synthetic N
+builds a corpus of N speakers from bench/load_driver.synth_question, each
+with their own pause habits, and --write saves it.
+
+The /ws-audio segmentation (VADFrontEnd + UtteranceSegmenter, the app's
+defaults) runs over every file twice. ASR is an oracle: the partial
+transcript is the label text of the chunks before the current silence,
+available --asr-ms after the pause cut (as IncrementalTranscriber's window
+would be). Reported:
+
+  endpoint delay   from the end of a turn's speech to the segment closing
+                   it (p50, p95)
+  false splits     turns closed early with the speaker not done (the app
+                   retracts and merges these; the answer start is wasted)
+  split            turns still sent as more than one segment (pauses
+                   past the fixed timer)
+
+    python bench/endpointer.py --synthetic 20
+    python bench/endpointer.py --corpus data/endpoint_corpus
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import wave
+
+import numpy as np
+
+# src/ first: this script shares its name with src/endpointer.py
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from load_driver import percentiles, synth_question  # noqa: E402
+from endpointer import AdaptiveEndpointer, EndpointStats  # noqa: E402
+from vad_frontend import VADFrontEnd, UtteranceSegmenter, SEG_IDLE, SEG_START, SEG_END  # noqa: E402
+
+RATE = 16000
+FRAME_MS = 30
+
+LEADS = ["So tell me about", "Walk me through", "And then", "When you designed", "Could you explain",
+         "Thinking about", "If you had to scale"]
+MIDDLES = ["the last outage you handled,", "how the consumers", "the way you partitioned", "your team and",
+           "the retry logic for", "what happened when the"]
+QUESTIONS = ["how would you do it differently?", "what did you learn from it?", "why did you choose Kafka?",
+             "how did you test that?", "which part was hardest?", "would that still work at ten times the load?",
+             "what was the trade-off, right?"]
+STATEMENTS = ["the cluster was running on Kubernetes.", "I want to understand your approach.",
+              "that's the part I'm curious about.", "we had the same problem last year."]
+
+
+def synth_speaker(turns, rng, seed):
+    """One speaker's stream and labels: a personal pause scale, 1-3 chunks per turn."""
+    scale = rng.uniform(0.2, 0.45)   # median within-turn pause (s)
+    parts, labels, t = [], [], 0.0
+
+    def add(pcm):
+        nonlocal t
+        parts.append(pcm)
+        t += len(pcm) / 2 / RATE
+
+    def silence(seconds):
+        return rng.normal(0, 30, int(seconds * RATE)).astype('<i2').tobytes()
+
+    add(silence(1.5))
+    for i in range(turns):
+        n = rng.choice([1, 2, 3], p=[0.4, 0.4, 0.2])
+        texts = ([rng.choice(LEADS)] + list(rng.choice(MIDDLES, n - 2)) if n > 1 else []) + [
+            rng.choice(QUESTIONS) if rng.random() < 0.7 else rng.choice(STATEMENTS)]
+        chunks = []
+        for k, text in enumerate(texts):
+            if k:
+                # Within-turn pause: log-normal around the speaker's scale, under the fixed timer
+                add(silence(min(0.9, scale * float(rng.lognormal(0, 0.35)))))
+            start = t
+            add(synth_question(rng.uniform(0.6, 0.35 * len(text.split()) + 0.6), RATE, seed=seed * 10000 + 10 * i + k))
+            chunks.append([round(start, 3), round(t, 3), text])
+        labels.append({"chunks": chunks})
+        add(silence(rng.uniform(2.5, 5.0)))     # the answer
+    return b"".join(parts), {"turns": labels}
+
+
+def load_corpus(path):
+    for wav_path in sorted(glob.glob(os.path.join(path, "*.wav"))):
+        with wave.open(wav_path, "rb") as w:
+            if w.getsampwidth() != 2 or w.getnchannels() != 1:
+                raise SystemExit(f"{wav_path}: need 16-bit mono")
+            rate, pcm = w.getframerate(), w.readframes(w.getnframes())
+        with open(os.path.splitext(wav_path)[0] + ".json") as f:
+            yield os.path.basename(wav_path), pcm, rate, json.load(f)
+
+
+def write_corpus(path, corpus):
+    os.makedirs(path, exist_ok=True)
+    for name, pcm, rate, labels in corpus:
+        base = os.path.join(path, os.path.splitext(name)[0])
+        with wave.open(base + ".wav", "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(rate)
+            w.writeframes(pcm)
+        with open(base + ".json", "w") as f:
+            json.dump(labels, f, indent=1)
+
+
+def oracle_text(chunks, start_s, silent_s):
+    """Label text of the speech between the utterance start and the current silence."""
+    return " ".join(text for a, b, text in chunks if b > start_s and b <= silent_s + 0.05)
+
+
+def run(pcm, rate, labels, endpointer, pause_ms, asr_ms, end_ms):
+    """Times (s) at which segments were closed, and those of early closes that were retracted."""
+    frontend = VADFrontEnd(rate, frame_ms=FRAME_MS, aggressiveness=2, hangover_ms=60)
+    seg = UtteranceSegmenter(frontend.frame_ms, preroll_ms=300, pause_ms=pause_ms, end_silence_ms=end_ms)
+    chunks = [c for turn in labels["turns"] for c in turn["chunks"]]
+    frame_s = frontend.frame_ms / 1000
+    ends, retracted = [], []
+    early_end = None
+    utt_start = 0.0
+    step = int(frontend.sample_rate * 0.02) * 2
+    if frontend.sample_rate != rate:
+        raise SystemExit(f"corpus rate {rate} Hz: use {frontend.sample_rate} Hz")
+    for i in range(0, len(pcm), step):
+        for frame, is_speech in frontend.feed(pcm[i:i + step]):
+            event = seg.push(frame, is_speech)
+            now = seg.frames_seen * frame_s
+            if event == SEG_IDLE:
+                continue
+            if endpointer is not None and seg.resumed_after:
+                endpointer.observe_pause(seg.resumed_after * frontend.frame_ms)
+            if event == SEG_START:
+                utt_start = seg.start_frame * frame_s
+                if early_end is not None:
+                    end_at, silent_from, early_start = early_end
+                    early_end = None
+                    if endpointer.resumed(int((seg.frames_seen - 1 - silent_from) * frontend.frame_ms)):
+                        # The app prepends the retracted audio: one utterance again
+                        retracted.append(end_at)
+                        utt_start = early_start
+                continue
+            if event == SEG_END:
+                if endpointer is not None:
+                    endpointer.ended(seg.silence_frames)
+                seg.take()
+                ends.append(now)
+            elif endpointer is not None and not is_speech:
+                silence_ms = seg.silence_frames * frontend.frame_ms
+                silent_s = now - silence_ms / 1000
+                settled = oracle_text(chunks, utt_start, silent_s) if silence_ms >= pause_ms + asr_ms else None
+                if endpointer.should_end(seg.silence_frames, settled):
+                    early_end = (now, seg.frames_seen - seg.silence_frames, utt_start)
+                    endpointer.ended(seg.silence_frames)
+                    seg.take()
+                    ends.append(now)
+    return ends, retracted
+
+
+def score(labels, ends, retracted):
+    turns = [(t["chunks"][0][0], t["chunks"][-1][1]) for t in labels["turns"]]
+    delays, split, false = [], 0, 0
+    for k, (start, stop) in enumerate(turns):
+        nxt = turns[k + 1][0] if k + 1 < len(turns) else float("inf")
+        inside = [e for e in ends if start < e < nxt]
+        closing = [e for e in inside if e >= stop]
+        if closing:
+            delays.append(closing[0] - stop)
+        split += any(e < stop and e not in retracted for e in inside)
+        false += any(start < e < stop for e in retracted)
+    return delays, split, false, len(turns)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--corpus", help="directory of WAV files with JSON turn labels")
+    src.add_argument("--synthetic", type=int, help="generate this many synthetic speakers")
+    ap.add_argument("--turns", type=int, default=40, help="turns per synthetic speaker")
+    ap.add_argument("--write", help="save the synthetic corpus here")
+    ap.add_argument("--end-silence-ms", type=int, default=1000)
+    ap.add_argument("--pause-ms", type=int, default=300)
+    ap.add_argument("--asr-ms", type=int, default=200, help="oracle partial transcript lag after a pause cut")
+    ap.add_argument("--floor-ms", type=int, default=500)
+    ap.add_argument("--cue-ms", type=int, default=500)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    if args.corpus:
+        corpus = list(load_corpus(args.corpus))
+    else:
+        rng = np.random.default_rng(args.seed)
+        corpus = [(f"speaker{s:03d}.wav", *synth_speaker(args.turns, rng, s)) for s in range(args.synthetic)]
+        corpus = [(name, pcm, RATE, labels) for name, pcm, labels in corpus]
+        if args.write:
+            write_corpus(args.write, corpus)
+    audio_s = sum(len(pcm) / 2 / rate for _, pcm, rate, _ in corpus)
+    print(f"{len(corpus)} files, {audio_s / 60:.1f} min of audio, "
+          f"{sum(len(labels['turns']) for *_, labels in corpus)} turns")
+
+    stats = EndpointStats()
+    for name in ("fixed", "adaptive"):
+        delays, split, false, turns = [], 0, 0, 0
+        for _, pcm, rate, labels in corpus:
+            endpointer = AdaptiveEndpointer(FRAME_MS, max_ms=args.end_silence_ms, floor_ms=args.floor_ms,
+                                            cue_ms=args.cue_ms, stats=stats) if name == "adaptive" else None
+            d, s, f, n = score(labels, *run(pcm, rate, labels, endpointer, args.pause_ms, args.asr_ms,
+                                            args.end_silence_ms))
+            delays += d
+            split, false, turns = split + s, false + f, turns + n
+        p = percentiles(delays)
+        print(f"{name:<9} endpoint delay p50 {p.get('p50_ms')} ms  p95 {p.get('p95_ms')} ms  "
+              f"false splits {false}/{turns} ({false / max(1, turns):.1%})  split {split}")
+    print(f"endpointer counters: {stats.as_dict()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Offline stand-in for the OpenAI endpoints the app uses.
+
+  POST /v1/audio/transcriptions   sleeps for the transcription delay, returns a transcript
+  POST /v1/chat/completions       streams (or returns) a canned answer at a fixed token rate
+  GET  /v1/models                 used by openai_client.prewarm()
+
+Delays are configurable so latency changes on our side can be measured
+without the network or the real API:
+
+    python bench/fake_openai.py --port 8011 --asr-delay 0.3 --asr-rtf 0.05 \
+        --ttft 0.25 --tokens-per-s 60 --tokens 120 --jitter 0.2
+
+--asr-rtf adds that many seconds per second of uploaded audio (estimated
+from the upload size at 16 kHz, 16-bit mono). --jitter scales every delay
+by a uniform random factor in [1 - j, 1 + j]. Each transcript is unique
+("question 17 ...") so the app's response cache does not hide the LLM.
+
+Failure injection, for the request scheduler:
+
+  --rpm N          more than N POSTs in a sliding minute get a 429 with
+                   retry-after-ms and x-ratelimit-* headers
+  --error-rate p   fraction of POSTs answered with a 503
+  --slow-rate p    fraction of POSTs whose delays are multiplied by
+  --slow-factor f  (a slow tail, for hedging)
+"""
+import argparse
+import collections
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("I led the migration of our streaming pipeline to Kafka and cut end to end latency "
+         "by forty percent while keeping the on call load flat ").split()
+
+
+class FakeOpenAI(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, args):
+        super().__init__(addr, Handler)
+        self.args = args
+        self.counter = itertools.count(1)
+        self.lock = threading.Lock()
+        self.requests = {"transcriptions": 0, "chat": 0, "rate_limited": 0, "errors": 0, "slow": 0,
+                         "chat_tokens": 0, "chat_cancelled": 0}
+        self.recent = collections.deque()   # POST times in the last minute
+
+    def delay(self, seconds, factor=1.0):
+        j = self.args.jitter
+        if seconds > 0:
+            time.sleep(factor * (seconds * random.uniform(1 - j, 1 + j) if j else seconds))
+
+    def admit(self):
+        """None to serve the request, or (status, headers) to refuse it."""
+        args = self.args
+        with self.lock:
+            if args.rpm:
+                now = time.monotonic()
+                while self.recent and now - self.recent[0] >= 60:
+                    self.recent.popleft()
+                if len(self.recent) >= args.rpm:
+                    self.requests["rate_limited"] += 1
+                    reset = 60 - (now - self.recent[0])
+                    return 429, {"retry-after-ms": str(int(reset * 1000)),
+                                 "x-ratelimit-limit-requests": str(args.rpm),
+                                 "x-ratelimit-remaining-requests": "0",
+                                 "x-ratelimit-reset-requests": f"{reset:.3f}s"}
+                self.recent.append(now)
+            if args.error_rate and random.random() < args.error_rate:
+                self.requests["errors"] += 1
+                return 503, {}
+        return None
+
+    def slowdown(self) -> float:
+        if self.args.slow_rate and random.random() < self.args.slow_rate:
+            self.count("slow")
+            return self.args.slow_factor
+        return 1.0
+
+    def count(self, kind):
+        with self.lock:
+            self.requests[kind] += 1
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *a):
+        pass
+
+    def _json(self, obj, status=200, headers=None):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n" % len(data) + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._json({"object": "list", "data": [{"id": "gpt-3.5-turbo", "object": "model",
+                                                    "created": 0, "owned_by": "bench"}]})
+        elif self.path == "/stats":
+            self._json(self.server.requests)
+        else:
+            self._json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        refused = self.server.admit()
+        if refused is not None:
+            status, headers = refused
+            message = "Rate limit reached" if status == 429 else "Service unavailable"
+            self._json({"error": {"message": message, "type": "bench", "code": None}}, status, headers)
+            return
+        if self.path.endswith("/audio/transcriptions"):
+            self.transcription(len(body))
+        elif self.path.endswith("/chat/completions"):
+            self.chat(json.loads(body or b"{}"))
+        else:
+            self._json({"error": "not found"}, 404)
+
+    def transcription(self, size):
+        server, args = self.server, self.server.args
+        server.count("transcriptions")
+        audio_s = size / (2 * 16000)
+        server.delay(args.asr_delay + args.asr_rtf * audio_s, server.slowdown())
+        n = next(server.counter)
+        self._json({"text": f"Question {n}: tell me about a project where you improved reliability."})
+
+    def chat(self, req):
+        server, args = self.server, self.server.args
+        server.count("chat")
+        tokens = [WORDS[i % len(WORDS)] + " " for i in range(args.tokens)]
+        server.delay(args.ttft, server.slowdown())
+        if not req.get("stream"):
+            self._json({"id": "bench", "object": "chat.completion", "created": 0, "model": req.get("model", "m"),
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": "".join(tokens)}}]})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        gap = 1.0 / args.tokens_per_s if args.tokens_per_s > 0 else 0.0
+        try:
+            for i, tok in enumerate(tokens):
+                if i:
+                    server.delay(gap)
+                chunk = {"id": "bench", "object": "chat.completion.chunk", "created": 0,
+                         "model": req.get("model", "m"),
+                         "choices": [{"index": 0, "delta": {"content": tok}, "finish_reason": None}]}
+                self._chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+                server.count("chat_tokens")
+            self._chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the stream (speculation miss, barge-in)
+            server.count("chat_cancelled")
+
+
+def build_parser():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8011)
+    ap.add_argument("--asr-delay", type=float, default=0.3, help="seconds per transcription request")
+    ap.add_argument("--asr-rtf", type=float, default=0.05, help="extra seconds per second of audio")
+    ap.add_argument("--ttft", type=float, default=0.25, help="seconds before the first token")
+    ap.add_argument("--tokens-per-s", type=float, default=60.0)
+    ap.add_argument("--tokens", type=int, default=120, help="tokens per answer")
+    ap.add_argument("--jitter", type=float, default=0.2)
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--rpm", type=int, default=0, help="requests per minute before 429s (0 = no limit)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 503")
+    ap.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests that are slow")
+    ap.add_argument("--slow-factor", type=float, default=5.0, help="delay multiplier for slow requests")
+    return ap
+
+
+def serve(args):
+    if args.seed is not None:
+        random.seed(args.seed)
+    server = FakeOpenAI((args.host, args.port), args)
+    print(f"fake OpenAI on http://{args.host}:{args.port}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    serve(build_parser().parse_args())
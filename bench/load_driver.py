@@ -0,0 +1,333 @@
+"""
+Replay driver: many concurrent interview sessions against a running app.
+
+Each session starts with /start-session, joins its Socket.IO room (polling
+transport, so only `requests` is needed) and then asks its questions, one
+WAV file per question:
+
+  ws       the WAV is streamed to /ws-audio in 20 ms chunks at real-time
+           pace, followed by silence until the answer completes (the
+           connection never goes quiet, like the browser capture client).
+           With barge_in the next question starts as soon as the answer's
+           first token arrives, so the app should cut that answer short
+  process  the driver waits the WAV's duration (the "recording") and then
+           POSTs it to /process
+
+Per answer it records time to first token and to `complete`, measured from
+the end of speech (the last WAV chunk sent), and token frames lost
+(frames announced in `complete` minus frames received). Chunks sent more
+than one chunk late count as late audio.
+
+    python bench/load_driver.py --url http://127.0.0.1:5000 --sessions 10 --mode ws data/recordings/
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import wave
+
+import numpy as np
+import requests
+import socketio
+from simple_websocket import Client as WSClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from artifact_writer import wav_bytes  # noqa: E402
+
+CHUNK_MS = 20
+
+
+def load_wav(path):
+    """(rate, 16-bit mono PCM bytes)."""
+    with wave.open(path, 'rb') as wf:
+        rate, channels, width = wf.getframerate(), wf.getnchannels(), wf.getsampwidth()
+        raw = wf.readframes(wf.getnframes())
+    if width != 2:
+        raise ValueError(f"{path}: only 16-bit PCM is supported")
+    x = np.frombuffer(raw, dtype='<i2')
+    if channels > 1:
+        x = x.reshape(-1, channels).mean(axis=1).astype('<i2')
+    return rate, x.tobytes()
+
+
+def synth_question(seconds: float, rate: int = 16000, seed: int = 0) -> bytes:
+    """Voiced, syllable-modulated harmonics that webrtcvad treats as speech."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    f0 = 120 + 20 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 12))
+    syllables = 0.55 + 0.45 * np.sin(2 * np.pi * 4.0 * t + rng.uniform(0, np.pi))
+    x = 6000 * voice * syllables + rng.normal(0, 200, len(t))
+    return np.clip(x, -32768, 32767).astype('<i2').tobytes()
+
+
+class Answer:
+    def __init__(self):
+        self.speech_end = None
+        self.first_token = None
+        self.complete = None
+        self.frames_received = 0
+        self.frames_announced = 0
+        self.interrupted = False
+        self.next_question_at = None   # barge-in: when the following question started
+        self.done = threading.Event()
+
+
+class SessionRun:
+    def __init__(self, url, questions, mode, index, answer_timeout=60.0, resume="", jd="", barge_in=False):
+        self.url = url.rstrip("/")
+        self.questions = questions        # list of (rate, pcm)
+        self.mode = mode
+        self.index = index
+        self.answer_timeout = answer_timeout
+        self.resume = resume or f"Candidate {index}: backend engineer, Kafka, Kubernetes, Python."
+        self.jd = jd or "Senior platform engineer for streaming data infrastructure."
+        self.http = requests.Session()
+        self.barge_in = barge_in
+        self.answers = []
+        # Answers are produced in order: `clear` starts the next one streaming, `complete` ends the oldest
+        self._streaming = -1
+        self._completed = 0
+        self.late_chunks = 0
+        self.chunks = 0
+        self.errors = []
+        self._lock = threading.Lock()
+
+    # --- Socket.IO -------------------------------------------------------
+
+    def _connect_socketio(self):
+        sio = socketio.Client(reconnection=False)
+        joined = threading.Event()
+
+        @sio.on('status')
+        def on_status(data):
+            if 'Joined session' in (data or {}).get('message', ''):
+                joined.set()
+
+        @sio.on('clear')
+        def on_clear(*_):
+            with self._lock:
+                self._streaming += 1
+
+        @sio.on('token')
+        def on_token(data):
+            with self._lock:
+                if not 0 <= self._streaming < len(self.answers):
+                    return
+                a = self.answers[self._streaming]
+                if a.first_token is None:
+                    a.first_token = time.perf_counter()
+                a.frames_received += 1
+
+        @sio.on('complete')
+        def on_complete(data):
+            with self._lock:
+                if self._completed >= len(self.answers):
+                    return
+                a = self.answers[self._completed]
+                self._completed += 1
+                a.complete = time.perf_counter()
+                a.frames_announced = (data or {}).get('frames', a.frames_received)
+                a.interrupted = bool((data or {}).get('interrupted'))
+                a.done.set()
+
+        sio.connect(self.url, transports=['polling'])
+        sio.emit('join', {'session_id': self.session_id})
+        joined.wait(10)
+        return sio
+
+    # --- Session ---------------------------------------------------------
+
+    def _begin_answer(self):
+        a = Answer()
+        with self._lock:
+            self.answers.append(a)
+        return a
+
+    def run(self):
+        r = self.http.post(f"{self.url}/start-session", json={"resume": self.resume, "job_description": self.jd})
+        r.raise_for_status()
+        self.session_id = r.json()["session_id"]
+        sio = self._connect_socketio()
+        try:
+            if self.mode == "ws":
+                self._run_ws()
+            else:
+                self._run_process()
+        except Exception as e:
+            self.errors.append(repr(e))
+        finally:
+            sio.disconnect()
+
+    def _send_paced(self, ws, pcm, rate, clock):
+        """Send pcm in CHUNK_MS chunks on the real-time schedule held in clock[0]."""
+        step = int(rate * CHUNK_MS / 1000) * 2
+        dt = CHUNK_MS / 1000
+        for i in range(0, len(pcm), step):
+            now = time.perf_counter()
+            if clock[0] > now:
+                time.sleep(clock[0] - now)
+            elif now - clock[0] > dt:
+                self.late_chunks += 1
+            ws.send(pcm[i:i + step])
+            self.chunks += 1
+            clock[0] += dt
+
+    def _run_ws(self):
+        ws_url = self.url.replace("http", "ws", 1) + "/ws-audio"
+        rate = self.questions[0][0]
+        ws = WSClient.connect(ws_url)
+        try:
+            ws.send(json.dumps({"session_id": self.session_id, "sample_rate": rate, "frame_ms": CHUNK_MS}))
+            silence = b"\0" * (int(rate * CHUNK_MS / 1000) * 2)
+            clock = [time.perf_counter()]
+            previous = None
+            for i, (q_rate, pcm) in enumerate(self.questions):
+                if q_rate != rate:
+                    raise ValueError("all WAVs of a /ws-audio run must share one sample rate")
+                a = self._begin_answer()
+                if previous is not None and self.barge_in:
+                    previous.next_question_at = time.perf_counter()
+                self._send_paced(ws, pcm, rate, clock)
+                a.speech_end = time.perf_counter()
+                barge = self.barge_in and i + 1 < len(self.questions)
+                # Keep the line alive with silence until the answer is complete (or, when
+                # barging in, until it has started)
+                deadline = a.speech_end + self.answer_timeout
+                while not (a.done.is_set() or (barge and a.first_token)) and time.perf_counter() < deadline:
+                    self._send_paced(ws, silence * 10, rate, clock)
+                if not barge:
+                    # A short pause before the next question
+                    self._send_paced(ws, silence * 25, rate, clock)
+                previous = a
+            # Wait for the last answers to complete
+            while not all(x.done.is_set() for x in self.answers) and time.perf_counter() < deadline:
+                self._send_paced(ws, silence * 10, rate, clock)
+        finally:
+            ws.close()
+
+    def _run_process(self):
+        for rate, pcm in self.questions:
+            data = wav_bytes(pcm, rate)
+            time.sleep(len(pcm) / 2 / rate)    # the question being recorded
+            a = self._begin_answer()
+            a.speech_end = time.perf_counter()
+            r = self.http.post(f"{self.url}/process", data={"session_id": self.session_id},
+                               files={"audio": ("question.wav", data, "audio/wav")},
+                               timeout=self.answer_timeout)
+            if r.status_code != 200:
+                self.errors.append(f"/process {r.status_code}: {r.text[:200]}")
+            a.done.wait(5)
+            time.sleep(0.5)
+
+
+def percentiles(values):
+    if not values:
+        return {"n": 0}
+    v = sorted(values)
+    last = len(v) - 1
+    pick = lambda q: round(1000 * v[min(last, int(round(q * last)))], 1)  # noqa: E731
+    return {"n": len(v), "p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99),
+            "mean_ms": round(1000 * statistics.fmean(v), 1)}
+
+
+def uniquify(pcm: bytes, salt: int) -> bytes:
+    """Nudge the first sample so replayed audio does not hit the app's transcript cache."""
+    x = np.frombuffer(pcm, dtype='<u2').copy()
+    if len(x) >= 2:
+        # Flip low bits of the first two samples: inaudible, unique for salts < 65536
+        x[0] ^= salt & 0xFF
+        x[1] ^= (salt >> 8) & 0xFF
+    return x.tobytes()
+
+
+def run_load(url, questions, sessions, mode, questions_per_session=3, ramp_s=2.0, answer_timeout=60.0,
+             repeat_audio=False, barge_in=False):
+    """
+    Run `sessions` concurrent sessions and return the aggregated result dict.
+    Unless repeat_audio, every question sent is byte-unique so each one
+    really goes through ASR.
+    """
+    runs = []
+    for i in range(sessions):
+        qs = [questions[(i + k) % len(questions)] for k in range(questions_per_session)]
+        if not repeat_audio:
+            qs = [(rate, uniquify(pcm, 1 + i * questions_per_session + k)) for k, (rate, pcm) in enumerate(qs)]
+        runs.append(SessionRun(url, qs, mode, i, answer_timeout=answer_timeout, barge_in=barge_in))
+
+    def start(run, delay):
+        time.sleep(delay)
+        run.run()
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=start, args=(r, random.uniform(0, ramp_s)), daemon=True) for r in runs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    answers = [a for r in runs for a in r.answers]
+    done = [a for a in answers if a.complete is not None]
+    # Interrupted answers end early by design; latency percentiles cover the ones that ran to the end
+    full = [a for a in done if not a.interrupted]
+    cut = [a for a in done if a.interrupted]
+    return {
+        "mode": mode,
+        "sessions": sessions,
+        "questions": len(answers),
+        "answered": len(done),
+        "timeouts": len(answers) - len(done),
+        "wall_s": round(wall, 2),
+        "answers_per_s": round(len(done) / wall, 3) if wall else 0.0,
+        "first_token_after_speech": percentiles([a.first_token - a.speech_end for a in full if a.first_token]),
+        "complete_after_speech": percentiles([a.complete - a.speech_end for a in full]),
+        "interrupted": len(cut),
+        # From the start of the barging-in question until the cut answer's `complete`
+        "cut_after_barge_in": percentiles([a.complete - a.next_question_at for a in cut if a.next_question_at]),
+        "token_frames_lost": sum(max(0, a.frames_announced - a.frames_received) for a in done),
+        "audio_chunks": sum(r.chunks for r in runs),
+        "late_audio_chunks": sum(r.late_chunks for r in runs),
+        "errors": [e for r in runs for e in r.errors][:20],
+    }
+
+
+def load_questions(paths, synthetic=0, synthetic_seconds=3.0, rate=16000):
+    questions = []
+    for p in paths:
+        files = sorted(glob.glob(os.path.join(p, "*.wav"))) if os.path.isdir(p) else [p]
+        questions.extend(load_wav(f) for f in files)
+    for i in range(synthetic):
+        questions.append((rate, synth_question(synthetic_seconds, rate, seed=i)))
+    if not questions:
+        raise SystemExit("no questions: pass WAV files/directories or --synthetic N")
+    return questions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("paths", nargs="*", help="WAV files or directories (one question per file)")
+    ap.add_argument("--url", default="http://127.0.0.1:5000")
+    ap.add_argument("--sessions", type=int, default=1)
+    ap.add_argument("--mode", choices=("ws", "process"), default="ws")
+    ap.add_argument("--questions", type=int, default=3, help="questions per session")
+    ap.add_argument("--synthetic", type=int, default=0, help="add N synthetic spoken questions")
+    ap.add_argument("--synthetic-seconds", type=float, default=3.0)
+    ap.add_argument("--repeat-audio", action="store_true", help="send identical bytes (exercises the caches)")
+    ap.add_argument("--barge-in", action="store_true", help="ws: ask the next question while the answer streams")
+    args = ap.parse_args()
+
+    questions = load_questions(args.paths, args.synthetic, args.synthetic_seconds)
+    print(json.dumps(run_load(args.url, questions, args.sessions, args.mode, args.questions,
+                              repeat_audio=args.repeat_audio, barge_in=args.barge_in), indent=2))
+
+
+if __name__ == "__main__":
+    main()
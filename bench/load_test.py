@@ -0,0 +1,234 @@
+"""
+Offline end-to-end load test.
+
+Starts bench/fake_openai.py and the app (src/app.py, in a scratch working
+directory so data/ is not touched), runs bench/load_driver.py at each
+concurrency level and mode, samples the app's CPU and memory, and writes a
+JSON report. Passing an earlier report to --compare prints the change per
+level, so two commits can be compared on the same machine:
+
+    python bench/load_test.py --synthetic 4 --sessions 1,10,50 --mode ws,process --out before.json
+    git checkout <other commit>
+    python bench/load_test.py --synthetic 4 --sessions 1,10,50 --mode ws,process --compare before.json
+
+Fake-server knobs (--asr-delay, --asr-rtf, --ttft, --tokens-per-s, --tokens,
+--jitter, --rpm, --error-rate, --slow-rate, --slow-factor) are passed
+through; --app-env KEY=VALUE sets app configuration and --server production
+runs src/serve.py (gevent) instead of the dev server.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+import fake_openai  # noqa: E402
+import load_driver  # noqa: E402
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class ProcessSampler:
+    """Average CPU % and peak RSS of one process, sampled every `interval` seconds."""
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []   # (wall, cpu_seconds, rss_bytes)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _read(self):
+        if psutil is not None:
+            p = psutil.Process(self.pid)
+            t = p.cpu_times()
+            return t.user + t.system, p.memory_info().rss
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        cpu = (int(fields[11]) + int(fields[12])) / ticks
+        rss = int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+        return cpu, rss
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                cpu, rss = self._read()
+            except Exception:
+                return
+            self.samples.append((time.perf_counter(), cpu, rss))
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self) -> dict:
+        self._stop.set()
+        self._thread.join()
+        if len(self.samples) < 2:
+            return {}
+        (t0, c0, _), (t1, c1, _) = self.samples[0], self.samples[-1]
+        return {
+            "cpu_percent": round(100 * (c1 - c0) / (t1 - t0), 1) if t1 > t0 else 0.0,
+            "rss_peak_mb": round(max(s[2] for s in self.samples) / 2 ** 20, 1),
+            "rss_end_mb": round(self.samples[-1][2] / 2 ** 20, 1),
+        }
+
+
+def wait_ready(url, proc, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"{url} exited with {proc.returncode}")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise SystemExit(f"{url} did not come up")
+
+
+def git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def print_result(r):
+    ft, ca = r["first_token_after_speech"], r["complete_after_speech"]
+    srv = r.get("server", {})
+    print(f"{r['mode']:<8}{r['sessions']:>5}  answered {r['answered']}/{r['questions']}  "
+          f"first token p50 {ft.get('p50_ms', '-')} p95 {ft.get('p95_ms', '-')} p99 {ft.get('p99_ms', '-')} ms  "
+          f"complete p50 {ca.get('p50_ms', '-')} p95 {ca.get('p95_ms', '-')} ms  "
+          f"{r['answers_per_s']} ans/s  late chunks {r['late_audio_chunks']}/{r['audio_chunks']}  "
+          f"frames lost {r['token_frames_lost']}  cpu {srv.get('cpu_percent', '-')}%  "
+          f"rss {srv.get('rss_peak_mb', '-')} MB")
+    if r.get("interrupted"):
+        cut, api = r["cut_after_barge_in"], r.get("openai_requests", {})
+        print(f"{'':<13}interrupted {r['interrupted']}  cut after barge-in p50 {cut.get('p50_ms', '-')} "
+              f"p95 {cut.get('p95_ms', '-')} ms  chat tokens streamed {api.get('chat_tokens', '-')}  "
+              f"server-side cancel {r['barge_in']}")
+
+
+def compare(old, new):
+    index = {(r["mode"], r["sessions"]): r for r in old["results"]}
+    print(f"\nvs {old.get('commit')} ({old.get('server', 'dev')} server):")
+    for r in new["results"]:
+        o = index.get((r["mode"], r["sessions"]))
+        if o is None:
+            continue
+        parts = []
+        for metric in ("first_token_after_speech", "complete_after_speech"):
+            for q in ("p50_ms", "p95_ms"):
+                a, b = o[metric].get(q), r[metric].get(q)
+                if a and b:
+                    parts.append(f"{metric.split('_')[0]} {q[:3]} {b - a:+.1f} ms ({100 * (b - a) / a:+.1f}%)")
+        a, b = o.get("server", {}).get("cpu_percent"), r.get("server", {}).get("cpu_percent")
+        if a is not None and b is not None:
+            parts.append(f"cpu {b - a:+.1f} pts")
+        print(f"  {r['mode']:<8}{r['sessions']:>5}  " + ", ".join(parts))
+
+
+def main():
+    ap = fake_openai.build_parser()
+    ap.description = __doc__
+    ap.formatter_class = argparse.RawDescriptionHelpFormatter
+    ap.add_argument("paths", nargs="*", help="WAV files or directories (one question per file)")
+    ap.add_argument("--synthetic", type=int, default=0)
+    ap.add_argument("--synthetic-seconds", type=float, default=3.0)
+    ap.add_argument("--sessions", default="1,10,50")
+    ap.add_argument("--mode", default="ws,process")
+    ap.add_argument("--questions", type=int, default=3, help="questions per session")
+    ap.add_argument("--repeat-audio", action="store_true", help="send identical bytes (exercises the caches)")
+    ap.add_argument("--barge-in", action="store_true", help="ws: ask the next question while the answer streams")
+    ap.add_argument("--server", choices=("dev", "production"), default="dev",
+                    help="src/app.py (threaded dev server) or src/serve.py (gevent)")
+    ap.add_argument("--app-port", type=int, default=5055)
+    ap.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE")
+    ap.add_argument("--out", default=None)
+    ap.add_argument("--compare", default=None)
+    ap.set_defaults(port=8011)
+    args = ap.parse_args()
+
+    questions = load_driver.load_questions(args.paths, args.synthetic, args.synthetic_seconds)
+    fake_args = [f"--port={args.port}", f"--asr-delay={args.asr_delay}", f"--asr-rtf={args.asr_rtf}",
+                 f"--ttft={args.ttft}", f"--tokens-per-s={args.tokens_per_s}", f"--tokens={args.tokens}",
+                 f"--jitter={args.jitter}"]
+    if args.seed is not None:
+        fake_args.append(f"--seed={args.seed}")
+    for flag in ("rpm", "error_rate", "slow_rate"):
+        if getattr(args, flag):
+            fake_args.append(f"--{flag.replace('_', '-')}={getattr(args, flag)}")
+    if args.slow_rate:
+        fake_args.append(f"--slow-factor={args.slow_factor}")
+
+    workdir = tempfile.mkdtemp(prefix="agent_bob_load_")
+    env = dict(os.environ, OPENAI_BASE_URL=f"http://127.0.0.1:{args.port}/v1", OPENAI_API_KEY="sk-bench",
+               AGENT_BOB_PORT=str(args.app_port), PYTHONUNBUFFERED="1")
+    for kv in args.app_env:
+        k, _, v = kv.partition("=")
+        env[k] = v
+
+    log = open(os.path.join(workdir, "server.log"), "w")
+    fake = subprocess.Popen([sys.executable, os.path.join(HERE, "fake_openai.py"), *fake_args],
+                            stdout=log, stderr=subprocess.STDOUT)
+    entry = "serve.py" if args.server == "production" else "app.py"
+    app = subprocess.Popen([sys.executable, os.path.join(ROOT, "src", entry)], cwd=workdir, env=env,
+                           stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{args.app_port}"
+    report = {"commit": git_rev(), "started": time.time(), "server": args.server, "fake_openai": fake_args,
+              "app_env": args.app_env, "results": []}
+    try:
+        wait_ready(f"http://127.0.0.1:{args.port}/v1/models", fake)
+        wait_ready(f"{url}/stats", app)
+        for mode in args.mode.split(","):
+            for n in (int(x) for x in args.sessions.split(",")):
+                sampler = ProcessSampler(app.pid).start()
+                before = requests.get(f"http://127.0.0.1:{args.port}/stats", timeout=5).json()
+                result = load_driver.run_load(url, questions, n, mode, args.questions,
+                                              repeat_audio=args.repeat_audio, barge_in=args.barge_in)
+                result["server"] = sampler.stop()
+                after = requests.get(f"http://127.0.0.1:{args.port}/stats", timeout=5).json()
+                result["openai_requests"] = {k: after[k] - before.get(k, 0) for k in after}
+                app_stats = requests.get(f"{url}/stats", timeout=5).json()
+                result["server_stages"] = app_stats.get("stages")
+                result["barge_in"] = app_stats.get("barge_in")
+                report["results"].append(result)
+                print_result(result)
+    finally:
+        app.terminate()
+        fake.terminate()
+        for proc in (app, fake):
+            try:
+                proc.wait(40)
+            except subprocess.TimeoutExpired:
+                print(f"[warn] pid {proc.pid} did not exit; killing it")
+                proc.kill()
+                proc.wait()
+        log.close()
+
+    print(f"server log: {os.path.join(workdir, 'server.log')}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
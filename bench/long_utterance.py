@@ -0,0 +1,155 @@
+"""
+Soak test for long utterances: RSS of the app while one /ws-audio
+connection streams --hours of speech that never pauses long enough to
+end a turn (a monologue, or a mic stuck open on a noisy room).
+
+The app runs in-process (scratch working directory) against
+bench/fake_openai.py with short delays. A stand-in socket feeds the real
+/ws-audio handler synthetic voiced audio as fast as it is consumed, so
+hours of audio take minutes. Every --every simulated minutes it samples
+the process RSS and the /stats utterance_buffers gauges; at the end it
+reports the RSS series, its growth over the second half of the stream
+(MB per audio hour) and the split/spill counters.
+
+    python bench/long_utterance.py --hours 2
+    python bench/long_utterance.py --hours 0.25 --unbounded   # before: no split, no spill, one ASR request
+
+--unbounded turns the split off and lets the utterance and ASR windows
+grow without limit, as /ws-audio behaved before the caps.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+
+from load_driver import synth_question  # noqa: E402
+
+CHUNK_MS = 30
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class SyntheticSocket:
+    """Stands in for the /ws-audio socket: the hello, then `seconds` of continuous speech in 30 ms chunks."""
+
+    def __init__(self, session_id, seconds, on_minute, rate=16000):
+        from simple_websocket import ConnectionClosed
+        self._closed = ConnectionClosed
+        self.hello = json.dumps({"session_id": session_id, "sample_rate": rate, "frame_ms": CHUNK_MS,
+                                 "speculate": False})
+        # Clips joined back to back: syllable-rate modulation but no pause long enough to end the turn
+        self.clips = [synth_question(7.0, rate, seed=i) for i in range(6)]
+        self.step = int(rate * CHUNK_MS / 1000) * 2
+        self.total_chunks = int(seconds * 1000 / CHUNK_MS)
+        self.sent = 0
+        self.on_minute = on_minute
+        self._clip, self._pos = 0, 0
+
+    def receive(self, timeout=None):
+        if self.hello is not None:
+            hello, self.hello = self.hello, None
+            return hello
+        if self.sent >= self.total_chunks:
+            raise self._closed()
+        clip = self.clips[self._clip]
+        chunk = clip[self._pos:self._pos + self.step]
+        self._pos += self.step
+        if self._pos >= len(clip):
+            self._clip, self._pos = (self._clip + 1) % len(self.clips), 0
+        self.sent += 1
+        if self.sent % (60000 // CHUNK_MS) == 0:
+            self.on_minute(self.sent * CHUNK_MS / 60000)
+        return chunk
+
+    def send(self, data):
+        pass
+
+    def close(self, *args, **kwargs):
+        pass
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hours", type=float, default=2.0)
+    ap.add_argument("--every", type=float, default=10.0, help="sample every N minutes of audio")
+    ap.add_argument("--unbounded", action="store_true", help="no split, no spill, no ASR window limit")
+    ap.add_argument("--port", type=int, default=8017)
+    args = ap.parse_args()
+
+    if args.unbounded:
+        os.environ.update(AGENT_BOB_MAX_UTTERANCE_S="0", AGENT_BOB_UTTERANCE_MEM_KB=str(10 ** 9),
+                          AGENT_BOB_ASR_MAX_WINDOW_S=str(10 ** 6))
+    os.environ.update(OPENAI_API_KEY="sk-bench", OPENAI_BASE_URL=f"http://127.0.0.1:{args.port}/v1",
+                      AGENT_BOB_ASR_BACKEND="openai", AGENT_BOB_ARTIFACT_INDEX="0")
+    fake = subprocess.Popen([sys.executable, os.path.join(HERE, "fake_openai.py"), "--port", str(args.port),
+                             "--asr-delay", "0.05", "--asr-rtf", "0", "--ttft", "0.02", "--tokens-per-s", "5000",
+                             "--tokens", "60", "--jitter", "0"], stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    os.chdir(tempfile.mkdtemp(prefix="agent_bob_soak_"))
+    try:
+        for _ in range(100):
+            try:
+                requests.get(f"http://127.0.0.1:{args.port}/v1/models", timeout=1)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+
+        import app as agent_app
+        from utterance_buffer import BUFFER_STATS
+
+        client = agent_app.app.test_client()
+        session_id = client.post("/start-session", json={
+            "resume": "Backend engineer: Kafka, Kubernetes, Python.",
+            "job_description": "Senior platform engineer, streaming data."}).get_json()["session_id"]
+
+        samples = []
+        last_sample = [0.0]
+
+        def on_minute(minute):
+            if minute - last_sample[0] >= args.every:
+                last_sample[0] = minute
+                samples.append((minute, rss_mb(), BUFFER_STATS.as_dict()))
+
+        samples.append((0.0, rss_mb(), BUFFER_STATS.as_dict()))
+        start = time.perf_counter()
+        agent_app._ws_audio_session(SyntheticSocket(session_id, args.hours * 3600, on_minute))
+        elapsed = time.perf_counter() - start
+        agent_app.artifacts.flush()
+        samples.append((args.hours * 60, rss_mb(), BUFFER_STATS.as_dict()))
+    finally:
+        fake.terminate()
+
+    mode = "unbounded" if args.unbounded else "capped"
+    print(f"{mode}: {args.hours} h of continuous speech in {elapsed:.0f} s")
+    for minute, rss, buffers in samples:
+        print(f"  {minute:6.0f} min  RSS {rss:7.1f} MB  buffered {buffers['memory_bytes'] / 1024:8.0f} KB  "
+              f"spilled {buffers['spilled_bytes'] / 1024:8.0f} KB")
+    # The last sample is taken after the connection closed; growth is measured while it streams
+    half = [s for s in samples[:-1] if s[0] >= args.hours * 30]
+    growth = (half[-1][1] - half[0][1]) / max(1e-9, (half[-1][0] - half[0][0]) / 60) if len(half) > 1 else 0.0
+    final = samples[-1][2]
+    peak = max(s[2]["memory_bytes"] for s in samples)
+    cap = max(s[2]["memory_cap_bytes"] for s in samples)
+    print(f"RSS growth over the second half: {growth:+.1f} MB per audio hour; peak buffered {peak / 1024:.0f} KB "
+          f"(cap {cap / 1024:.0f} KB); "
+          f"splits {final['splits']}, spills {final['spills']} ({final['spilled_bytes_total'] / 1e6:.0f} MB)")
+    turns = client.get("/chat_history", headers={"X-Session-Id": session_id}).get_json()["total"]
+    print(f"turns answered: {turns}")
+
+
+if __name__ == "__main__":
+    main()
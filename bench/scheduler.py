@@ -0,0 +1,122 @@
+"""
+The OpenAI request scheduler against an in-process bench/fake_openai.py
+that fails in controlled ways. Each scenario runs the same streamed chat
+requests twice, through a pass-through scheduler (no queue, no retries, no
+hedging: what calling the API directly does) and through the scheduler as
+configured for the app:
+
+  errors     --error-rate of requests get a 503 -> retries with jittered backoff
+  ratelimit  the stand-in allows --rpm requests a minute; the scheduler gets
+             the same budget, so the burst is paced instead of refused
+  tail       --slow-rate of requests are --slow-factor times slower -> hedging
+
+Reported per run: requests that got an answer, time to first token
+percentiles, what the server refused, and the scheduler's retry/429/hedge
+counters.
+
+    python bench/scheduler.py --scenario tail --requests 300 --concurrency 8
+    python bench/scheduler.py --scenario ratelimit --rpm 60 --requests 90
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# src/ first: this script shares its name with src/scheduler.py
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fake_openai  # noqa: E402
+import llm  # noqa: E402
+import openai_client  # noqa: E402
+from load_driver import percentiles  # noqa: E402
+from scheduler import OpenAIScheduler, TokenBucket  # noqa: E402
+
+
+def first_token(session):
+    start = time.perf_counter()
+    stream = llm.LLMStream("Tell me about a project where you improved reliability.", session_id=session)
+    try:
+        for _ in stream:
+            return time.perf_counter() - start
+    finally:
+        stream.cancel()
+    return None
+
+
+def run(scheduler, server, requests, concurrency):
+    llm.SCHEDULER = scheduler
+    before = dict(server.requests)
+    counters = dict(scheduler.stats()["kinds"].get("llm", {}))
+
+    def one(i):
+        try:
+            return first_token(f"s{i % concurrency}")
+        except Exception:
+            return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - start
+    ok = [r for r in results if r is not None]
+    return {
+        "answered": len(ok),
+        "requests": requests,
+        "wall_s": round(wall, 1),
+        "first_token": percentiles(ok),
+        "server": {k: server.requests[k] - before.get(k, 0) for k in ("chat", "rate_limited", "errors", "slow")},
+        "scheduler": {k: v - counters.get(k, 0) for k, v in scheduler.stats()["kinds"]["llm"].items()
+                      if isinstance(v, int)},
+    }
+
+
+def main():
+    ap = fake_openai.build_parser()
+    ap.description = __doc__
+    ap.formatter_class = argparse.RawDescriptionHelpFormatter
+    ap.add_argument("--scenario", choices=("errors", "ratelimit", "tail"), default="tail")
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--retries", type=int, default=3)
+    ap.add_argument("--hedge-quantile", type=float, default=0.95)
+    ap.set_defaults(port=8021, tokens=5, jitter=0.1)
+    args = ap.parse_args()
+    if args.scenario == "errors" and not args.error_rate:
+        args.error_rate = 0.1
+    if args.scenario == "ratelimit" and not args.rpm:
+        args.rpm = 60
+    if args.scenario == "tail" and not args.slow_rate:
+        args.slow_rate = 0.03
+        args.slow_factor = 8.0
+
+    server = fake_openai.FakeOpenAI((args.host, args.port), args)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    openai_client.configure(api_key="sk-bench", base_url=f"http://{args.host}:{args.port}/v1")
+
+    direct = OpenAIScheduler(max_concurrency=10 ** 6, max_retries=0)
+    budgets = {"llm": {"requests": TokenBucket(args.rpm), "tokens": TokenBucket(0)}}
+    # Room above the client count for hedged copies, as the app's pool-sized default has
+    scheduled = OpenAIScheduler(max_concurrency=2 * args.concurrency, budgets=budgets, max_retries=args.retries,
+                                hedge=args.scenario == "tail", hedge_quantile=args.hedge_quantile)
+
+    if args.scenario == "tail":
+        # Hedging needs a latency history to set its deadline
+        run(scheduled, server, 40, args.concurrency)
+
+    for name, sched in (("direct", direct), ("scheduled", scheduled)):
+        if args.scenario == "ratelimit":
+            server.recent.clear()
+        r = run(sched, server, args.requests, args.concurrency)
+        ft, srv, st = r["first_token"], r["server"], r["scheduler"]
+        print(f"{args.scenario:<10}{name:<10} answered {r['answered']}/{r['requests']} in {r['wall_s']} s  "
+              f"first token p50 {ft.get('p50_ms')} p95 {ft.get('p95_ms')} p99 {ft.get('p99_ms')} ms  "
+              f"server 429s {srv['rate_limited']} 503s {srv['errors']} slow {srv['slow']}  "
+              f"retries {st.get('retries', 0)} hedges {st.get('hedges', 0)} hedge wins {st.get('hedge_wins', 0)}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Disk cost of the artifact layouts: one file per artifact (today's
+data/recordings, transcripts, prompts, responses) against the per-session
+segment archive, with PCM and with FLAC audio.
+
+--turns synthetic turns (speech-like audio of --seconds, a transcript, a
+prompt JSON with resume/JD-sized context, a 120-word answer) across
+--sessions sessions are written through ArtifactWriter, as the app does,
+into a scratch directory per layout. Reported per layout:
+
+  files      files/inodes created
+  payload    bytes handed to the writer (what the turn contains)
+  on disk    allocated blocks (du), and disk / payload
+  written    bytes the process wrote to the block layer (/proc/self/io),
+             i.e. write amplification including filesystem metadata
+  write      wall time to write and fsync everything
+  read       p50 to fetch one random turn's four artifacts
+  list       p50 to list one session's turns
+
+After the run the archive is exported back to files and compared with the
+file layout byte for byte.
+
+    python bench/segment_archive.py --turns 2000 --sessions 20 --seconds 5
+"""
+import argparse
+import filecmp
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+# src/ first: this script shares its name with src/segment_archive.py
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from artifact_writer import ArtifactWriter  # noqa: E402
+from load_driver import percentiles, synth_question  # noqa: E402
+from segment_archive import SegmentArchive, export_files  # noqa: E402
+
+WORDS = ("I led the migration of our streaming pipeline to Kafka and cut end to end latency "
+         "by forty percent while keeping the on call load flat").split()
+
+
+def make_turns(n, sessions, seconds, rng):
+    clips = [synth_question(seconds, seed=i) for i in range(8)]
+    context = " ".join(rng.choice(WORDS) for _ in range(1500))
+    for i in range(n):
+        uid = f"20250101_{i // 3600 % 24:02d}{i // 60 % 60:02d}{i % 60:02d}_{i:032x}"
+        sid = f"session{i % sessions}"
+        transcript = "Tell me about a time you " + " ".join(rng.choice(WORDS) for _ in range(12))
+        yield sid, {
+            "uid": uid, "timestamp": "2025-01-01 00:00:00", "transcript": transcript,
+            "response": " ".join(rng.choice(WORDS) for _ in range(120)),
+            "prompt": {"timestamp": "2025-01-01 00:00:00", "session_id": sid, "transcript": transcript,
+                       "speculative": False, "cached": None, "interrupted": False,
+                       "prompt": f"Resume and job description:\n{context}\n\nQuestion: {transcript}"},
+            "pcm": clips[i % len(clips)], "sample_rate": 16000,
+        }
+
+
+def io_written():
+    with open("/proc/self/io") as f:
+        return int(dict(line.split(": ") for line in f.read().splitlines())["write_bytes"])
+
+
+def disk_usage(root):
+    files = blocks = 0
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            files += 1
+            blocks += os.stat(os.path.join(dirpath, name)).st_blocks * 512
+    return files, blocks
+
+
+def write_files(root, turns, writer):
+    for sid, t in turns:
+        uid = t["uid"]
+        writer.write_wav(f"{root}/recordings/{uid}.wav", t["pcm"], t["sample_rate"])
+        writer.write_text(f"{root}/transcripts/{uid}.txt", t["transcript"])
+        writer.write_json(f"{root}/prompts/{uid}.json", t["prompt"])
+        writer.write_text(f"{root}/responses/{uid}.txt", t["response"])
+
+
+def read_files(root, uid):
+    for sub, ext in (("recordings", ".wav"), ("transcripts", ".txt"), ("prompts", ".json"), ("responses", ".txt")):
+        with open(f"{root}/{sub}/{uid}{ext}", "rb") as f:
+            f.read()
+
+
+def list_files(root, sid):
+    # The file layout only knows a turn's session from inside its prompt JSON
+    out = []
+    for name in os.listdir(f"{root}/prompts"):
+        with open(f"{root}/prompts/{name}", encoding="utf-8") as f:
+            if json.load(f)["session_id"] == sid:
+                out.append(name)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=2000)
+    ap.add_argument("--sessions", type=int, default=20)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--reads", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=3)
+    args = ap.parse_args()
+    work = tempfile.mkdtemp(prefix="agent_bob_archive_")
+    turns = list(make_turns(args.turns, args.sessions, args.seconds, random.Random(args.seed)))
+    payload = sum(len(t["pcm"]) + 44 + len(t["transcript"]) + len(t["response"]) +
+                  len(json.dumps(t["prompt"], ensure_ascii=False, indent=2)) for _, t in turns)
+    rng = random.Random(args.seed)
+    sample = [rng.choice(turns) for _ in range(args.reads)]
+    sessions = [f"session{i}" for i in range(args.sessions)]
+
+    results = {}
+    for layout in ("files", "archive", "archive+flac"):
+        root = os.path.join(work, layout)
+        writer = ArtifactWriter(fsync="batch")
+        archive = SegmentArchive(root, flac=layout.endswith("flac")) if layout != "files" else None
+        written = io_written()
+        start = time.perf_counter()
+        if archive is None:
+            write_files(root, turns, writer)
+        else:
+            for sid, t in turns:
+                writer.append_segment(archive, sid, t)
+        writer.close()
+        elapsed = time.perf_counter() - start
+        written = io_written() - written
+        files, disk = disk_usage(root)
+
+        reads, lists = [], []
+        if archive is None:
+            for _, t in sample:
+                s = time.perf_counter()
+                read_files(root, t["uid"])
+                reads.append(time.perf_counter() - s)
+            for sid in sessions[:10]:
+                s = time.perf_counter()
+                list_files(root, sid)
+                lists.append(time.perf_counter() - s)
+        else:
+            archive.close()
+            readers = {sid: archive.reader(sid) for sid in sessions}
+            for sid, t in sample:
+                s = time.perf_counter()
+                turn = readers[sid].get(t["uid"])
+                turn.pcm()
+                turn.audio.release()
+                reads.append(time.perf_counter() - s)
+            for sid in sessions[:10]:
+                s = time.perf_counter()
+                archive.reader(sid).close()
+                lists.append(time.perf_counter() - s)
+            for r in readers.values():
+                r.close()
+        results[layout] = (files, disk, written, elapsed, percentiles(reads), percentiles(lists))
+
+    print(f"{args.turns} turns, {args.sessions} sessions, {args.seconds} s audio; payload {payload / 1e6:.1f} MB")
+    for layout, (files, disk, written, elapsed, reads, lists) in results.items():
+        print(f"{layout:<13} files {files:<6} on disk {disk / 1e6:7.1f} MB ({disk / payload:.2f}x)  "
+              f"written {written / 1e6:7.1f} MB ({written / payload:.2f}x)  write {elapsed:.1f} s  "
+              f"read p50 {reads.get('p50_ms')} ms  list p50 {lists.get('p50_ms')} ms")
+
+    exported = os.path.join(work, "exported")
+    export_files(SegmentArchive(os.path.join(work, "archive+flac")), exported)
+    mismatches = 0
+    for sub in ("recordings", "transcripts", "prompts", "responses"):
+        cmp = filecmp.dircmp(os.path.join(work, "files", sub), os.path.join(exported, sub))
+        _, bad, errors = filecmp.cmpfiles(cmp.left, cmp.right, cmp.common_files, shallow=False)
+        mismatches += len(bad) + len(errors) + len(cmp.left_only) + len(cmp.right_only)
+    print(f"export of archive+flac vs file layout: {'identical' if not mismatches else f'{mismatches} differences'}")
+
+
+if __name__ == "__main__":
+    main()
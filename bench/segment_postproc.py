@@ -0,0 +1,171 @@
+"""
+Segment post-processing on a synthetic interview: what reaches ASR with
+and without trimming, blip suppression and merging.
+
+The stream has --questions spoken questions 6 s apart (answer time).
+Some start with a short lead-in ("So...") and a pause just longer than
+the endpointer's silence timeout, and some are one-word questions ("Why?").
+Between questions there are noise blips (clicks, a cough) that webrtcvad
+calls speech. The /ws-audio segmentation (VADFrontEnd + UtteranceSegmenter,
+the app's defaults) runs over it, once sending every segment to ASR as
+before and once through SegmentPostProcessor as the app does. Reported:
+
+  asr calls       requests Whisper would get, and of those from blips
+  audio to asr    seconds of audio sent, and the saving
+  split           questions that reached ASR as more than one segment
+  missed          questions with no segment at all
+  held            extra wait before short questions go out (merge window)
+
+    python bench/segment_postproc.py --questions 200
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+# src/ first: this script shares its name with src/segment_postproc.py
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from load_driver import percentiles, synth_question  # noqa: E402
+from segment_postproc import SegmentPostProcessor, PostProcStats  # noqa: E402
+from vad_frontend import VADFrontEnd, UtteranceSegmenter, SEG_IDLE, SEG_START, SEG_END  # noqa: E402
+
+RATE = 16000
+FRAME_MS = 30
+
+
+def make_stream(n, rng):
+    """PCM plus reference spans (start_s, end_s, kind) for questions and blips."""
+    parts, spans, t = [], [], 0.0
+
+    def add(pcm, kind=None):
+        nonlocal t
+        if kind:
+            spans.append((t, t + len(pcm) / 2 / RATE, kind))
+        parts.append(pcm)
+        t += len(pcm) / 2 / RATE
+
+    def silence(seconds):
+        x = rng.normal(0, 30, int(seconds * RATE))
+        return x.astype('<i2').tobytes()
+
+    def blip():
+        k = int(rng.uniform(0.06, 0.2) * RATE)
+        x = rng.normal(0, 9000, k) * np.hanning(k)
+        return np.clip(x, -32768, 32767).astype('<i2').tobytes()
+
+    add(silence(2.0))
+    for i in range(n):
+        kind = rng.choice(["plain", "lead-in", "short"], p=[0.5, 0.3, 0.2])
+        start = t
+        if kind == "lead-in":
+            add(synth_question(0.6, seed=2 * i))
+            add(silence(1.3))
+            add(synth_question(rng.uniform(2.5, 5.0), seed=2 * i + 1))
+        elif kind == "short":
+            add(synth_question(rng.uniform(0.5, 0.9), seed=2 * i))
+        else:
+            add(synth_question(rng.uniform(2.5, 6.0), seed=2 * i))
+        spans.append((start, t, kind))
+        add(silence(2.5))
+        if rng.random() < 0.5:
+            add(blip(), "blip")
+        add(silence(3.5))
+    return b"".join(parts), spans
+
+
+def run(pcm, post):
+    """Segments sent to ASR as (start_s, end_s, audio_s, held_s), mirroring the /ws-audio loop."""
+    frontend = VADFrontEnd(RATE, frame_ms=FRAME_MS, aggressiveness=2, hangover_ms=60)
+    seg = UtteranceSegmenter(frontend.frame_ms, preroll_ms=300, pause_ms=300, end_silence_ms=1000)
+    sent = []
+    cur_start = held = None        # held: (start frame, end frame) of the segment post is holding
+    frame_s = FRAME_MS / 1000
+
+    def out(kept_pcm, start, end, now):
+        sent.append((start * frame_s, end * frame_s, len(kept_pcm) / 2 / RATE, (now - end) * frame_s))
+
+    chunk = int(RATE * 0.02) * 2
+    for i in range(0, len(pcm), chunk):
+        for frame, is_speech in frontend.feed(pcm[i:i + chunk]):
+            event = seg.push(frame, is_speech)
+            now = seg.frames_seen
+            if post is not None and held is not None:
+                kept = post.poll(now)
+                if kept is not None:
+                    out(kept.pcm, *held, now)
+                    held = None
+            if event == SEG_IDLE:
+                continue
+            if event == SEG_START:
+                cur_start = seg.start_frame
+                if post is not None:
+                    prefix = post.start(now)
+                    if prefix is not None:
+                        seg.prepend(prefix)
+                        cur_start, held = held[0], None
+            elif event == SEG_END:
+                audio = seg.take()
+                if post is None:
+                    out(audio, cur_start, now, now)
+                    continue
+                kept = post.end(audio, now)
+                if kept is not None:
+                    out(kept.pcm, cur_start, now, now)
+                elif post.holding:
+                    held = (cur_start, now)
+    if post is not None and held is not None:
+        kept = post.flush()
+        out(kept.pcm, *held, seg.frames_seen)
+    return sent
+
+
+def score(sent, spans):
+    def overlaps(a, b):
+        return min(a[1], b[1]) - max(a[0], b[0]) > 0
+
+    questions = [s for s in spans if s[2] != "blip"]
+    per_q = [sum(overlaps(x, q) for x in sent) for q in questions]
+    from_blips = sum(1 for x in sent if not any(overlaps(x, q) for q in questions))
+    short_held = [x[3] for x in sent for q in questions if q[2] == "short" and overlaps(x, q)]
+    return {
+        "asr_calls": len(sent),
+        "from_blips": from_blips,
+        "audio_s": sum(x[2] for x in sent),
+        "split": sum(1 for n in per_q if n > 1),
+        "missed": sum(1 for n in per_q if n == 0),
+        "held": percentiles(short_held),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--questions", type=int, default=200)
+    ap.add_argument("--merge-gap-ms", type=int, default=600)
+    ap.add_argument("--min-speech-ms", type=int, default=250)
+    ap.add_argument("--seed", type=int, default=5)
+    args = ap.parse_args()
+    pcm, spans = make_stream(args.questions, np.random.default_rng(args.seed))
+    kinds = {k: sum(1 for s in spans if s[2] == k) for k in ("plain", "lead-in", "short", "blip")}
+    print(f"{len(pcm) / 2 / RATE / 60:.1f} min of audio: {kinds}")
+
+    stats = PostProcStats()
+    results = {
+        "as before": score(run(pcm, None), spans),
+        "post-processed": score(run(pcm, SegmentPostProcessor(RATE, FRAME_MS, min_speech_ms=args.min_speech_ms,
+                                                               merge_gap_ms=args.merge_gap_ms, stats=stats)),
+                                spans),
+    }
+    base = results["as before"]
+    for name, r in results.items():
+        saved = 1 - r["audio_s"] / base["audio_s"]
+        print(f"{name:<15} asr calls {r['asr_calls']:4} ({r['from_blips']} from blips)  "
+              f"audio to asr {r['audio_s']:7.1f} s ({saved:+.0%} saved)  split {r['split']:3}  "
+              f"missed {r['missed']:3}  short questions held p50 {r['held'].get('p50_ms')} ms")
+    print(f"post-processor counters: {stats.as_dict()}")
+
+
+if __name__ == "__main__":
+    main()
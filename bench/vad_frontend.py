@@ -0,0 +1,136 @@
+"""
+VAD front-end benchmark over recorded WAVs.
+
+For every file the audio is fed in 20 ms chunks at its native rate (like
+pcm_collector.js does) through the /ws-audio front-end, once with the NumPy
+energy gate and once calling webrtcvad on every frame. Reports CPU time per
+audio-second, the share of frames that reached webrtcvad, and endpointing
+accuracy.
+
+Accuracy uses <file>.labels.json when present: a list of [start_s, end_s]
+speech turns. A detected utterance matches a turn when their overlap covers
+at least half of the turn. Without labels the gated run is scored against
+the ungated one.
+
+    python bench/vad_frontend.py data/recordings/ --preroll-ms 300 --hangover-ms 60
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from vad_frontend import VADFrontEnd, UtteranceSegmenter, SEG_END  # noqa: E402
+
+
+def load_wav(path):
+    with wave.open(path, 'rb') as wf:
+        rate, channels, width = wf.getframerate(), wf.getnchannels(), wf.getsampwidth()
+        raw = wf.readframes(wf.getnframes())
+    if width != 2:
+        raise ValueError(f"{path}: only 16-bit PCM is supported")
+    x = np.frombuffer(raw, dtype='<i2')
+    if channels > 1:
+        x = x.reshape(-1, channels).mean(axis=1).astype('<i2')
+    return rate, x.tobytes()
+
+
+def run(rate, pcm, use_gate, args):
+    frontend = VADFrontEnd(rate, frame_ms=args.frame_ms, hangover_ms=args.hangover_ms, use_gate=use_gate)
+    seg = UtteranceSegmenter(frontend.frame_ms, preroll_ms=args.preroll_ms, end_silence_ms=args.end_silence_ms)
+    chunk = int(rate * 0.02) * 2
+    spans = []
+    t0 = time.process_time()
+    for i in range(0, len(pcm), chunk):
+        for frame, is_speech in frontend.feed(pcm[i:i + chunk]):
+            if seg.push(frame, is_speech) == SEG_END:
+                start = seg.start_frame * frontend.frame_ms / 1000
+                # End of speech = end of utterance minus the trailing silence timer
+                end = (seg.frames_seen - seg.silence_frames) * frontend.frame_ms / 1000
+                spans.append((start, end))
+                seg.take()
+    if seg.in_utterance:
+        spans.append((seg.start_frame * frontend.frame_ms / 1000, seg.frames_seen * frontend.frame_ms / 1000))
+    cpu = time.process_time() - t0
+    return spans, cpu, frontend.stats()
+
+
+def score(detected, reference):
+    """Matched turns, false splits/merges and mean end-of-speech error against reference spans."""
+    matched, end_err = 0, []
+    splits = merges = 0
+    for rs, re_ in reference:
+        hits = [d for d in detected if min(d[1], re_) - max(d[0], rs) > 0]
+        if len(hits) > 1:
+            splits += len(hits) - 1
+        best = max(hits, key=lambda d: min(d[1], re_) - max(d[0], rs), default=None)
+        if best and (min(best[1], re_) - max(best[0], rs)) >= 0.5 * (re_ - rs):
+            matched += 1
+            end_err.append(abs(best[1] - re_))
+    for d in detected:
+        covering = [r for r in reference if min(d[1], r[1]) - max(d[0], r[0]) > 0]
+        if len(covering) > 1:
+            merges += len(covering) - 1
+    return {
+        "turns": len(reference),
+        "matched": matched,
+        "false_splits": splits,
+        "false_merges": merges,
+        "mean_end_error_ms": round(1000 * float(np.mean(end_err)), 1) if end_err else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("paths", nargs="+", help="WAV files or directories")
+    ap.add_argument("--frame-ms", type=int, default=30)
+    ap.add_argument("--preroll-ms", type=int, default=300)
+    ap.add_argument("--hangover-ms", type=int, default=60)
+    ap.add_argument("--end-silence-ms", type=int, default=1000)
+    args = ap.parse_args()
+
+    files = []
+    for p in args.paths:
+        files.extend(sorted(glob.glob(os.path.join(p, "*.wav"))) if os.path.isdir(p) else [p])
+    if not files:
+        sys.exit("no WAV files found")
+
+    totals = {"audio_s": 0.0, "cpu_gated": 0.0, "cpu_ungated": 0.0, "frames": 0, "vad_calls": 0}
+    for path in files:
+        rate, pcm = load_wav(path)
+        audio_s = len(pcm) / 2 / rate
+        gated, cpu_g, st = run(rate, pcm, True, args)
+        ungated, cpu_u, _ = run(rate, pcm, False, args)
+
+        label_path = os.path.splitext(path)[0] + ".labels.json"
+        if os.path.exists(label_path):
+            with open(label_path, encoding="utf-8") as f:
+                reference, ref_name = [tuple(r) for r in json.load(f)], "labels"
+        else:
+            reference, ref_name = ungated, "ungated VAD"
+
+        totals["audio_s"] += audio_s
+        totals["cpu_gated"] += cpu_g
+        totals["cpu_ungated"] += cpu_u
+        totals["frames"] += st["frames"]
+        totals["vad_calls"] += st["vad_calls"]
+
+        print(f"{os.path.basename(path)}  {audio_s:.1f}s @ {rate} Hz")
+        print(f"  cpu/audio-s  gated {1000 * cpu_g / audio_s:.2f} ms   ungated {1000 * cpu_u / audio_s:.2f} ms")
+        print(f"  webrtcvad calls {st['vad_calls']}/{st['frames']} frames")
+        print(f"  endpointing vs {ref_name}: {score(gated, reference)}")
+
+    a = totals["audio_s"]
+    print(f"\nTOTAL {a:.1f}s audio: gated {1000 * totals['cpu_gated'] / a:.2f} ms/s, "
+          f"ungated {1000 * totals['cpu_ungated'] / a:.2f} ms/s, "
+          f"vad calls {totals['vad_calls']}/{totals['frames']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,11 @@ import subprocess
 import sys
 
 if __name__ == "__main__":
+    # --production: gevent server with admission limits and graceful drain (src/serve.py)
+    entry = "src/serve.py" if "--production" in sys.argv[1:] else "src/app.py"
+
     # Start Flask in a subprocess
-    flask_process = subprocess.Popen([sys.executable, "src/app.py"])
+    flask_process = subprocess.Popen([sys.executable, entry])
 
     try:
         print("Flask server started. Press Ctrl+C to stop.")
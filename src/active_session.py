@@ -0,0 +1,51 @@
+"""
+In-memory record of the most recently started session.
+
+The file data/last_session_id.txt is still written so the value survives a
+restart, but it is only read once. Clients can long-poll for changes
+instead of asking on every segment.
+"""
+import os
+import threading
+
+
+class ActiveSession:
+    def __init__(self, path="data/last_session_id.txt"):
+        self.path = path
+        self._cond = threading.Condition()
+        self._session_id = None
+        self._version = 0
+        self._loaded = False
+
+    def _load(self):
+        # Caller holds the lock
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._session_id = f.read().strip() or None
+        except OSError:
+            self._session_id = None
+
+    def get(self):
+        with self._cond:
+            self._load()
+            return self._session_id
+
+    def set(self, session_id: str):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(session_id)
+        with self._cond:
+            self._loaded = True
+            self._session_id = session_id
+            self._version += 1
+            self._cond.notify_all()
+
+    def wait_for_change(self, known, timeout: float):
+        """Block until the active session differs from `known` (or timeout); return the current one."""
+        with self._cond:
+            self._load()
+            self._cond.wait_for(lambda: self._session_id != known, timeout)
+            return self._session_id
@@ -0,0 +1,73 @@
+"""
+Admission control and graceful drain.
+
+AdmissionLimit caps how many /ws-audio sessions or /process requests run at
+once; over the limit a request is refused immediately (503 / close code
+1013) instead of queueing behind the others. Drain stops new work from
+being admitted and lets the serving loop wait until in-flight work is done.
+"""
+import threading
+import time
+
+
+class AdmissionLimit:
+    def __init__(self, name: str, limit: int = 0):
+        self.name = name
+        self.limit = limit            # 0 = unlimited
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.limit and self.in_flight >= self.limit:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"limit": self.limit, "in_flight": self.in_flight,
+                    "admitted": self.admitted, "rejected": self.rejected}
+
+
+class Drain:
+    """Process-wide drain switch over a set of limits."""
+
+    def __init__(self, *limits):
+        self.limits = limits
+        self._event = threading.Event()
+
+    @property
+    def draining(self) -> bool:
+        return self._event.is_set()
+
+    def begin(self):
+        self._event.set()
+
+    def admit(self, limit: AdmissionLimit) -> bool:
+        """Take a slot in `limit` unless draining or full."""
+        if self.draining:
+            with limit._lock:
+                limit.rejected += 1
+            return False
+        return limit.try_acquire()
+
+    def in_flight(self) -> int:
+        return sum(limit.in_flight for limit in self.limits)
+
+    def wait_idle(self, timeout: float, poll: float = 0.2) -> bool:
+        """Wait until nothing admitted is still running. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while self.in_flight() > 0:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(poll)
+        return True
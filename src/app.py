@@ -1,18 +1,42 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, Response
 import os
 from dotenv import load_dotenv
 from datetime import datetime
 import uuid
 import glob
-from transcribe import transcribe_audio
-from llm import get_llm_response
-from flask_socketio import SocketIO, emit
+from transcribe import transcribe_audio, transcribe_pcm
+from asr_backends import get_backend
+from incremental_asr import IncrementalTranscriber, transcribe_long
+from speculation import SpeculativeAnswer, SPECULATION_STATS
+from pipeline import ConnectionPipeline, Segment, pipelines_stats, BARGE_IN_STATS
+from active_session import ActiveSession
+from vad_frontend import VADFrontEnd, UtteranceSegmenter, SEG_IDLE, SEG_START, SEG_PAUSE, SEG_END, SEG_SPLIT
+from utterance_buffer import PCMSpool, BUFFER_STATS
+from segment_postproc import SegmentPostProcessor, POSTPROC_STATS
+from endpointer import AdaptiveEndpointer, ENDPOINT_STATS
+from token_stream import TokenCoalescer, COALESCE_STATS
+from artifact_writer import get_writer, wav_bytes
+from artifact_index import get_index
+from segment_archive import SegmentArchive, pcm_from_wav
+from metrics import Trace, STAGE_METRICS, render_gauges
+from admission import AdmissionLimit, Drain
+from llm import LLMStream, get_llm_response, llm_params
+from scheduler import SCHEDULER, PRIORITY_SPECULATIVE
+from response_cache import ResponseCache, CACHE_STATS, CACHE_TTL, replay_tokens
+from history_store import ChatHistoryStore
+from session_context import SessionContextCache
+from context_retrieval import estimate_tokens, render_selected_context
+import openai_client
+from flask_socketio import SocketIO, emit, join_room, leave_room, rooms
 from flask_sock import Sock
 from simple_websocket import ConnectionClosed
-import webrtcvad
-import wave
+import signal
+import sys
+import threading
+from functools import partial
 import time
 import json
+import re
 
 
 load_dotenv()  # Load environment variables from .env file
@@ -20,9 +44,83 @@ load_dotenv()  # Load environment variables from .env file
 app = Flask(__name__, template_folder='../templates', static_folder='../static')
 # Generate a random secret key for session management
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "dev-secret")
-socketio = SocketIO(app, cors_allowed_origins="*")
+# "threading" for the dev server; src/serve.py switches to "gevent" before importing this module
+socketio = SocketIO(app, cors_allowed_origins="*",
+                    async_mode=os.environ.get("AGENT_BOB_ASYNC_MODE", "threading"))
 sock = Sock(app)
 
+# Incremental ASR in /ws-audio: transcribe windows at pauses while speech continues
+INCREMENTAL_ASR = os.environ.get("AGENT_BOB_INCREMENTAL_ASR", "1") != "0"
+PAUSE_CUT_MS = int(os.environ.get("AGENT_BOB_PAUSE_CUT_MS", "300"))
+# End of turn after this much silence; pre-roll kept before onset; VAD hangover after speech
+END_SILENCE_MS = int(os.environ.get("AGENT_BOB_END_SILENCE_MS", "1000"))
+VAD_PREROLL_MS = int(os.environ.get("AGENT_BOB_VAD_PREROLL_MS", "300"))
+VAD_HANGOVER_MS = int(os.environ.get("AGENT_BOB_VAD_HANGOVER_MS", "60"))
+# NumPy energy/ZCR pre-check that skips webrtcvad on obvious silence.
+# Off by default: bench/vad_frontend.py shows webrtcvad is already cheaper per frame.
+VAD_ENERGY_GATE = os.environ.get("AGENT_BOB_VAD_ENERGY_GATE", "0") == "1"
+# Long utterances: force a split after this many seconds (0 = never), keep this much of an
+# utterance in RAM before spilling to a temp file, and send ASR at most this much audio per request
+MAX_UTTERANCE_S = float(os.environ.get("AGENT_BOB_MAX_UTTERANCE_S", "60"))
+UTTERANCE_MEM_KB = int(os.environ.get("AGENT_BOB_UTTERANCE_MEM_KB", "512"))
+ASR_MAX_WINDOW_S = float(os.environ.get("AGENT_BOB_ASR_MAX_WINDOW_S", "20"))
+# Segment post-processing before ASR: trim silence, drop blips under AGENT_BOB_MIN_SPEECH_MS of speech,
+# and (/ws-audio) hold segments under AGENT_BOB_MERGE_BELOW_MS of speech for AGENT_BOB_MERGE_GAP_MS in
+# case the question goes on (0 = never merge)
+POSTPROC = os.environ.get("AGENT_BOB_POSTPROC", "1") != "0"
+MIN_SPEECH_MS = int(os.environ.get("AGENT_BOB_MIN_SPEECH_MS", "250"))
+MERGE_GAP_MS = int(os.environ.get("AGENT_BOB_MERGE_GAP_MS", "600"))
+MERGE_BELOW_MS = int(os.environ.get("AGENT_BOB_MERGE_BELOW_MS", "1500"))
+# Adaptive end of turn in /ws-audio: end before AGENT_BOB_END_SILENCE_MS once the speaker's own pauses
+# allow it (never under AGENT_BOB_ENDPOINT_FLOOR_MS), or after AGENT_BOB_ENDPOINT_CUE_MS when the
+# settled partial transcript is a finished question
+ADAPTIVE_ENDPOINT = os.environ.get("AGENT_BOB_ADAPTIVE_ENDPOINT", "1") != "0"
+ENDPOINT_FLOOR_MS = int(os.environ.get("AGENT_BOB_ENDPOINT_FLOOR_MS", "500"))
+ENDPOINT_CUE_MS = int(os.environ.get("AGENT_BOB_ENDPOINT_CUE_MS", "500"))
+# Speculative generation on the settled partial transcript (needs incremental ASR)
+SPECULATE = os.environ.get("AGENT_BOB_SPECULATE", "1") != "0"
+SPECULATION_THRESHOLD = float(os.environ.get("AGENT_BOB_SPECULATION_THRESHOLD", "0.9"))
+# Streamed answers: flush a token frame every N ms or once it holds N chars
+TOKEN_FLUSH_MS = int(os.environ.get("AGENT_BOB_TOKEN_FLUSH_MS", "30"))
+TOKEN_FLUSH_CHARS = int(os.environ.get("AGENT_BOB_TOKEN_FLUSH_CHARS", "64"))
+# Where a turn's recording, transcript, prompt and response go: "files" (one file each under
+# data/<kind>/) or "archive" (one record in data/archive/<session>.seg, FLAC audio if asked)
+ARTIFACT_LAYOUT = os.environ.get("AGENT_BOB_ARTIFACT_LAYOUT", "files")
+ARCHIVE_FLAC = os.environ.get("AGENT_BOB_ARCHIVE_FLAC", "0") == "1"
+# Barge-in: this much speech in a new utterance cancels the answer still streaming
+BARGE_IN = os.environ.get("AGENT_BOB_BARGE_IN", "1") != "0"
+BARGE_IN_MS = int(os.environ.get("AGENT_BOB_BARGE_IN_MS", "300"))
+# Answer cache: repeats and rephrasings of a standalone question within a session
+RESPONSE_CACHE = os.environ.get("AGENT_BOB_RESPONSE_CACHE", "1") != "0"
+CACHE_SIMILARITY = float(os.environ.get("AGENT_BOB_CACHE_SIMILARITY", "0.9"))
+CACHE_SIZE = int(os.environ.get("AGENT_BOB_CACHE_SIZE", "512"))
+# Prompt context: "retrieval" sends only the BM25-selected resume/JD chunks, "full" both documents.
+# The token budget covers the selected chunks plus the chat history.
+CONTEXT_MODE = os.environ.get("AGENT_BOB_CONTEXT_MODE", "retrieval")
+CONTEXT_TOP_K = int(os.environ.get("AGENT_BOB_CONTEXT_TOP_K", "6"))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("AGENT_BOB_CONTEXT_TOKEN_BUDGET", "1500"))
+# Concurrent /ws-audio sessions and /process requests (0 = unlimited); extra ones get 503 / close 1013
+ws_limit = AdmissionLimit("ws_audio", int(os.environ.get("AGENT_BOB_MAX_WS_SESSIONS", "0")))
+process_limit = AdmissionLimit("process", int(os.environ.get("AGENT_BOB_MAX_PROCESS", "0")))
+drain = Drain(ws_limit, process_limit)
+# Write each utterance's stage timings to data/prompts/<slug>_<id>.trace.json
+TRACE_FILES = os.environ.get("AGENT_BOB_TRACE", "0") == "1"
+# All per-utterance artifacts (and history lines) are written off the request path
+artifacts = get_writer()
+# SQLite index of every turn (AGENT_BOB_ARTIFACT_INDEX; None when turned off)
+artifact_index = get_index()
+archive = SegmentArchive("data/archive", flac=ARCHIVE_FLAC) if ARTIFACT_LAYOUT == "archive" else None
+# Speech-to-text backend (AGENT_BOB_ASR_BACKEND); a local model starts loading now, not on the first utterance
+asr_backend = get_backend()
+if asr_backend.name == "local":
+    asr_backend.warm()
+history_store = ChatHistoryStore("data/sessions", tail_size=20, writer=artifacts)
+context_cache = SessionContextCache("data/sessions", max_entries=64)
+active_session_id = ActiveSession('data/last_session_id.txt')
+response_cache = ResponseCache(max_entries=CACHE_SIZE, ttl=CACHE_TTL,
+                               similarity=CACHE_SIMILARITY) if RESPONSE_CACHE else None
+LONG_POLL_MAX_WAIT = 30.0
+
 # ---------------------------
 # Helpers (deduped utilities)
 # ---------------------------
@@ -48,14 +146,53 @@ def ensure_dirs():
     os.makedirs('data/responses', exist_ok=True)
     os.makedirs('data/sessions', exist_ok=True)
 
-def stream_llm_tokens(text):
+def stream_llm_tokens(text, session_id=None):
     """
     Standardized iterator over LLM tokens.
     """
-    for token in get_llm_response(text, stream=True):
+    for token in get_llm_response(text, stream=True, session_id=session_id):
         if token:
             yield token
 
+def emit_to_session(event, session_id, data=None):
+    """Emit a Socket.IO event only to the browsers that joined this session's room."""
+    if not session_id:
+        # to=None would broadcast to every connected client
+        return
+    if data is None:
+        socketio.emit(event, to=session_id)
+    else:
+        socketio.emit(event, data, to=session_id)
+
+def stream_answer(session_id, tokens, stop=None):
+    """
+    Forward LLM tokens to the session room as coalesced, sequence-numbered
+    frames and return (full_response, frames_sent). Stops early once
+    stop() is true.
+    """
+    response_buffer = []
+    with TokenCoalescer(lambda frame: emit_to_session('token', session_id, frame),
+                        max_delay=TOKEN_FLUSH_MS / 1000, max_chars=TOKEN_FLUSH_CHARS) as coalescer:
+        for token in tokens:
+            if stop is not None and stop():
+                break
+            response_buffer.append(token)
+            coalescer.push(token)
+    return ''.join(response_buffer), coalescer.seq
+
+def finish_trace(trace, slug, unique_id):
+    """Close the utterance's trace and, when enabled, store it next to the prompt JSON."""
+    trace.finish()
+    if TRACE_FILES:
+        artifacts.write_json(f"data/prompts/{slug}_{unique_id}.trace.json",
+                             {"id": f"{slug}_{unique_id}", **trace.as_dict()})
+
+# Session ids name directories and Socket.IO rooms (/start-session hands out uuid4 hex)
+_SESSION_ID_RE = re.compile(r"[A-Za-z0-9_-]{1,128}")
+
+def valid_session_id(sid) -> bool:
+    return isinstance(sid, str) and _SESSION_ID_RE.fullmatch(sid) is not None
+
 def get_session_id():
     """
     Return current session id from (in order):
@@ -63,8 +200,14 @@ def get_session_id():
       2) JSON body 'session_id'
       3) form field 'session_id'
       4) Flask session cookie
-    Raise if none found.
+    Raise if none found, or if the one found is malformed.
     """
+    sid = _find_session_id()
+    if not valid_session_id(sid):
+        raise RuntimeError("Invalid session_id.")
+    return sid
+
+def _find_session_id():
     # 1) Header
     sid = request.headers.get('X-Session-Id')
     if sid:
@@ -89,90 +232,125 @@ def get_session_id():
 
     raise RuntimeError("No active session. Provide session_id or call /start-session first.")
 
-def get_chat_file(session_id: str) -> str:
-    """Ensure session dir exists and return path to its chat.json file."""
-    session_dir = f"data/sessions/{session_id}"
-    os.makedirs(session_dir, exist_ok=True)
-    return os.path.join(session_dir, "chat.json")
-
-def append_chat_history(session_id: str, timestamp: str, user_text: str, assistant_text: str):
+def append_chat_history(session_id: str, timestamp: str, user_text: str, assistant_text: str,
+                        interrupted: bool = False):
     """
-    Append a single turn to the session's chat history JSON.
-    Record shape: { "timestamp": ..., "user": ..., "assistant": ... }
+    Append a single turn to the session's chat history (chat.jsonl) and push
+    it to the session room as a 'history' event carrying its seq.
+    Record shape: { "timestamp": ..., "user": ..., "assistant": ... }, plus
+    "interrupted": true when barge-in cut the answer short.
     """
-    chat_file = get_chat_file(session_id)
-
-    # Load existing history if present
-    history = []
-    if os.path.exists(chat_file):
-        try:
-            with open(chat_file, 'r', encoding='utf-8') as f:
-                history = json.load(f) or []
-        except Exception:
-            history = []
-
-    # Append new turn
-    history.append({
+    turn = {
         "timestamp": timestamp,
         "user": user_text,
         "assistant": assistant_text
-    })
-
-    # Save back
-    with open(chat_file, 'w', encoding='utf-8') as f:
-        json.dump(history, f, ensure_ascii=False, indent=2)
-
-def build_messages_text(session_id: str, transcript: str, max_turns: int = 5) -> str:
+    }
+    if interrupted:
+        turn["interrupted"] = True
+    seq = history_store.append(session_id, turn)
+    emit_to_session('history', session_id, dict(turn, seq=seq))
+    return seq
+
+def artifact_paths(session_id: str, uid: str) -> dict:
+    """Where the turn's artifacts live: four files, or one archive holding all of them."""
+    if archive is not None:
+        path = archive.seg_path(session_id)
+        return {"recording": path, "transcript_file": path, "response_file": path, "prompt_file": path}
+    return {"recording": f"data/recordings/{uid}.wav", "transcript_file": f"data/transcripts/{uid}.txt",
+            "response_file": f"data/responses/{uid}.txt", "prompt_file": f"data/prompts/{uid}.json"}
+
+def archive_turn(session_id: str, uid: str, timestamp: str, transcript: str, response: str, prompt: dict,
+                 **audio):
+    """Queue the whole turn as one archive record (audio: pcm + sample_rate, or upload + filename)."""
+    artifacts.append_segment(archive, session_id, dict(
+        uid=uid, timestamp=timestamp, transcript=transcript, response=response, prompt=prompt, **audio
+    ))
+
+def index_turn(uid: str, session_id: str, timestamp: str, source: str, transcript: str, response: str,
+               **flags):
+    """Queue the turn for the artifact index."""
+    if artifact_index is None:
+        return
+    artifact_index.record(
+        uid=uid, session_id=session_id, ts=timestamp, source=source, transcript=transcript,
+        response=response, **artifact_paths(session_id, uid), **flags
+    )
+
+def _cache_history(session_id: str):
+    """The session's recent (question, answer) turns, for the exchange a cached answer followed."""
+    return [(t.get("user") or "", t.get("assistant") or "") for t in history_store.tail(session_id, 5)]
+
+def cached_answer(session_id: str, transcript: str):
+    """Return (answer, kind) from the response cache, or None."""
+    if response_cache is None:
+        return None
+    hit = response_cache.lookup(session_id, transcript, context_cache.get(session_id).prefix, llm_params(),
+                                history=_cache_history(session_id))
+    if hit is None:
+        return None
+    answer, kind, score = hit
+    print(f"[cache] {kind} hit for session {session_id} (score {score:.2f})")
+    return answer, kind
+
+def remember_answer(session_id: str, transcript: str, answer: str):
+    if response_cache is not None:
+        # Called before the turn is recorded, so the history is the same one the lookup saw
+        response_cache.store(session_id, transcript, context_cache.get(session_id).prefix, llm_params(), answer,
+                             history=_cache_history(session_id))
+
+def build_messages_text(session_id: str, transcript: str, max_turns: int = 5,
+                        mode: str = None, top_k: int = None, budget: int = None) -> str:
     """
     Assemble the full user message with:
-      - [CONTEXT] resume + job description (from session files)
-      - [CHAT_HISTORY] last N turns from chat.json
+      - [CONTEXT] resume + job description: both documents in full, or in
+        retrieval mode when they don't fit the budget, the chunks most
+        relevant to the transcript topped up with the leading ones
+      - [CHAT_HISTORY] last N turns from the history store
       - [NEW_PROMPT] the fresh transcript
       - [OUTPUT_INSTRUCTIONS] interview style guardrails
+    In retrieval mode the history (newest first, at most half the budget)
+    and the chunks together stay within `budget` tokens.
     """
-    session_dir = f"data/sessions/{session_id}"
-    resume_path = os.path.join(session_dir, "resume.txt")
-    jd_path = os.path.join(session_dir, "job_description.txt")
-    chat_file = get_chat_file(session_id)
-
-    # Load resume/JD
-    resume = ""
-    if os.path.exists(resume_path):
-        with open(resume_path, encoding="utf-8") as f:
-            resume = f.read()
-
-    jd = ""
-    if os.path.exists(jd_path):
-        with open(jd_path, encoding="utf-8") as f:
-            jd = f.read()
-
-    # Load last N turns of chat history
-    history = []
-    if os.path.exists(chat_file):
-        try:
-            with open(chat_file, 'r', encoding='utf-8') as f:
-                history = json.load(f) or []
-        except Exception:
-            history = []
-
-    # Chronological last N turns
-    history_sorted = sorted(history, key=lambda t: t.get("timestamp", ""))[-max_turns:]
+    mode = mode or CONTEXT_MODE
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    # Static prefix and the chunk index come from the session context cache
+    ctx = context_cache.get(session_id)
+
+    # Chronological last N turns, served from the in-memory tail
+    turns = history_store.tail(session_id, max_turns)
     hist_lines = []
-    for t in history_sorted:
+    for t in turns:
         q = (t.get("user") or "").strip()
         a = (t.get("assistant") or "").strip()
         if q or a:
+            if t.get("interrupted"):
+                a += " [interrupted]"
             hist_lines.append(f"- Q: {q}\n  A: {a}")
-    hist_block = "\n".join(hist_lines) if hist_lines else "(none)"
 
-    return f"""[CONTEXT]
-RESUME:
-{resume}
-
-JOB_DESCRIPTION:
-{jd}
+    if mode == "full":
+        prefix = ctx.prefix
+    else:
+        kept, used = [], 0
+        for line in reversed(hist_lines):
+            cost = estimate_tokens(line)
+            if used + cost > budget // 2:
+                break
+            kept.append(line)
+            used += cost
+        hist_lines = kept[::-1]
+        # Follow-ups ("can you go deeper on that?") borrow terms from the previous question
+        query = transcript
+        if turns:
+            query += "\n" + (turns[-1].get("user") or "")
+        if ctx.prefix_tokens <= budget - used:
+            # Both documents fit: nothing to gain from leaving parts out
+            prefix = ctx.prefix
+        else:
+            chunks = ctx.index.select(query, k=top_k or CONTEXT_TOP_K, budget=budget - used)
+            prefix = render_selected_context(chunks)
+    hist_block = "\n".join(hist_lines) if hist_lines else "(none)"
 
-[CHAT_HISTORY_LAST_{max_turns}_TURNS]
+    return prefix + f"""[CHAT_HISTORY_LAST_{max_turns}_TURNS]
 {hist_block}
 
 [NEW_PROMPT]
@@ -206,115 +384,432 @@ def index():
 # WebSocket audio route
 # ---------------------------
 
+def _drop_segment(seg):
+    """A full queue evicted this segment: release whatever it holds in flight."""
+    print(f"[warn] dropping queued segment for session {seg.session_id}")
+    if getattr(seg, 'speculative', None) is not None:
+        seg.speculative.cancel()
+    if getattr(seg, 'transcriber', None) is not None:
+        seg.transcriber.cancel()
+
+def _retracted(seg):
+    """An early end the speaker talked through: its audio went into the next segment, so drop this one."""
+    if not seg.retracted:
+        return False
+    if seg.speculative is not None:
+        seg.speculative.cancel()
+    if seg.transcriber is not None:
+        seg.transcriber.cancel()
+    return True
+
+def ws_asr_stage(seg):
+    """Pipeline stage: finish transcription from memory (the recording is written once the turn is final)."""
+    if _retracted(seg):
+        return None
+    trace = seg.trace
+    trace.mark("queue_wait", seg.queued_at)
+    seg.unique_id, now = make_ids()
+    seg.slug = ts_slug(now)
+    seg.recording_filename = f"data/recordings/{seg.slug}_{seg.unique_id}.wav"
+
+    try:
+        with trace.span("asr"):
+            if seg.transcriber is not None:
+                # Only the tail after the last pause cut is still outstanding
+                seg.text = seg.transcriber.finish()
+            else:
+                # A window at a time, so a spilled utterance is never read back whole
+                seg.text = transcribe_long(seg.pcm, seg.sample_rate,
+                                           transcribe_fn=partial(transcribe_pcm, session_id=seg.session_id),
+                                           window_ms=int(ASR_MAX_WINDOW_S * 1000))
+    except Exception:
+        if seg.speculative is not None:
+            seg.speculative.cancel()
+        raise
+
+    # Nothing intelligible (e.g. a noise-only segment), or retracted while transcribing: don't ask the LLM
+    if not seg.text.strip() or _retracted(seg):
+        if seg.speculative is not None:
+            seg.speculative.cancel()
+        return None
+    seg.queued_at = time.perf_counter()
+    return seg
+
+def stream_interruptible(seg, pipeline, tokens, cancel):
+    """
+    Stream the answer as the one barge-in may cancel (cancel() stops the
+    token source from another thread) and account for a cancel.
+    """
+    pipeline.begin_answer(seg, cancel)
+    try:
+        seg.response, seg.frames = stream_answer(seg.session_id, seg.trace.tokens(tokens),
+                                                 stop=lambda: seg.interrupted)
+    finally:
+        pipeline.end_answer(seg)
+    streamed = estimate_tokens(seg.response)
+    if seg.interrupted:
+        seg.trace.mark("barge_in_cancel", seg.interrupted_at)
+        BARGE_IN_STATS.record(time.perf_counter() - seg.interrupted_at, streamed)
+    else:
+        BARGE_IN_STATS.answer_completed(streamed)
+
+def ws_llm_stage(seg, pipeline):
+    """Pipeline stage: stream the answer (from the cache, or the speculative run when it still matches)."""
+    if _retracted(seg):
+        return None
+    speculative, trace = seg.speculative, seg.trace
+    trace.mark("llm_queue_wait", seg.queued_at)
+    # Let the previous turn reach chat history: the cache key and the prompt build on it
+    with trace.span("history_wait"):
+        pipeline.wait_persisted()
+    with trace.span("cache_lookup"):
+        hit = cached_answer(seg.session_id, seg.text)
+    seg.cached = hit[1] if hit else None
+    if hit is not None:
+        if speculative is not None:
+            speculative.cancel()
+        emit_to_session('clear', seg.session_id)
+        seg.prompt, seg.speculated = None, False
+        # Nothing to close for a replay: stream_answer stops at the next token
+        stream_interruptible(seg, pipeline, replay_tokens(hit[0]), cancel=lambda: None)
+        if seg.retracted:
+            return None
+        seg.queued_at = time.perf_counter()
+        return seg
+
+    # Keep the speculative answer only if the final transcript still matches it
+    if speculative is not None and (not speculative.matches(seg.text, SPECULATION_THRESHOLD)
+                                    or (speculative.finished and speculative.error is not None)):
+        speculative.cancel(record_as="misses")
+        speculative = None
+
+    emit_to_session('clear', seg.session_id)
+
+    if speculative is not None:
+        # The prompt actually sent is the one built from the partial transcript
+        seg.prompt = speculative.prompt
+        tokens = speculative.release()
+        cancel = partial(speculative.cancel, record_as=None)
+    else:
+        with trace.span("prompt_build"):
+            seg.prompt = build_messages_text(seg.session_id, seg.text, max_turns=5)
+        tokens = LLMStream(seg.prompt, session_id=seg.session_id)
+        cancel = tokens.cancel
+    seg.speculated = speculative is not None
+
+    stream_interruptible(seg, pipeline, tokens, cancel)
+    if seg.retracted:
+        # Taken back mid-answer: its audio opens the next segment, which gets the turn
+        return None
+    if not seg.interrupted:
+        # A cut-off answer is not one to serve again
+        remember_answer(seg.session_id, seg.text, seg.response)
+    seg.queued_at = time.perf_counter()
+    return seg
+
+def ws_persist_stage(seg):
+    """Pipeline stage: queue recording, transcript, prompt and response writes and record the chat turn."""
+    # An early-closed turn may still be taken back until the next onset (or the fixed timer) settles it
+    seg.final.wait()
+    if seg.retracted:
+        # Retracted after its answer finished: the next segment repeats this speech
+        return None
+    slug, unique_id, trace = seg.slug, seg.unique_id, seg.trace
+    trace.mark("persist_queue_wait", seg.queued_at)
+    persist_start = time.perf_counter()
+    prompt_record = {
+        "timestamp": human_ts_from_slug(slug),
+        "session_id": seg.session_id,
+        "transcript": seg.text,
+        "speculative": seg.speculated,
+        "cached": seg.cached,
+        "interrupted": seg.interrupted,
+        "prompt": seg.prompt
+    }
+    if archive is not None:
+        archive_turn(seg.session_id, f"{slug}_{unique_id}", human_ts_from_slug(slug), seg.text, seg.response,
+                     prompt_record, pcm=seg.pcm, sample_rate=seg.sample_rate)
+    else:
+        with trace.span("wav_write"):
+            artifacts.write_wav(seg.recording_filename, seg.pcm, seg.sample_rate)
+        artifacts.write_text(f"data/transcripts/{slug}_{unique_id}.txt", seg.text)
+        artifacts.write_json(f"data/prompts/{slug}_{unique_id}.json", prompt_record)
+        artifacts.write_text(f"data/responses/{slug}_{unique_id}.txt", seg.response)
+
+    append_chat_history(
+        seg.session_id,
+        human_ts_from_slug(slug),
+        seg.text,
+        seg.response,
+        interrupted=seg.interrupted
+    )
+    index_turn(f"{slug}_{unique_id}", seg.session_id, human_ts_from_slug(slug), "ws", seg.text, seg.response,
+               cached=seg.cached, speculative=seg.speculated, interrupted=seg.interrupted)
+    trace.mark("persist", persist_start)
+
+    emit_to_session('complete', seg.session_id, {'frames': seg.frames, 'interrupted': seg.interrupted})
+    finish_trace(trace, slug, unique_id)
+    return seg
+
 @sock.route('/ws-audio')
 def ws_audio(ws):
-    """Receive PCM audio over WebSocket, transcribe, and stream LLM tokens."""
+    """
+    Receive PCM audio over WebSocket and segment it with VAD.
+    Incoming chunks of any size are re-sliced into VAD-legal frames; finished
+    utterances go to a per-connection pipeline (ASR -> LLM -> persistence),
+    so this loop keeps reading frames while answers are being produced.
+    """
+    if not drain.admit(ws_limit):
+        # 1013 = try again later
+        ws.close(reason=1013, message="server busy" if not drain.draining else "server draining")
+        return
+    try:
+        _ws_audio_session(ws)
+    finally:
+        ws_limit.release()
+
+def _ws_audio_session(ws):
     try:
         hello_msg = ws.receive()
         if hello_msg is None:
             return
         hello = json.loads(hello_msg)
         session_id = hello.get('session_id')
+        if not valid_session_id(session_id):
+            # 1008 = policy violation: answers are routed to, and stored under, the session
+            ws.close(reason=1008, message="missing or invalid session_id")
+            return
         sample_rate = int(hello.get('sample_rate', 16000))
         frame_ms = int(hello.get('frame_ms', 30))
+        preroll_ms = int(hello.get('preroll_ms', VAD_PREROLL_MS))
+        hangover_ms = int(hello.get('hangover_ms', VAD_HANGOVER_MS))
+        incremental = bool(hello.get('incremental', INCREMENTAL_ASR))
+        speculate = incremental and bool(hello.get('speculate', SPECULATE))
     except Exception:
         return
 
-    vad = webrtcvad.Vad(2)
-    bytes_per_frame = int(sample_rate * frame_ms / 1000) * 2
-    max_silence_frames = max(1, int(1000 / frame_ms))
+    # VAD runs at a webrtcvad-legal rate; segments are stored and transcribed at that rate too
+    frontend = VADFrontEnd(sample_rate, frame_ms=frame_ms, aggressiveness=2,
+                           hangover_ms=hangover_ms, use_gate=VAD_ENERGY_GATE)
+    vad_rate = frontend.sample_rate
+    # A shorter pause inside the utterance is where incremental ASR cuts a window
+    segmenter = UtteranceSegmenter(frontend.frame_ms, preroll_ms=preroll_ms,
+                                   pause_ms=PAUSE_CUT_MS, end_silence_ms=END_SILENCE_MS,
+                                   max_utterance_ms=int(MAX_UTTERANCE_S * 1000),
+                                   max_memory=UTTERANCE_MEM_KB * 1024)
     INACTIVITY_TIMEOUT = 5.0
 
-    while True:
-        audio_buf = bytearray()
-        silence_frames = 0
-        last_frame_time = time.time()
-        closed = False
+    def emit_partial(text):
+        emit_to_session('partial_transcript', session_id, {'text': text})
+
+    pipeline = ConnectionPipeline(
+        session_id,
+        asr_stage=ws_asr_stage,
+        llm_stage=lambda seg: ws_llm_stage(seg, pipeline),
+        persist_stage=ws_persist_stage,
+        on_drop=_drop_segment,
+    ).start()
+
+    transcriber = None
+    speculative = None
+    last_speech_at = None
+    # Speech frames in the current utterance, and whether it has barged in yet
+    speech_frames = 0
+    barged_in = False
+    barge_in_frames = max(1, BARGE_IN_MS // frontend.frame_ms)
+
+    # Audio this connection holds in RAM: the unspilled utterance, one ASR window plus its
+    # overlap, the pre-roll and a frame in flight
+    bytes_per_ms = vad_rate * 2 / 1000
+    memory_cap = UTTERANCE_MEM_KB * 1024 + int(
+        (ASR_MAX_WINDOW_S * 1000 + 500 + preroll_ms + frontend.frame_ms) * bytes_per_ms)
+    BUFFER_STATS.register(ws, lambda: (
+        segmenter.audio.memory_bytes + (transcriber.memory_bytes if transcriber is not None else 0),
+        segmenter.audio.spilled_bytes), memory_cap)
+
+    def start_transcriber():
+        nonlocal transcriber
+        transcriber = IncrementalTranscriber(
+            vad_rate, transcribe_fn=partial(transcribe_pcm, session_id=session_id),
+            max_window_ms=int(ASR_MAX_WINDOW_S * 1000), on_partial=emit_partial)
+        transcriber.add(segmenter.audio[:], True)
+
+    post = SegmentPostProcessor(vad_rate, frontend.frame_ms, min_speech_ms=MIN_SPEECH_MS,
+                                merge_gap_ms=MERGE_GAP_MS, merge_below_ms=MERGE_BELOW_MS) if POSTPROC else None
+    held_speech_at = None
+
+    endpointer = AdaptiveEndpointer(frontend.frame_ms, max_ms=END_SILENCE_MS, floor_ms=ENDPOINT_FLOOR_MS,
+                                    cue_ms=ENDPOINT_CUE_MS) if ADAPTIVE_ENDPOINT else None
+    # The last turn closed before the fixed timer: (its segment, or None if held/dropped, and the
+    # frame its silence began), until the next onset shows whether the speaker was done
+    early_end = None
+
+    def submit(pcm, endpoint, transcriber=None, speculative=None, final=True):
+        now = time.perf_counter()
+        # The answer's clock starts when the speaker stopped, not when the endpointer fired
+        trace = Trace(session_id, "ws-audio", started_at=endpoint)
+        trace.mark("endpoint", endpoint)
+        seg = Segment(session_id, vad_rate, pcm, transcriber=transcriber, speculative=speculative,
+                      trace=trace, queued_at=now, retracted=False, final=threading.Event())
+        if final:
+            seg.final.set()
+        pipeline.submit(seg)
+        return seg
+
+    def settle_early_end():
+        """The early-closed turn is no longer retractable: let the persist stage have it."""
+        nonlocal early_end
+        if early_end is not None and early_end[0] is not None:
+            early_end[0].final.set()
+        early_end = None
+
+    def end_utterance(final=True):
+        nonlocal transcriber, speculative, last_speech_at, held_speech_at
+        endpoint = last_speech_at or time.perf_counter()
+        pcm = segmenter.take()
+        if isinstance(pcm, PCMSpool):
+            BUFFER_STATS.record_spill(len(pcm))
+        kept = post.end(pcm, segmenter.frames_seen) if post is not None else None
+        seg = None
+        if post is not None and kept is None:
+            # A blip (dropped) or a fragment held to merge with what comes next: it is
+            # transcribed from its audio if it goes out alone, so its windows are not needed
+            if transcriber is not None:
+                transcriber.cancel()
+            if speculative is not None:
+                speculative.cancel()
+            held_speech_at = endpoint if post.holding else None
+        elif post is not None:
+            if transcriber is not None:
+                # Trailing silence not yet sent to ASR stays out of the last window
+                transcriber.truncate(kept.end)
+            seg = submit(kept.pcm, endpoint, transcriber, speculative, final)
+        else:
+            seg = submit(pcm, endpoint, transcriber, speculative, final)
+        transcriber = None
+        speculative = None
+        last_speech_at = None
+        return seg
+
+    def release_held(kept):
+        nonlocal held_speech_at
+        if kept is not None:
+            submit(kept.pcm, held_speech_at or time.perf_counter())
+            held_speech_at = None
 
-        while True:
+    try:
+        last_frame_time = time.time()
+        while not drain.draining:
             try:
-                frame = ws.receive(timeout=1)
+                chunk = ws.receive(timeout=1)
             except ConnectionClosed:
-                closed = True
                 break
 
-            if frame is None:
+            if chunk is None:
                 if time.time() - last_frame_time > INACTIVITY_TIMEOUT:
-                    closed = True
                     break
                 continue
 
-            if isinstance(frame, str):
+            if isinstance(chunk, str):
                 continue
 
-            audio_buf.extend(frame)
             last_frame_time = time.time()
 
-            if len(frame) == bytes_per_frame and vad.is_speech(frame, sample_rate):
-                silence_frames = 0
-            else:
-                silence_frames += 1
-
-            if silence_frames >= max_silence_frames:
-                break
-
-        if not audio_buf:
-            break
-
-        unique_id, now = make_ids()
-        slug = ts_slug(now)
-        ensure_dirs()
-        recording_filename = f"data/recordings/{slug}_{unique_id}.wav"
-        with wave.open(recording_filename, 'wb') as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)
-            wf.setframerate(sample_rate)
-            wf.writeframes(bytes(audio_buf))
-
-        try:
-            text = transcribe_audio(recording_filename)
-        except Exception:
-            break
-
-        transcript_filename = f"data/transcripts/{slug}_{unique_id}.txt"
-        with open(transcript_filename, 'w', encoding='utf-8') as f:
-            f.write(text)
-
-        socketio.emit('clear')
-
-        response_filename = f"data/responses/{slug}_{unique_id}.txt"
-        messages_text = build_messages_text(session_id, text, max_turns=5)
-
-        prompt_filename = f"data/prompts/{slug}_{unique_id}.json"
-        os.makedirs("data/prompts", exist_ok=True)
-        with open(prompt_filename, 'w', encoding='utf-8') as f:
-            json.dump({
-                "timestamp": human_ts_from_slug(slug),
-                "session_id": session_id,
-                "transcript": text,
-                "prompt": messages_text
-            }, f, ensure_ascii=False, indent=2)
-
-        response_buffer = []
-        for token in stream_llm_tokens(messages_text):
-            response_buffer.append(token)
-            socketio.emit('token', {'token': token})
-
-        full_response = ''.join(response_buffer)
-        with open(response_filename, 'w', encoding='utf-8') as f:
-            f.write(full_response)
-
-        append_chat_history(
-            session_id,
-            human_ts_from_slug(slug),
-            text,
-            full_response
-        )
-
-        socketio.emit('complete')
-
-        if closed:
-            break
+            for frame, is_speech in frontend.feed(chunk):
+                event = segmenter.push(frame, is_speech)
+                if post is not None:
+                    release_held(post.poll(segmenter.frames_seen))
+                if early_end is not None and segmenter.frames_seen - early_end[1] >= endpointer.end_frames:
+                    # The fixed timer would have closed the turn by now: the early end stands
+                    settle_early_end()
+                if event == SEG_IDLE:
+                    continue
+                if is_speech:
+                    last_speech_at = time.perf_counter()
+                    speech_frames += 1
+                if endpointer is not None and segmenter.resumed_after:
+                    endpointer.observe_pause(segmenter.resumed_after * frontend.frame_ms)
+
+                if event == SEG_START:
+                    speech_frames, barged_in = 1, False
+                    held = post.start(segmenter.frames_seen) if post is not None else None
+                    if held is not None:
+                        # The short segment before the pause was the start of this question
+                        segmenter.prepend(held)
+                        held_speech_at = None
+                    if early_end is not None:
+                        early_seg, silent_from = early_end
+                        gap_ms = (segmenter.frames_seen - 1 - silent_from) * frontend.frame_ms
+                        if endpointer.resumed(gap_ms) and early_seg is not None:
+                            # The speaker was not done: take the turn back and carry its audio into this one
+                            early_seg.retracted = True
+                            pipeline.interrupt(early_seg)
+                            segmenter.prepend(early_seg.pcm)
+                        settle_early_end()
+                    if incremental:
+                        start_transcriber()
+                    continue
+
+                if event == SEG_SPLIT:
+                    # Over-long utterance (monologue, stuck-open mic): answer what was said up to
+                    # the quietest recent frame; the rest opens the next utterance
+                    BUFFER_STATS.record_split()
+                    if transcriber is not None:
+                        transcriber.truncate(segmenter.split_offset)
+                    end_utterance()
+                    if incremental:
+                        start_transcriber()
+                    continue
+
+                if BARGE_IN and not barged_in and speech_frames >= barge_in_frames:
+                    # The interviewer is asking something new: stop the previous answer
+                    barged_in = True
+                    cut = pipeline.interrupt()
+                    if cut is not None:
+                        print(f"[barge-in] session {session_id}: cancelled the answer in progress")
+
+                if transcriber is not None:
+                    transcriber.add(frame, is_speech)
+                    if event == SEG_PAUSE:
+                        transcriber.pause()
+
+                if speculate:
+                    if is_speech and speculative is not None:
+                        # The speaker carried on: the speculated question is stale
+                        speculative.cancel()
+                        speculative = None
+                    elif (speculative is None and segmenter.silence_frames >= segmenter.pause_frames
+                          and transcriber.settled()):
+                        partial_text = transcriber.text()
+                        if partial_text.strip():
+                            # Speculation yields to interactive requests in the OpenAI scheduler
+                            speculative = SpeculativeAnswer(
+                                partial_text, build_messages_text(session_id, partial_text, max_turns=5),
+                                stream_factory=partial(LLMStream, session_id=session_id,
+                                                       priority=PRIORITY_SPECULATIVE))
+
+                if event == SEG_END:
+                    if endpointer is not None:
+                        endpointer.ended(segmenter.silence_frames)
+                    end_utterance()
+                elif endpointer is not None and not is_speech:
+                    # Only a transcript that has caught up with the audio counts as a cue
+                    settled = transcriber.text() if transcriber is not None and transcriber.settled() else None
+                    if endpointer.should_end(segmenter.silence_frames, settled):
+                        silent_from = segmenter.frames_seen - segmenter.silence_frames
+                        endpointer.ended(segmenter.silence_frames)
+                        early_end = (end_utterance(final=False), silent_from)
+
+        # Socket closed (or server draining) mid-utterance: still answer what was said
+        if segmenter.in_utterance:
+            end_utterance()
+        if post is not None:
+            release_held(post.flush())
+    finally:
+        settle_early_end()
+        BUFFER_STATS.unregister(ws)
+        # Let queued answers finish even though the socket is gone
+        pipeline.close(drain=True)
 
 
 @app.route('/process', methods=['POST'])
@@ -324,6 +819,15 @@ def process_audio():
     and writes a single final response file at the end (no duplicate writes).
     Returns JSON when complete. No HTTP streaming body is used—WebSockets only.
     """
+    if not drain.admit(process_limit):
+        error = "Server draining" if drain.draining else "Too many requests in flight"
+        return jsonify({"error": error}), 503, {"Retry-After": "1"}
+    try:
+        return _process_audio()
+    finally:
+        process_limit.release()
+
+def _process_audio():
     ensure_dirs()
 
     if 'audio' not in request.files:
@@ -337,53 +841,82 @@ def process_audio():
 
     print(f"Using session ID for chat history: {current_session_id}")
 
+    trace = Trace(current_session_id, "process")
     audio_file = request.files['audio']
     unique_id, now = make_ids()
     slug = ts_slug(now)  # YYYYMMDD_HHMMSS
 
-    # Save recording
-    recording_filename = f"data/recordings/{slug}_{unique_id}.wav"
-    audio_file.save(recording_filename)
+    # Keep the upload in memory; the recording is written in the background
+    # (with the archive layout, together with the rest of the turn at the end)
+    paths = artifact_paths(current_session_id, f"{slug}_{unique_id}")
+    recording_filename = paths["recording"]
+    with trace.span("upload_read"):
+        audio_bytes = audio_file.read()
+    if POSTPROC:
+        # One upload at a time here: trim and drop, no merging (the capture client merges)
+        decoded = pcm_from_wav(audio_bytes)
+        if decoded is not None:
+            pcm, rate = decoded
+            kept = SegmentPostProcessor(rate, min_speech_ms=MIN_SPEECH_MS).end(pcm, 0)
+            if kept is None:
+                return jsonify({"status": "skipped", "reason": "no speech"}), 200
+            if len(kept.pcm) < len(pcm):
+                audio_bytes = wav_bytes(kept.pcm, rate)
+    if archive is None:
+        with trace.span("wav_write"):
+            artifacts.write_bytes(recording_filename, audio_bytes)
 
     try:
-        # Transcribe audio
-        text = transcribe_audio(recording_filename)
+        # Transcribe audio straight from memory
+        with trace.span("asr"):
+            text = transcribe_audio(audio_bytes, filename=audio_file.filename or "audio.wav",
+                                    session_id=current_session_id)
 
         # Save transcript
-        transcript_filename = f"data/transcripts/{slug}_{unique_id}.txt"
-        with open(transcript_filename, 'w', encoding='utf-8') as f:
-            f.write(text)
+        transcript_filename = paths["transcript_file"]
+        if archive is None:
+            artifacts.write_text(transcript_filename, text)
 
         # Clear previous output in UI
-        socketio.emit('clear')
+        emit_to_session('clear', current_session_id)
 
         # Prepare response file path
-        response_filename = f"data/responses/{slug}_{unique_id}.txt"
-
-        # Build full prompt with resume + JD + short history + transcript
-        messages_text = build_messages_text(current_session_id, text, max_turns=5)
+        response_filename = paths["response_file"]
+
+        # A repeated or rephrased question is answered from the cache
+        with trace.span("cache_lookup"):
+            hit = cached_answer(current_session_id, text)
+        if hit is not None:
+            messages_text, tokens = None, replay_tokens(hit[0])
+        else:
+            # Build full prompt with resume + JD + short history + transcript
+            with trace.span("prompt_build"):
+                messages_text = build_messages_text(current_session_id, text, max_turns=5)
+            tokens = stream_llm_tokens(messages_text, current_session_id)
 
         # Save the exact prompt given to LLM
-        prompt_filename = f"data/prompts/{slug}_{unique_id}.json"
-        os.makedirs("data/prompts", exist_ok=True)
-        with open(prompt_filename, 'w', encoding='utf-8') as f:
-            json.dump({
-                "timestamp": human_ts_from_slug(slug),
-                "session_id": current_session_id,
-                "transcript": text,
-                "prompt": messages_text
-            }, f, ensure_ascii=False, indent=2)
-
-        # Iterate tokens once: emit via WebSocket and buffer in memory
-        response_buffer = []
-        for token in stream_llm_tokens(messages_text):
-            response_buffer.append(token)
-            socketio.emit('token', {'token': token})
+        prompt_record = {
+            "timestamp": human_ts_from_slug(slug),
+            "session_id": current_session_id,
+            "transcript": text,
+            "cached": hit[1] if hit else None,
+            "prompt": messages_text
+        }
+        if archive is None:
+            artifacts.write_json(paths["prompt_file"], prompt_record)
+
+        # Iterate tokens once: emit coalesced frames and buffer in memory
+        full_response, frames = stream_answer(current_session_id, trace.tokens(tokens))
+        if hit is None:
+            remember_answer(current_session_id, text, full_response)
 
         # Write the full response exactly once at the end
-        full_response = ''.join(response_buffer)
-        with open(response_filename, 'w', encoding='utf-8') as f:
-            f.write(full_response)
+        persist_start = time.perf_counter()
+        if archive is not None:
+            archive_turn(current_session_id, f"{slug}_{unique_id}", human_ts_from_slug(slug), text, full_response,
+                         prompt_record, upload=audio_bytes, filename=audio_file.filename or "audio.wav")
+        else:
+            artifacts.write_text(response_filename, full_response)
 
 
         # Debug output
@@ -396,12 +929,17 @@ def process_audio():
             text,             # user input (transcript)
             full_response     # assistant output
         )
+        index_turn(f"{slug}_{unique_id}", current_session_id, human_ts_from_slug(slug), "process", text,
+                   full_response, cached=hit[1] if hit else None)
         
+        trace.mark("persist", persist_start)
+
         # Debug output
         print(f"Saved chat history for session: {current_session_id}")
 
-        # Announce completion to clients
-        socketio.emit('complete')
+        # Announce completion to this session's clients
+        emit_to_session('complete', current_session_id, {'frames': frames})
+        finish_trace(trace, slug, unique_id)
 
         return jsonify({
             "status": "success",
@@ -437,13 +975,19 @@ def start_session():
     with open(f"{session_dir}/job_description.txt", 'w', encoding='utf-8') as f:
         f.write(data['job_description'])
 
+    # Pre-render the static prompt prefix for this session
+    context_cache.put(session_id, data['resume'], data['job_description'])
+
+    # Open pooled OpenAI connections before the first utterance arrives
+    openai_client.prewarm()
+
     # Store session ID in Flask session
     session['session_id'] = session_id
 
-    # Also persist the "current" session id for non-cookie clients
+    # Also publish the "current" session id for non-cookie clients
+    # (kept in memory, persisted to data/last_session_id.txt, wakes long-pollers)
     ensure_dirs()
-    with open('data/last_session_id.txt', 'w', encoding='utf-8') as f:
-        f.write(session_id)
+    active_session_id.set(session_id)
 
     return jsonify({
         "status": "success",
@@ -455,45 +999,196 @@ def start_session():
 def active_session():
     """
     Return the latest known session_id for non-cookie clients.
-    Prefers the cookie session if available, else falls back to data/last_session_id.txt.
+    Prefers the cookie session if available, else falls back to the in-memory active session.
+
+    Long-poll: ?wait=<seconds>&known=<session_id> holds the request until the
+    active session differs from `known` (or the wait expires), so capture
+    clients learn about new sessions without polling per segment.
     """
+    wait = request.args.get('wait', type=float)
+    if wait:
+        known = request.args.get('known') or None
+        sid = active_session_id.wait_for_change(known, min(wait, LONG_POLL_MAX_WAIT))
+        if not sid:
+            return jsonify({"error": "No active session"}), 404
+        return jsonify({"session_id": sid})
+
     # 1) try cookie-backed Flask session
     sid = session.get('session_id')
     if sid:
         return jsonify({"session_id": sid})
 
-    # 2) fallback to last written session id
-    try:
-        with open('data/last_session_id.txt', 'r', encoding='utf-8') as f:
-            sid = f.read().strip()
-    except Exception:
-        sid = None
+    # 2) fallback to last started session id (memory; file read once at startup)
+    sid = active_session_id.get()
 
     if not sid:
         return jsonify({"error": "No active session"}), 404
 
     return jsonify({"session_id": sid})
 
+def history_etag(session_id: str) -> str:
+    """History only grows, so the session and its turn count identify a version."""
+    return f"{session_id}-{history_store.count(session_id)}"
+
+def history_not_modified(etag: str):
+    """A 304 when the client already holds this version, else None."""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
 @app.route('/get_chat_history', methods=['GET'])
 def get_chat_history():
+    """The whole history, newest first. /chat_history pages through it instead."""
     try:
         session_id = get_session_id()
     except RuntimeError as e:
         return jsonify({"error": str(e)}), 400
-    
-    chat_file = get_chat_file(session_id)
 
-    history = []
-    if os.path.exists(chat_file):
-        try:
-            with open(chat_file, 'r', encoding='utf-8') as f:
-                history = json.load(f) or []
-        except Exception:
-            history = []
+    etag = history_etag(session_id)
+    not_modified = history_not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+    # newest first (appends are chronological)
+    history = history_store.read_all(session_id)
+    history.reverse()
+    response = jsonify(history)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@app.route('/chat_history', methods=['GET'])
+def chat_history():
+    """
+    Turns after the `since` cursor (a seq, default 0), oldest first, at most
+    `limit` (default 50, max 500). Pass `next` back as `since` to continue;
+    new turns are also pushed to the session room as 'history' events.
+    """
+    try:
+        session_id = get_session_id()
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        since = max(0, int(request.args.get('since', 0)))
+        limit = min(max(1, int(request.args.get('limit', 50))), 500)
+    except ValueError:
+        return jsonify({"error": "since and limit must be integers"}), 400
+
+    etag = history_etag(session_id)
+    not_modified = history_not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+    turns, total = history_store.page(session_id, since, limit)
+    next_cursor = turns[-1]["seq"] if turns else min(since, total)
+    response = jsonify({
+        "session_id": session_id,
+        "turns": turns,
+        "next": next_cursor,
+        "total": total,
+        "has_more": next_cursor < total
+    })
+    # Version of what was read: a turn appended meanwhile changes the next tag
+    response.set_etag(f"{session_id}-{total}")
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
 
-    # newest first (optional)
-    history.sort(key=lambda t: t.get("timestamp", ""), reverse=True)
-    return jsonify(history)
+def index_limit(default: int):
+    return min(max(1, int(request.args.get('limit', default))), 500)
+
+@app.route('/timeline', methods=['GET'])
+def timeline():
+    """
+    The session's turns from the artifact index, newest first, with their
+    artifact paths. Pass the last `uid` back as `before` for the next page.
+    """
+    if artifact_index is None:
+        return jsonify({"error": "Artifact index is disabled"}), 503
+    try:
+        session_id = get_session_id()
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        limit = index_limit(50)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    turns = artifact_index.timeline(session_id, before=request.args.get('before'), limit=limit)
+    return jsonify({
+        "session_id": session_id,
+        "turns": turns,
+        "next": turns[-1]["uid"] if len(turns) == limit else None
+    })
+
+@app.route('/search', methods=['GET'])
+def search():
+    """
+    Keyword search over past transcripts and answers (all keywords must
+    match), best match first. `session_id` narrows it to one session.
+    """
+    if artifact_index is None:
+        return jsonify({"error": "Artifact index is disabled"}), 503
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({"error": "q is required"}), 400
+    try:
+        limit = index_limit(20)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    start = time.perf_counter()
+    hits = artifact_index.search(q, session_id=request.args.get('session_id'), limit=limit)
+    return jsonify({"query": q, "results": hits, "took_ms": round((time.perf_counter() - start) * 1000, 2)})
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Readiness: 503 once draining so a load balancer stops sending new sessions."""
+    body = {"status": "draining" if drain.draining else "ok", "in_flight": drain.in_flight()}
+    return jsonify(body), 503 if drain.draining else 200
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Runtime counters for the latency optimizations."""
+    return jsonify({
+        "speculation": SPECULATION_STATS.as_dict(),
+        "pipelines": pipelines_stats(),
+        "token_frames": COALESCE_STATS.as_dict(),
+        "artifact_writer": artifacts.stats(),
+        "artifact_index": artifact_index.stats() if artifact_index is not None else None,
+        "archive": archive.stats() if archive is not None else None,
+        "asr": asr_backend.stats(),
+        "scheduler": SCHEDULER.stats(),
+        "barge_in": BARGE_IN_STATS.as_dict(),
+        "utterance_buffers": BUFFER_STATS.as_dict(),
+        "postproc": POSTPROC_STATS.as_dict(),
+        "endpoint": ENDPOINT_STATS.as_dict(),
+        "response_cache": response_cache.stats_dict() if response_cache is not None else CACHE_STATS.as_dict(),
+        "stages": STAGE_METRICS.as_dict(),
+        "admission": {"draining": drain.draining, "ws_audio": ws_limit.stats(), "process": process_limit.stats()},
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition: per-stage latency summaries plus the /stats counters."""
+    cache = response_cache.stats_dict() if response_cache is not None else CACHE_STATS.as_dict()
+    scheduler = SCHEDULER.stats()
+    body = STAGE_METRICS.render() + render_gauges({
+        "speculation": SPECULATION_STATS.as_dict(),
+        "token_frames": COALESCE_STATS.as_dict(),
+        "artifact_writer": artifacts.stats(),
+        "artifact_index": artifact_index.stats() if artifact_index is not None else {},
+        "archive": archive.stats() if archive is not None else {},
+        "asr": asr_backend.stats(),
+        "scheduler": scheduler,
+        "barge_in": BARGE_IN_STATS.as_dict(),
+        "utterance_buffers": BUFFER_STATS.as_dict(),
+        "postproc": POSTPROC_STATS.as_dict(),
+        "endpoint": ENDPOINT_STATS.as_dict(),
+        **{f"scheduler_{kind}": counters for kind, counters in scheduler["kinds"].items()},
+        "response_cache": cache,
+        "admission_ws_audio": ws_limit.stats(),
+        "admission_process": process_limit.stats(),
+    })
+    return Response(body, mimetype="text/plain; version=0.0.4")
 
 
 # ---------------------------
@@ -504,10 +1199,27 @@ def get_chat_history():
 def handle_connect():
     emit('status', {'message': 'Connected to WebSocket'})
 
+@socketio.on('join')
+def handle_join(data):
+    """Subscribe this browser to a session's room; answers are only streamed there."""
+    sid = (data or {}).get('session_id')
+    if not valid_session_id(sid):
+        return
+    for room in rooms():
+        if room != request.sid and room != sid:
+            leave_room(room)
+    join_room(sid)
+    emit('status', {'message': f'Joined session {sid}'})
+
 # ---------------------------
 # Entrypoint
 # ---------------------------
 
 if __name__ == '__main__':
+    # Turn SIGTERM into a normal exit so atexit flushes queued artifact writes
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     # debug=True is fine for development, but make sure to configure properly for production.
-    socketio.run(app, debug=True, use_reloader=False)
+    socketio.run(app, host=os.environ.get("AGENT_BOB_HOST", "127.0.0.1"),
+                 port=int(os.environ.get("AGENT_BOB_PORT", "5000")), debug=True, use_reloader=False,
+                 # Also start without a TTY (run.py under a service manager, bench/load_test.py)
+                 allow_unsafe_werkzeug=True)
@@ -0,0 +1,401 @@
+"""
+SQLite index over the per-utterance artifacts.
+
+The files under data/ (recordings, transcripts, prompts, responses) are
+tied together only by their `<slug>_<uuid>` name. Every finished turn is
+also recorded here as one row: session, time, transcript, answer, flags and
+the artifact paths, so a session timeline is one indexed range scan and
+keyword search over transcripts and answers goes through an FTS5 table
+(ranked by bm25) instead of opening files.
+
+The database runs in WAL mode, so readers never wait for the writer. Rows
+are queued by record() and inserted in batches by a single worker thread,
+like artifact_writer; flush() waits for the queue. Reads use a small pool
+of connections.
+
+Turns written before the index existed are imported with:
+
+    python src/artifact_index.py backfill --data data
+
+which is idempotent (rows already indexed are kept). Without FTS5 in the
+local SQLite build, search falls back to a LIKE scan.
+"""
+import argparse
+import atexit
+import glob
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+_STOP = object()
+
+COLUMNS = ("uid", "session_id", "ts", "source", "transcript", "response", "cached", "speculative",
+           "interrupted", "recording", "transcript_file", "response_file", "prompt_file")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY,
+    uid TEXT NOT NULL UNIQUE,          -- <slug>_<uuid>, sorts chronologically
+    session_id TEXT,
+    ts TEXT,                           -- YYYY-MM-DD HH:MM:SS
+    source TEXT,                       -- ws, process or backfill
+    transcript TEXT NOT NULL DEFAULT '',
+    response TEXT NOT NULL DEFAULT '',
+    cached TEXT,
+    speculative INTEGER,
+    interrupted INTEGER,
+    recording TEXT,
+    transcript_file TEXT,
+    response_file TEXT,
+    prompt_file TEXT
+);
+CREATE INDEX IF NOT EXISTS turns_session ON turns(session_id, uid);
+"""
+
+# session_id is indexed too, so a per-session search is one MATCH (a column filter)
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts USING fts5(
+    session_id, transcript, response, content='turns', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS turns_ai AFTER INSERT ON turns BEGIN
+    INSERT INTO turns_fts(rowid, session_id, transcript, response)
+    VALUES (new.id, new.session_id, new.transcript, new.response);
+END;
+CREATE TRIGGER IF NOT EXISTS turns_ad AFTER DELETE ON turns BEGIN
+    INSERT INTO turns_fts(turns_fts, rowid, session_id, transcript, response)
+    VALUES ('delete', old.id, old.session_id, old.transcript, old.response);
+END;
+CREATE TRIGGER IF NOT EXISTS turns_au AFTER UPDATE ON turns BEGIN
+    INSERT INTO turns_fts(turns_fts, rowid, session_id, transcript, response)
+    VALUES ('delete', old.id, old.session_id, old.transcript, old.response);
+    INSERT INTO turns_fts(rowid, session_id, transcript, response)
+    VALUES (new.id, new.session_id, new.transcript, new.response);
+END;
+"""
+
+# Only the most recent matches are ranked: bm25 over every turn containing a
+# common word is what makes search slow (30 ms at 20k matches, growing)
+SEARCH_WINDOW = 2000
+
+
+def keywords(text: str) -> list:
+    return re.findall(r"\w+", text.lower())
+
+
+def fts_query(text: str) -> str:
+    """
+    Keywords -> an FTS5 query matching all of them. No prefix terms: stemming
+    already matches other forms of a word, and a short prefix expands to
+    thousands of index terms.
+    """
+    return " ".join(f'"{w}"' for w in keywords(text))
+
+
+def snippet(text: str, words: list, width: int = 16) -> str:
+    """About `width` words of text around the first keyword hit, hits in [brackets]."""
+    tokens = text.split()
+    hit = lambda tok: any(re.sub(r"\W", "", tok.lower()).startswith(w) for w in words)  # noqa: E731
+    first = next((i for i, tok in enumerate(tokens) if hit(tok)), 0)
+    start = max(0, first - width // 4)
+    window = [f"[{tok}]" if hit(tok) else tok for tok in tokens[start:start + width]]
+    return ("… " if start else "") + " ".join(window) + (" …" if start + width < len(tokens) else "")
+
+
+def ts_from_slug(slug: str):
+    try:
+        return datetime.strptime(slug, "%Y%m%d_%H%M%S").strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+
+
+class ArtifactIndex:
+    def __init__(self, path: str = "data/artifacts.db", batch_size: int = 256, max_queue: int = 10000):
+        self.path = path
+        self.batch_size = batch_size
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._conn = self._connect()
+        self._conn.executescript(SCHEMA)
+        try:
+            self._conn.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5
+            self.fts = False
+        self._readers = queue.LifoQueue()
+        self._q = queue.Queue(maxsize=max_queue)
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.rows = 0
+        self.batches = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="artifact-index", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: a crash can lose the last commits, never corrupt the file
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _reader(self):
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    # ---------------------------
+    # Writes
+    # ---------------------------
+
+    def record(self, **turn):
+        """Queue one turn (keyword arguments named after COLUMNS; uid is required)."""
+        row = tuple(turn.get(c) for c in COLUMNS)
+        if self._closed:
+            self._write_batch([row])
+            return
+        with self._cond:
+            self._pending += 1
+        self._q.put(row)
+
+    def _write_batch(self, rows, replace=True, conn=None):
+        conn = conn or self._conn
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        if replace:
+            updates = ", ".join(f"{c}=excluded.{c}" for c in COLUMNS[1:])
+            sql = f"INSERT INTO turns ({', '.join(COLUMNS)}) VALUES ({placeholders}) ON CONFLICT(uid) DO UPDATE SET {updates}"
+        else:
+            sql = f"INSERT OR IGNORE INTO turns ({', '.join(COLUMNS)}) VALUES ({placeholders})"
+        try:
+            with conn:
+                # rowcount leaves out the FTS rows the triggers write
+                added = conn.executemany(sql, rows).rowcount
+            self.rows += len(rows)
+            self.batches += 1
+            return added
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"[error] artifact index write failed: {e}")
+            return 0
+
+    def _run(self):
+        while True:
+            item = self._q.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    nxt = self._q.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop = True
+                    break
+                batch.append(nxt)
+            self._write_batch(batch)
+            with self._cond:
+                self._pending -= len(batch)
+                self._cond.notify_all()
+            if stop:
+                return
+
+    def backfill(self, data_dir: str = "data", chunk: int = 1000) -> int:
+        """
+        Index turns already on disk, keyed by the `<slug>_<uuid>` stem of
+        their transcript or prompt file. Returns the number of new rows.
+        """
+        stems = set()
+        for sub, ext in (("transcripts", ".txt"), ("prompts", ".json")):
+            for p in glob.glob(os.path.join(data_dir, sub, f"*{ext}")):
+                name = os.path.basename(p)[:-len(ext)]
+                if not name.endswith(".trace"):
+                    stems.add(name)
+
+        def read(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    return f.read()
+            except OSError:
+                return None
+
+        # Its own connection: the worker thread owns self._conn
+        conn = self._connect()
+        added, rows = 0, []
+        for stem in sorted(stems):
+            files = {kind: os.path.join(data_dir, sub, stem + ext) for kind, sub, ext in (
+                ("recording", "recordings", ".wav"), ("transcript_file", "transcripts", ".txt"),
+                ("response_file", "responses", ".txt"), ("prompt_file", "prompts", ".json"))}
+            try:
+                prompt = json.loads(read(files["prompt_file"]) or "{}")
+            except ValueError:
+                prompt = {}
+            transcript = read(files["transcript_file"])
+            cached = prompt.get("cached")
+            turn = {
+                "uid": stem,
+                "session_id": prompt.get("session_id"),
+                "ts": prompt.get("timestamp") or ts_from_slug(stem.rsplit("_", 1)[0]),
+                "source": "backfill",
+                "transcript": transcript if transcript is not None else prompt.get("transcript", ""),
+                "response": read(files["response_file"]) or "",
+                "cached": cached if isinstance(cached, str) else ("exact" if cached else None),
+                "speculative": prompt.get("speculative"),
+                "interrupted": prompt.get("interrupted"),
+                **{k: (p if os.path.exists(p) else None) for k, p in files.items()},
+            }
+            rows.append(tuple(turn.get(c) for c in COLUMNS))
+            if len(rows) >= chunk:
+                added += self._write_batch(rows, replace=False, conn=conn)
+                rows = []
+        if rows:
+            added += self._write_batch(rows, replace=False, conn=conn)
+        conn.close()
+        return added
+
+    # ---------------------------
+    # Queries
+    # ---------------------------
+
+    def timeline(self, session_id: str, before: str = None, limit: int = 50) -> list:
+        """A session's turns, newest first; pass the last uid as `before` for the next page."""
+        sql = f"SELECT {', '.join(COLUMNS)} FROM turns WHERE session_id = ?"
+        args = [session_id]
+        if before:
+            sql += " AND uid < ?"
+            args.append(before)
+        sql += " ORDER BY uid DESC LIMIT ?"
+        args.append(limit)
+        with self._reader() as conn:
+            return [dict(r) for r in conn.execute(sql, args)]
+
+    def search(self, text: str, session_id: str = None, limit: int = 20) -> list:
+        """
+        Turns whose transcript or answer contain every keyword, best match
+        (bm25, question weighted over answer) first among the SEARCH_WINDOW
+        most recent matches.
+        """
+        query = fts_query(text)
+        if not query:
+            return []
+        fields = "t.uid, t.session_id, t.ts, t.source, t.interrupted, t.transcript, t.response"
+        if self.fts:
+            if session_id:
+                query = 'session_id:"{}" AND ({})'.format(session_id.replace('"', '""'), query)
+            sql = (f"SELECT {fields}, m.score FROM ("
+                   "SELECT rowid, bm25(turns_fts, 0.0, 2.0, 1.0) AS score FROM turns_fts "
+                   "WHERE turns_fts MATCH ? ORDER BY rowid DESC LIMIT ?"
+                   ") m JOIN turns t ON t.id = m.rowid ORDER BY m.score LIMIT ?")
+            args = [query, SEARCH_WINDOW, limit]
+        else:
+            sql = f"SELECT {fields}, 0 AS score FROM turns t WHERE 1"
+            args = []
+            for word in keywords(text):
+                sql += " AND (t.transcript LIKE ? OR t.response LIKE ?)"
+                args += [f"%{word}%"] * 2
+            if session_id:
+                sql += " AND t.session_id = ?"
+                args.append(session_id)
+            sql += " ORDER BY t.id DESC LIMIT ?"
+            args.append(limit)
+        with self._reader() as conn:
+            rows = [dict(r) for r in conn.execute(sql, args)]
+        words = keywords(text)
+        for r in rows:
+            r["transcript"] = snippet(r["transcript"], words, 24)
+            r["response"] = snippet(r["response"], words)
+        return rows
+
+    def count(self) -> int:
+        with self._reader() as conn:
+            return conn.execute("SELECT COUNT(*) FROM turns").fetchone()[0]
+
+    # ---------------------------
+    # Lifecycle
+    # ---------------------------
+
+    def pending(self) -> int:
+        with self._cond:
+            return self._pending
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until every queued row is committed. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout: float = 30.0):
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        self._q.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {"pending": self.pending(), "rows_written": self.rows, "batches": self.batches,
+                "errors": self.errors, "fts": self.fts, "path": self.path}
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Process-wide index at AGENT_BOB_ARTIFACT_INDEX (default data/artifacts.db;
+    0 turns it off, and this returns None), flushed at exit.
+    """
+    global _index
+    path = os.getenv("AGENT_BOB_ARTIFACT_INDEX", "data/artifacts.db")
+    if path in ("", "0"):
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ArtifactIndex(path)
+                atexit.register(_index.close)
+    return _index
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Artifact index maintenance.")
+    sub = ap.add_subparsers(dest="command", required=True)
+    bf = sub.add_parser("backfill", help="index turns already under the data directory")
+    bf.add_argument("--data", default="data")
+    bf.add_argument("--db", default=None, help="default: AGENT_BOB_ARTIFACT_INDEX or <data>/artifacts.db")
+    se = sub.add_parser("search", help="keyword search over transcripts and answers")
+    se.add_argument("query")
+    se.add_argument("--session", default=None)
+    se.add_argument("--db", default=None)
+    se.add_argument("--data", default="data")
+    args = ap.parse_args()
+
+    index = ArtifactIndex(args.db or os.getenv("AGENT_BOB_ARTIFACT_INDEX") or os.path.join(args.data, "artifacts.db"))
+    if args.command == "backfill":
+        start = time.perf_counter()
+        added = index.backfill(args.data)
+        print(f"Indexed {added} new turn(s) in {time.perf_counter() - start:.1f} s; {index.count()} in total")
+    else:
+        for hit in index.search(args.query, session_id=args.session):
+            print(f"{hit['ts']}  {hit['session_id']}  {hit['uid']}\n  Q: {hit['transcript']}\n  A: {hit['response']}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
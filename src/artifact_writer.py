@@ -0,0 +1,234 @@
+"""
+Background writer for per-utterance artifacts.
+
+Recordings, transcripts, prompts, responses, chat-history lines and
+segment-archive records are queued here instead of being written on the
+request path. A single worker
+thread drains the queue in batches and applies the fsync policy:
+
+  always  fsync every file as it is written
+  batch   fsync every file of a batch once, at the end of the batch (default)
+  never   leave it to the OS
+
+flush() waits for everything queued so far; close() flushes and stops the
+worker and is registered with atexit so pending writes survive shutdown.
+"""
+import atexit
+import io
+import json
+import os
+import queue
+import threading
+import wave
+
+FSYNC_POLICIES = ("always", "batch", "never")
+
+_STOP = object()
+
+
+WAV_CHUNK = 1 << 20
+
+
+def write_wav_to(f, pcm, sample_rate: int):
+    """
+    Write 16-bit mono PCM as WAV to an open binary file. `pcm` is bytes or
+    a spilled utterance_buffer.PCMSpool, copied across a chunk at a time.
+    """
+    with wave.open(f, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        for start in range(0, len(pcm), WAV_CHUNK):
+            wf.writeframes(pcm[start:start + WAV_CHUNK])
+
+
+def wav_bytes(pcm: bytes, sample_rate: int) -> bytes:
+    """Wrap 16-bit mono PCM in a WAV container, in memory."""
+    buf = io.BytesIO()
+    write_wav_to(buf, pcm, sample_rate)
+    return buf.getvalue()
+
+
+class ArtifactWriter:
+    def __init__(self, fsync: str = "batch", batch_size: int = 64, max_queue: int = 10000):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.fsync = fsync
+        self.batch_size = batch_size
+        self._q = queue.Queue(maxsize=max_queue)
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._dirs = set()
+        self._closed = False
+        self.writes = 0
+        self.batches = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+        self._thread.start()
+
+    # ---------------------------
+    # Producers
+    # ---------------------------
+
+    def _put(self, item):
+        if self._closed:
+            # After shutdown, write inline rather than lose data
+            self._write_batch([item])
+            return
+        with self._cond:
+            self._pending += 1
+        self._q.put(item)
+
+    def write_bytes(self, path: str, data: bytes):
+        self._put(("w", path, data))
+
+    def write_text(self, path: str, text: str):
+        self._put(("w", path, text.encode('utf-8')))
+
+    def write_json(self, path: str, obj, indent=2):
+        # Serialize now so later mutation of obj can't leak into the file
+        self._put(("w", path, json.dumps(obj, ensure_ascii=False, indent=indent).encode('utf-8')))
+
+    def write_wav(self, path: str, pcm: bytes, sample_rate: int):
+        self._put(("wav", path, (pcm, sample_rate)))
+
+    def append_segment(self, archive, session_id: str, turn: dict):
+        """Append a turn to a segment_archive.SegmentArchive (encoding, e.g. FLAC, happens in the worker)."""
+        self._put(("seg", archive.seg_path(session_id), (archive, session_id, turn)))
+
+    def append_line(self, path: str, line: str, on_written=None):
+        """
+        Append one line (the caller includes the newline). on_written(ok) is
+        called from the worker once the line is in the file (True), or when
+        writing it failed (False).
+        """
+        self._put(("a", path, (line.encode('utf-8'), on_written)))
+
+    # ---------------------------
+    # Worker
+    # ---------------------------
+
+    def _ensure_dir(self, path):
+        d = os.path.dirname(path)
+        if d and d not in self._dirs:
+            os.makedirs(d, exist_ok=True)
+            self._dirs.add(d)
+
+    def _write_batch(self, batch):
+        to_sync = []
+        archives = set()
+        for kind, path, payload in batch:
+            on_written = None
+            if kind == "a":
+                payload, on_written = payload
+            try:
+                if kind == "seg":
+                    archive, session_id, turn = payload
+                    archive.append(session_id, turn, fsync=self.fsync == "always")
+                    if self.fsync == "batch":
+                        archives.add((archive, session_id))
+                    self.writes += 1
+                    continue
+                self._ensure_dir(path)
+                f = open(path, 'ab' if kind == "a" else 'wb')
+                if kind == "wav":
+                    write_wav_to(f, *payload)
+                else:
+                    f.write(payload)
+                # Hand data to the OS in queue order; only the fsync is deferred
+                f.flush()
+                if on_written is not None:
+                    # Readable by other threads from here on; a later fsync error doesn't undo that
+                    written, on_written = on_written, None
+                    written(True)
+                if self.fsync == "always":
+                    os.fsync(f.fileno())
+                    f.close()
+                elif self.fsync == "batch":
+                    to_sync.append(f)
+                else:
+                    f.close()
+                self.writes += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"[error] artifact write failed for {path}: {e}")
+                if on_written is not None:
+                    on_written(False)
+        for f in to_sync:
+            try:
+                os.fsync(f.fileno())
+            except OSError as e:
+                self.errors += 1
+                print(f"[error] fsync failed for {f.name}: {e}")
+            finally:
+                f.close()
+        for archive, session_id in archives:
+            try:
+                archive.sync(session_id)
+            except OSError as e:
+                self.errors += 1
+                print(f"[error] fsync failed for archive of session {session_id}: {e}")
+        self.batches += 1
+
+    def _run(self):
+        while True:
+            item = self._q.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    nxt = self._q.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop = True
+                    break
+                batch.append(nxt)
+            self._write_batch(batch)
+            with self._cond:
+                self._pending -= len(batch)
+                self._cond.notify_all()
+            if stop:
+                return
+
+    # ---------------------------
+    # Lifecycle
+    # ---------------------------
+
+    def pending(self) -> int:
+        with self._cond:
+            return self._pending
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until everything queued so far is on disk. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout: float = 30.0):
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        self._q.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {"pending": self.pending(), "writes": self.writes,
+                "batches": self.batches, "errors": self.errors, "fsync": self.fsync}
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> ArtifactWriter:
+    """Process-wide writer (fsync policy from AGENT_BOB_FSYNC), flushed at exit."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ArtifactWriter(fsync=os.getenv("AGENT_BOB_FSYNC", "batch"))
+                atexit.register(_writer.close)
+    return _writer
@@ -0,0 +1,362 @@
+"""
+Speech-to-text backends.
+
+transcribe_audio() hands audio to the backend chosen by AGENT_BOB_ASR_BACKEND:
+
+  openai  the hosted Whisper API through the shared client (default)
+  local   faster-whisper (CTranslate2) on this machine, int8 by default;
+          no network round trip and no upload, works offline
+
+The local model is loaded once and kept warm. Requests from all sessions
+go through one queue; the decoder takes whatever is queued (up to
+AGENT_BOB_ASR_BATCH segments, waiting at most AGENT_BOB_ASR_BATCH_WAIT_MS
+for more) and runs the encoder and decoder over the whole batch at once.
+Segments longer than Whisper's 30 s window are transcribed on their own.
+
+  AGENT_BOB_ASR_MODEL         whisper-1 (openai) / base.en (local: size or CTranslate2 model dir)
+  AGENT_BOB_ASR_DEVICE        cpu
+  AGENT_BOB_ASR_COMPUTE_TYPE  int8
+  AGENT_BOB_ASR_CPU_THREADS   0 (CTranslate2 default)
+  AGENT_BOB_ASR_BEAM          1
+  AGENT_BOB_ASR_LANGUAGE      en
+"""
+import io
+import os
+import queue
+import threading
+import time
+import wave
+from concurrent.futures import Future
+
+import numpy as np
+
+import openai_client
+from scheduler import SCHEDULER
+
+try:
+    import faster_whisper
+    from faster_whisper.audio import pad_or_trim
+    from faster_whisper.tokenizer import Tokenizer
+    from faster_whisper.transcribe import get_suppressed_tokens
+except ImportError:
+    faster_whisper = None
+
+SAMPLE_RATE = 16000
+WINDOW_SECONDS = 30
+
+_STOP = object()
+
+
+def wav_duration(data: bytes):
+    """Length in seconds of WAV bytes, or None when it is not a WAV file."""
+    try:
+        with wave.open(io.BytesIO(data), 'rb') as wf:
+            return wf.getnframes() / wf.getframerate()
+    except (wave.Error, EOFError):
+        return None
+
+
+def load_audio(data: bytes) -> np.ndarray:
+    """Decode audio bytes to 16 kHz mono float32 in [-1, 1]."""
+    try:
+        with wave.open(io.BytesIO(data), 'rb') as wf:
+            rate, channels, width = wf.getframerate(), wf.getnchannels(), wf.getsampwidth()
+            raw = wf.readframes(wf.getnframes())
+    except (wave.Error, EOFError):
+        # Not a WAV (e.g. a browser upload): let PyAV, which faster-whisper depends on, decode it
+        return faster_whisper.decode_audio(io.BytesIO(data), sampling_rate=SAMPLE_RATE)
+    if width != 2:
+        raise ValueError("only 16-bit PCM WAV is supported")
+    x = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+    if channels > 1:
+        x = x.reshape(-1, channels).mean(axis=1)
+    if rate != SAMPLE_RATE and len(x):
+        n = int(round(len(x) * SAMPLE_RATE / rate))
+        x = np.interp(np.arange(n) * (rate / SAMPLE_RATE), np.arange(len(x)), x).astype(np.float32)
+    return x
+
+
+def run_blocking(fn, *args):
+    """
+    Run CPU-bound work. Under the gevent server it goes to the hub's pool
+    of real OS threads, so other greenlets keep running while it computes.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return fn(*args)
+    if monkey.is_module_patched("threading"):
+        import gevent
+        return gevent.get_hub().threadpool.apply(fn, args)
+    return fn(*args)
+
+
+class ASRBackend:
+    """Interface: transcribe() is called from many threads at once."""
+    name = "base"
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.audio_seconds = 0.0
+        self.busy_seconds = 0.0
+        self._stats_lock = threading.Lock()
+
+    def transcribe(self, audio: bytes, filename: str = "audio.wav", session_id=None) -> str:
+        raise NotImplementedError
+
+    def warm(self, background: bool = True):
+        """Get ready for the first request (load models, open connections)."""
+
+    def close(self):
+        pass
+
+    def _record(self, audio_seconds, busy_seconds, error=False):
+        with self._stats_lock:
+            self.requests += 1
+            self.errors += int(error)
+            self.audio_seconds += audio_seconds or 0.0
+            self.busy_seconds += busy_seconds
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "backend": self.name,
+                "requests": self.requests,
+                "errors": self.errors,
+                "audio_seconds": round(self.audio_seconds, 2),
+                # Wall time per second of audio, summed over requests (< 1 = faster than real time)
+                "rtf": round(self.busy_seconds / self.audio_seconds, 3) if self.audio_seconds else None,
+            }
+
+
+class OpenAIBackend(ASRBackend):
+    name = "openai"
+
+    def __init__(self, model: str = "whisper-1", language: str = "en"):
+        super().__init__()
+        self.model = model
+        self.language = language
+
+    def transcribe(self, audio: bytes, filename: str = "audio.wav", session_id=None) -> str:
+        t0 = time.perf_counter()
+        try:
+            # The API infers the format from the file name, so pass one along with the bytes.
+            # Retries are the scheduler's, not the SDK's.
+            transcript = SCHEDULER.call("asr", lambda: openai_client.get_client().with_options(
+                max_retries=0).audio.transcriptions.create(
+                model=self.model,
+                file=(filename, audio),
+                language=self.language
+            ), session_id=session_id)
+        except Exception:
+            self._record(wav_duration(audio), time.perf_counter() - t0, error=True)
+            raise
+        self._record(wav_duration(audio), time.perf_counter() - t0)
+        return transcript.text
+
+    def warm(self, background: bool = True):
+        openai_client.prewarm(background=background)
+
+
+class LocalWhisperBackend(ASRBackend):
+    name = "local"
+
+    def __init__(self, model: str = "base.en", device: str = "cpu", compute_type: str = "int8",
+                 cpu_threads: int = 0, beam_size: int = 1, language: str = "en",
+                 batch_size: int = 8, batch_wait_ms: float = 15):
+        if faster_whisper is None:
+            raise RuntimeError("AGENT_BOB_ASR_BACKEND=local needs faster-whisper (pip install faster-whisper)")
+        super().__init__()
+        self.model_name = model
+        self.device = device
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.beam_size = beam_size
+        self.language = language
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.batches = 0
+        self.batched_segments = 0
+        self.load_seconds = None
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="asr-local", daemon=True)
+        self._thread.start()
+
+    # --- model -----------------------------------------------------------
+
+    def _load(self):
+        t0 = time.perf_counter()
+        model = faster_whisper.WhisperModel(self.model_name, device=self.device,
+                                            compute_type=self.compute_type, cpu_threads=self.cpu_threads)
+        language = self.language if model.model.is_multilingual else "en"
+        tokenizer = Tokenizer(model.hf_tokenizer, model.model.is_multilingual,
+                              task="transcribe", language=language)
+        prompt = model.get_prompt(tokenizer, previous_tokens=[], without_timestamps=True)
+        suppress = get_suppressed_tokens(tokenizer, [-1])
+        self.load_seconds = time.perf_counter() - t0
+        return model, tokenizer, prompt, suppress
+
+    def model(self):
+        """(model, tokenizer, prompt, suppressed tokens), loaded on first use."""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    self._model = run_blocking(self._load)
+        return self._model
+
+    def warm(self, background: bool = True):
+        if self._model is not None:
+            return
+        if background:
+            threading.Thread(target=self.model, daemon=True).start()
+        else:
+            self.model()
+
+    # --- batching --------------------------------------------------------
+
+    def transcribe(self, audio: bytes, filename: str = "audio.wav", session_id=None) -> str:
+        fut = Future()
+        self._queue.put((audio, fut))
+        return fut.result()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=max(0.0, remaining)) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.put(_STOP)
+                    break
+                batch.append(item)
+            self._process(batch)
+
+    def _process(self, batch):
+        t0 = time.perf_counter()
+        short, long_ = [], []
+        for audio, fut in batch:
+            try:
+                x = load_audio(audio)
+            except Exception as e:
+                self._record(None, 0.0, error=True)
+                fut.set_exception(e)
+                continue
+            (short if len(x) <= WINDOW_SECONDS * SAMPLE_RATE else long_).append((x, fut))
+
+        if short:
+            try:
+                texts = run_blocking(self._decode_batch, [x for x, _ in short])
+            except Exception as e:
+                texts = [e] * len(short)
+            elapsed = time.perf_counter() - t0
+            with self._stats_lock:
+                self.batches += 1
+                self.batched_segments += len(short)
+            for (x, fut), text in zip(short, texts):
+                # Each segment waited for the whole batch, so that is its latency
+                if isinstance(text, Exception):
+                    self._record(len(x) / SAMPLE_RATE, elapsed, error=True)
+                    fut.set_exception(text)
+                else:
+                    self._record(len(x) / SAMPLE_RATE, elapsed)
+                    fut.set_result(text)
+
+        for x, fut in long_:
+            t1 = time.perf_counter()
+            try:
+                text = run_blocking(self._decode_long, x)
+            except Exception as e:
+                self._record(len(x) / SAMPLE_RATE, time.perf_counter() - t1, error=True)
+                fut.set_exception(e)
+                continue
+            self._record(len(x) / SAMPLE_RATE, time.perf_counter() - t1)
+            fut.set_result(text)
+
+    def _decode_batch(self, waves):
+        """Encode and greedily/beam decode up to 30 s segments as one batch."""
+        model, tokenizer, prompt, suppress = self.model()
+        features = np.stack([
+            pad_or_trim(model.feature_extractor(x)[..., :-1])
+            for x in waves
+        ])
+        encoder_output = model.encode(features)
+        results = model.model.generate(
+            encoder_output,
+            [list(prompt) for _ in waves],
+            beam_size=self.beam_size,
+            max_length=model.max_length,
+            suppress_blank=True,
+            suppress_tokens=suppress,
+        )
+        return [tokenizer.decode(r.sequences_ids[0]).strip() for r in results]
+
+    def _decode_long(self, x):
+        model = self.model()[0]
+        segments, _ = model.transcribe(x, language=self.language, beam_size=self.beam_size,
+                                       without_timestamps=True, condition_on_previous_text=False)
+        return " ".join(s.text.strip() for s in segments).strip()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join(timeout=5)
+
+    def stats(self) -> dict:
+        d = super().stats()
+        with self._stats_lock:
+            d.update({
+                "model": self.model_name,
+                "compute_type": self.compute_type,
+                "loaded": self._model is not None,
+                "load_seconds": round(self.load_seconds, 2) if self.load_seconds is not None else None,
+                "batches": self.batches,
+                "mean_batch": round(self.batched_segments / self.batches, 2) if self.batches else None,
+                "queued": self._queue.qsize(),
+            })
+        return d
+
+
+BACKENDS = {"openai": OpenAIBackend, "local": LocalWhisperBackend}
+
+
+def build_backend(name: str = None) -> ASRBackend:
+    """Backend `name` (default AGENT_BOB_ASR_BACKEND) configured from the environment."""
+    name = name or os.getenv("AGENT_BOB_ASR_BACKEND", "openai")
+    language = os.getenv("AGENT_BOB_ASR_LANGUAGE", "en")
+    if name == "openai":
+        return OpenAIBackend(model=os.getenv("AGENT_BOB_ASR_MODEL", "whisper-1"), language=language)
+    if name == "local":
+        return LocalWhisperBackend(
+            model=os.getenv("AGENT_BOB_ASR_MODEL", "base.en"),
+            device=os.getenv("AGENT_BOB_ASR_DEVICE", "cpu"),
+            compute_type=os.getenv("AGENT_BOB_ASR_COMPUTE_TYPE", "int8"),
+            cpu_threads=int(os.getenv("AGENT_BOB_ASR_CPU_THREADS", "0")),
+            beam_size=int(os.getenv("AGENT_BOB_ASR_BEAM", "1")),
+            language=language,
+            batch_size=int(os.getenv("AGENT_BOB_ASR_BATCH", "8")),
+            batch_wait_ms=float(os.getenv("AGENT_BOB_ASR_BATCH_WAIT_MS", "15")),
+        )
+    raise ValueError(f"unknown ASR backend {name!r} (choose from {', '.join(BACKENDS)})")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> ASRBackend:
+    """Process-wide backend, created on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = build_backend()
+    return _backend
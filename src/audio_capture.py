@@ -1,26 +1,51 @@
-import pyaudiowpatch as pyaudio
 import wave
 import webrtcvad
 import time
 import requests
 import os
+import threading
+import queue
+import argparse
 from datetime import datetime
 import uuid
 import audioop  # stdlib resampling
 import io
+import math
+import random
+from collections import deque
+
+from segment_postproc import SegmentPostProcessor, PostProcStats
+
+try:
+    import pyaudiowpatch as pyaudio
+except ImportError:  # Windows-only dependency; --synthetic runs without it
+    pyaudio = None
 
 # =========================
 # Config
 # =========================
 BASE_URL = os.getenv("AGENT_BOB_API", "http://127.0.0.1:5000")
 VAD_AGGRESSIVENESS = 3
-FORMAT = pyaudio.paInt16
+FORMAT = pyaudio.paInt16 if pyaudio else None
 CHANNELS = 1
 RATE = 16000
 CHUNK_DURATION = 30  # ms
 CHUNK_SIZE = int(RATE * CHUNK_DURATION / 1000)
+FRAME_BYTES = CHUNK_SIZE * 2  # one 30ms VAD frame, 16-bit mono @16kHz
 SILENCE_TIMEOUT = 2  # seconds of silence to consider speech ended
+MAX_SEGMENT_SECONDS = float(os.getenv("AGENT_BOB_MAX_UTTERANCE_S", "60"))  # force a split (0 = never)
+SPLIT_SEARCH_SECONDS = 2  # the split goes after the quietest frame of this last stretch
+# Before upload: trim silence, drop blips, and hold short segments this long in case the question goes on
+POSTPROC = os.getenv("AGENT_BOB_POSTPROC", "1") != "0"
+MIN_SPEECH_MS = int(os.getenv("AGENT_BOB_MIN_SPEECH_MS", "250"))
+MERGE_GAP_MS = int(os.getenv("AGENT_BOB_MERGE_GAP_MS", "1000"))
 HTTP_TIMEOUT = 30
+RING_SECONDS = 10        # capture -> VAD ring buffer capacity
+OVERRUN_SLACK_S = 0.2    # device audio unaccounted for (read or waiting) beyond this was lost to an overrun
+UPLOAD_QUEUE_SIZE = 8    # finished segments waiting to be uploaded
+UPLOAD_RETRIES = 3
+SESSION_TTL = 60         # seconds a cached session id is trusted when the watcher is down
+LONG_POLL_WAIT = 25      # /active-session long-poll duration
 
 # single requests session
 HTTP = requests.Session()
@@ -66,6 +91,70 @@ def ensure_session_id(max_retries=10, delay_sec=1.0):
 
     return None
 
+class SessionCache:
+    """
+    Session id for uploads without a lookup per segment.
+
+    A watcher thread long-polls /active-session?wait=..&known=.. and updates
+    the cached id as soon as the server starts a new session. If the watcher
+    cannot reach the server, the cached id is re-fetched at most every
+    SESSION_TTL seconds.
+    """
+
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self.session_id = None
+        self.fetched_at = 0.0
+        self.watching = False
+        self._lock = threading.Lock()
+        self._http = requests.Session()  # the watcher's own connection
+        self._thread = None
+
+    def _update(self, sid):
+        with self._lock:
+            if sid and sid != self.session_id:
+                print(f"[info] Using SESSION_ID: {sid}")
+            self.session_id = sid or self.session_id
+            self.fetched_at = time.monotonic()
+
+    def get(self):
+        env_sid = os.getenv("AGENT_BOB_SESSION_ID")
+        if env_sid:
+            return env_sid.strip()
+        with self._lock:
+            sid = self.session_id
+            fresh = self.watching or time.monotonic() - self.fetched_at < self.ttl
+        if sid and fresh:
+            return sid
+        self._update(fetch_active_session_id())
+        return self.session_id
+
+    def start_watching(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="session-watch", daemon=True)
+            self._thread.start()
+
+    def _watch(self):
+        backoff = 1.0
+        while True:
+            try:
+                r = self._http.get(f"{BASE_URL}/active-session",
+                                   params={"wait": LONG_POLL_WAIT, "known": self.session_id or ""},
+                                   timeout=LONG_POLL_WAIT + 10)
+                self.watching = True
+                backoff = 1.0
+                if r.status_code == 200:
+                    self._update(r.json().get("session_id"))
+                continue
+            except Exception:
+                self.watching = False
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+
+SESSION_CACHE = SessionCache()
+
+
 def find_loopback_device(p):
     """Return the WASAPI default OUTPUT device index for loopback capture."""
     for h in range(p.get_host_api_count()):
@@ -77,11 +166,15 @@ def find_loopback_device(p):
 
 
 def process_audio_segment(audio_data):
-    """Send audio segment to backend for processing using in-memory buffer"""
-    sid = fetch_active_session_id()
+    """
+    Send audio segment to backend for processing using in-memory buffer.
+    Returns True when the segment is done with (sent, or rejected for good),
+    False when the upload should be retried.
+    """
+    sid = SESSION_CACHE.get()
     if not sid:
         print("[error] No SESSION_ID yet; dropping this segment.")
-        return
+        return True
 
     unique_id = uuid.uuid4().hex
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -104,18 +197,290 @@ def process_audio_segment(audio_data):
         r = HTTP.post(f"{BASE_URL}/process", files=files, data=data, timeout=HTTP_TIMEOUT)
         if r.status_code == 200:
             print("Audio segment sent for processing")
-        else:
-            print(f"Error processing audio ({r.status_code}): {r.text}")
+            return True
+        print(f"Error processing audio ({r.status_code}): {r.text}")
+        # 4xx won't get better on retry; 5xx might
+        return r.status_code < 500
 
     except Exception as e:
         print(f"Error sending audio to backend: {str(e)}")
+        return False
     finally:
         wav_buffer.close()
 
 
-def capture_audio_segment():
-    """Capture audio segments with VAD and send to backend"""
-    p = pyaudio.PyAudio()
+# =========================
+# Capture plumbing
+# =========================
+
+class PCMRingBuffer:
+    """
+    Fixed-size single-producer / single-consumer byte ring.
+
+    The capture thread writes converted PCM in; the VAD loop reads fixed
+    frames out as memoryview slices of the ring itself, so framing no longer
+    copies or shifts a bytearray per frame. Only a frame that straddles the
+    wrap point is copied (into a reusable scratch buffer).
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._scratch = bytearray(FRAME_BYTES)
+        self._read = 0       # total bytes consumed
+        self._write = 0      # total bytes produced
+        self._held = 0       # bytes of the frame currently lent out to the reader
+        self._cond = threading.Condition()
+        self.overflow_bytes = 0
+        self.closed = False
+
+    def available(self) -> int:
+        return self._write - self._read - self._held
+
+    def write(self, data) -> int:
+        """Append data; bytes that do not fit are dropped and counted. Returns bytes written."""
+        n = len(data)
+        with self._cond:
+            free = self.capacity - (self._write - self._read)
+            if n > free:
+                self.overflow_bytes += n - free
+                n = free
+            if n:
+                start = self._write % self.capacity
+                first = min(n, self.capacity - start)
+                src = memoryview(data)
+                self._view[start:start + first] = src[:first]
+                if n > first:
+                    self._view[0:n - first] = src[first:n]
+                self._write += n
+                self._cond.notify()
+        return n
+
+    def read_frame(self, size: int, timeout: float = 1.0):
+        """
+        Return a memoryview of the next `size` bytes, or None on timeout/close.
+        The view is only valid until the next read_frame() call.
+        """
+        with self._cond:
+            # Release the previous frame only now, so the producer can't overwrite it while in use
+            self._read += self._held
+            self._held = 0
+            while self._write - self._read < size:
+                if self.closed:
+                    return None
+                if not self._cond.wait(timeout):
+                    return None
+            start = self._read % self.capacity
+            self._held = size
+        if start + size <= self.capacity:
+            return self._view[start:start + size]
+        if len(self._scratch) != size:
+            self._scratch = bytearray(size)
+        first = self.capacity - start
+        self._scratch[:first] = self._view[start:]
+        self._scratch[first:] = self._view[:size - first]
+        return memoryview(self._scratch)
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class SegmentUploader:
+    """
+    Background uploader: the VAD loop enqueues finished segments and moves on.
+    The queue is bounded; when it is full the oldest waiting segment is
+    dropped and counted. Failed uploads are retried with backoff.
+    """
+
+    def __init__(self, send=process_audio_segment, maxsize=UPLOAD_QUEUE_SIZE, retries=UPLOAD_RETRIES):
+        self.send = send
+        self.retries = retries
+        self._q = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.overflows = 0
+        self._thread = threading.Thread(target=self._run, name="uploader", daemon=True)
+        self._thread.start()
+
+    def submit(self, pcm: bytes):
+        with self._lock:
+            try:
+                self._q.put_nowait(pcm)
+            except queue.Full:
+                try:
+                    self._q.get_nowait()
+                    self._q.task_done()
+                except queue.Empty:
+                    pass
+                self.overflows += 1
+                print("[warn] Upload queue full; dropped the oldest segment")
+                self._q.put_nowait(pcm)
+
+    def _run(self):
+        while True:
+            pcm = self._q.get()
+            if pcm is None:
+                self._q.task_done()
+                return
+            ok = False
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self.retried += 1
+                    time.sleep(min(4.0, 0.5 * 2 ** (attempt - 1)))
+                try:
+                    ok = self.send(pcm)
+                except Exception as e:
+                    print(f"[warn] upload attempt {attempt + 1} failed: {e}")
+                    ok = False
+                if ok:
+                    break
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self._q.task_done()
+
+    def close(self, timeout=None):
+        """Flush queued segments, then stop the worker."""
+        self._q.put(None)
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "failed": self.failed, "retried": self.retried,
+                "overflows": self.overflows, "queued": self._q.qsize()}
+
+
+class SyntheticStream:
+    """
+    Stand-in for a PyAudio input stream: 16kHz mono noise bursts separated
+    by silence, delivered at real-time pace. Lets the capture path be
+    exercised (and dropped frames counted) without an audio device.
+    """
+
+    def __init__(self, duration_s: float, speech_s=(1.0, 4.0), silence_s=(2.5, 4.0), seed=0):
+        self.total_frames = int(duration_s * RATE)
+        self.frames_delivered = 0
+        self._rng = random.Random(seed)
+        self._speech_s = speech_s
+        self._silence_s = silence_s
+        self._speaking = False
+        self._left = int(self._rng.uniform(*silence_s) * RATE)
+        self._t0 = None
+
+    def _sample(self, i):
+        if not self._speaking:
+            return 0
+        # Amplitude-modulated noise reads as voiced audio to webrtcvad
+        env = 0.5 + 0.5 * math.sin(2 * math.pi * 4 * i / RATE)
+        return int(8000 * env * (self._rng.random() * 2 - 1) + 6000 * math.sin(2 * math.pi * 220 * i / RATE))
+
+    def get_read_available(self):
+        return 0
+
+    def read(self, num_frames, exception_on_overflow=True):
+        if self._t0 is None:
+            self._t0 = time.monotonic()
+        if self.frames_delivered >= self.total_frames:
+            raise EOFError("synthetic stream finished")
+        # Pace like a real device
+        due = self._t0 + (self.frames_delivered + num_frames) / RATE
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        out = bytearray(num_frames * 2)
+        for j in range(num_frames):
+            if self._left <= 0:
+                self._speaking = not self._speaking
+                span = self._speech_s if self._speaking else self._silence_s
+                self._left = int(self._rng.uniform(*span) * RATE)
+            self._left -= 1
+            s = max(-32768, min(32767, self._sample(self.frames_delivered + j)))
+            out[2 * j:2 * j + 2] = s.to_bytes(2, 'little', signed=True)
+        self.frames_delivered += num_frames
+        return bytes(out)
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class CaptureStats:
+    def __init__(self):
+        self.chunks_read = 0
+        self.input_overflows = 0     # device-side overruns (audio PortAudio dropped before we read it)
+        self.overflow_ms = 0         # audio lost to them
+        self.frames_processed = 0    # 30ms frames seen by VAD
+        self.segments = 0
+        self.forced_splits = 0       # segments cut at MAX_SEGMENT_SECONDS
+        self.max_segment_bytes = 0
+
+    def as_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+def capture_loop(stream, ring, stats, stop, stream_channels=1, device_rate=RATE, frames_per_buffer=CHUNK_SIZE):
+    """
+    Capture thread: read the device, convert to mono 16kHz and feed the ring. Nothing else.
+
+    Overflows are not raised: PyAudio discards the chunk it read when it
+    raises one. Instead an overrun shows up as wall-clock time the device
+    audio can't account for (neither read nor waiting in its buffer).
+    """
+    resample_state = None
+    started = None
+    frames_read = 0
+    try:
+        while not stop.is_set():
+            try:
+                chunk = stream.read(frames_per_buffer, exception_on_overflow=False)
+            except EOFError:
+                break
+            now = time.monotonic()
+            frames_read += frames_per_buffer
+            if started is None:
+                started = now - frames_per_buffer / device_rate
+            try:
+                waiting = stream.get_read_available()
+            except Exception:
+                waiting = 0
+            lost = (now - started) * device_rate - frames_read - waiting
+            if lost > OVERRUN_SLACK_S * device_rate:
+                stats.input_overflows += 1
+                stats.overflow_ms += int(1000 * lost / device_rate)
+            if lost > OVERRUN_SLACK_S * device_rate or lost < 0:
+                # Start counting again from here (also absorbs a device clock running fast)
+                started = now - (frames_read + waiting) / device_rate
+            stats.chunks_read += 1
+
+            # Convert to mono if needed
+            if stream_channels == 2:
+                mono_16le = audioop.tomono(chunk, 2, 0.5, 0.5)
+            else:
+                mono_16le = chunk
+
+            # Resample to 16kHz
+            if device_rate != 16000:
+                mono_16k, resample_state = audioop.ratecv(
+                    mono_16le, 2, 1, device_rate, 16000, resample_state
+                )
+            else:
+                mono_16k = mono_16le
+
+            ring.write(mono_16k)
+    finally:
+        ring.close()
+
+
+def open_device_stream(p):
+    """Pick the loopback / Stereo Mix device and open it. Returns None if nothing usable exists."""
     device_index = find_loopback_device(p)
 
     # Fallback to Stereo Mix device if no WASAPI loopback found
@@ -140,81 +505,163 @@ def capture_audio_segment():
                     print(f"{i}: {dev_info['name']} (Input channels: {dev_info['maxInputChannels']}, Host API: {dev_info['hostApi']})")
                 except Exception as e:
                     print(f"Error getting device info for index {i}: {str(e)}")
-            return
+            return None
 
     print("Using default input device with standard parameters")
 
-    stream = p.open(
+    return p.open(
         format=FORMAT,
         channels=1,
         rate=RATE,
         input=True,
         frames_per_buffer=CHUNK_SIZE
     )
-    stream_channels = 1
-    device_rate = RATE
-    frames_per_buffer = CHUNK_SIZE
+
+
+def capture_audio_segment(stream=None, uploader=None):
+    """
+    Capture audio segments with VAD and send to backend.
+
+    A dedicated thread reads the device into a ring buffer; this loop runs
+    VAD over it and hands finished segments to the background uploader, so
+    a slow POST never stops the device from being read.
+    """
+    p = None
+    if stream is None:
+        if pyaudio is None:
+            print("pyaudiowpatch is not installed; use --synthetic to run without a device.")
+            return None
+        p = pyaudio.PyAudio()
+        stream = open_device_stream(p)
+        if stream is None:
+            p.terminate()
+            return None
+
+    uploader = uploader or SegmentUploader()
+    ring = PCMRingBuffer(RING_SECONDS * RATE * 2)
+    stats = CaptureStats()
+    stop = threading.Event()
+    capture = threading.Thread(target=capture_loop, args=(stream, ring, stats, stop),
+                               name="capture", daemon=True)
 
     vad = webrtcvad.Vad(VAD_AGGRESSIVENESS)
-    frames = []
+    segment = bytearray()
     speech_detected = False
     silence_count = 0
+    # Bounded segment: a stuck-open mic is cut at the quietest recent frame instead of growing forever
+    max_segment_bytes = int(MAX_SEGMENT_SECONDS * RATE) * 2
+    recent = deque(maxlen=int(SPLIT_SEARCH_SECONDS * 1000 / CHUNK_DURATION))  # (end offset, is_speech, rms)
 
-    print("Listening for system audio...")
+    post = SegmentPostProcessor(RATE, CHUNK_DURATION, min_speech_ms=MIN_SPEECH_MS, merge_gap_ms=MERGE_GAP_MS,
+                                stats=PostProcStats()) if POSTPROC else None
 
-    resample_state = None
-    vad_buf = bytearray()
+    def submit(data):
+        uploader.submit(bytes(data))
+        stats.segments += 1
+        stats.max_segment_bytes = max(stats.max_segment_bytes, len(data))
 
-    try:
-        while True:
-            chunk = stream.read(frames_per_buffer, exception_on_overflow=False)
+    def finish(data):
+        if post is None:
+            submit(data)
+            return
+        kept = post.end(bytes(data), stats.frames_processed)
+        if kept is not None:
+            submit(kept.pcm)
 
-            # Convert to mono if needed
-            if stream_channels == 2:
-                mono_16le = audioop.tomono(chunk, 2, 0.5, 0.5)
-            else:
-                mono_16le = chunk
+    print("Listening for system audio...")
+    capture.start()
 
-            # Resample to 16kHz
-            if device_rate != 16000:
-                mono_16k, resample_state = audioop.ratecv(
-                    mono_16le, 2, 1, device_rate, 16000, resample_state
-                )
+    try:
+        while True:
+            frame = ring.read_frame(FRAME_BYTES)
+            if frame is None:
+                if ring.closed and ring.available() < FRAME_BYTES:
+                    break
+                continue
+            stats.frames_processed += 1
+
+            is_speech = vad.is_speech(frame, 16000)
+            if post is not None:
+                held = post.poll(stats.frames_processed)
+                if held is not None:
+                    submit(held.pcm)
+
+            if is_speech:
+                if not speech_detected and post is not None:
+                    # A short segment just before this one is the start of the same question
+                    segment += post.start(stats.frames_processed) or b""
+                segment += frame
+                speech_detected = True
+                silence_count = 0
+            elif speech_detected:
+                segment += frame
+                silence_count += 1
+
+                # end segment on enough silence
+                if silence_count * CHUNK_DURATION / 1000 >= SILENCE_TIMEOUT:
+                    finish(segment)
+                    segment.clear()
+                    recent.clear()
+                    speech_detected = False
+                    silence_count = 0
+                    continue
             else:
-                mono_16k = mono_16le
-
-            # Accumulate and slice into exact 30ms frames (960 bytes)
-            vad_buf.extend(mono_16k)
-
-            while len(vad_buf) >= 960:
-                frame = bytes(vad_buf[:960])
-                del vad_buf[:960]
-
-                is_speech = vad.is_speech(frame, 16000)
+                continue
 
-                if is_speech:
-                    frames.append(frame)
-                    speech_detected = True
-                    silence_count = 0
-                elif speech_detected:
-                    frames.append(frame)
-                    silence_count += 1
-
-                    # end segment on enough silence
-                    if silence_count * CHUNK_DURATION / 1000 >= SILENCE_TIMEOUT:
-                        process_audio_segment(b''.join(frames))
-                        frames.clear()
-                        speech_detected = False
-                        silence_count = 0
+            recent.append((len(segment), is_speech, audioop.rms(frame, 2)))
+            if max_segment_bytes and len(segment) >= max_segment_bytes:
+                cut = min(recent, key=lambda r: (r[1], r[2]))[0]
+                finish(segment[:cut])
+                del segment[:cut]
+                recent.clear()
+                stats.forced_splits += 1
+        if post is not None:
+            held = post.flush()
+            if held is not None:
+                submit(held.pcm)
     except KeyboardInterrupt:
         print("Stopping capture")
     finally:
+        stop.set()
+        capture.join(timeout=2)
+        uploader.close(timeout=HTTP_TIMEOUT)
         stream.stop_stream()
         stream.close()
-        p.terminate()
+        if p is not None:
+            p.terminate()
+
+    result = stats.as_dict()
+    result["ring_overflow_bytes"] = ring.overflow_bytes
+    result["upload"] = uploader.stats()
+    result["postproc"] = post.stats.as_dict() if post is not None else None
+    return result
 
 
 if __name__ == "__main__":
-    # resolve session id once at startup
-    print("[info] Launching capture. Start a session in the browser when ready.")
-    capture_audio_segment()
+    ap = argparse.ArgumentParser(description="Capture system audio and send speech segments to the backend.")
+    ap.add_argument("--synthetic", type=float, metavar="SECONDS",
+                    help="use a synthetic source for SECONDS instead of an audio device")
+    ap.add_argument("--fake-upload-delay", type=float, metavar="SECONDS",
+                    help="don't POST; pretend each upload takes SECONDS (with --synthetic)")
+    args = ap.parse_args()
+
+    if args.synthetic:
+        source = SyntheticStream(args.synthetic)
+        send = process_audio_segment
+        if args.fake_upload_delay is not None:
+            def send(pcm, delay=args.fake_upload_delay):
+                time.sleep(delay)
+                return True
+        result = capture_audio_segment(stream=source, uploader=SegmentUploader(send=send))
+        expected = source.frames_delivered * 2 // FRAME_BYTES
+        print(f"[info] synthetic: {expected} frames generated, {result['frames_processed']} processed, "
+              f"ring overflow {result['ring_overflow_bytes']} B, device overflows {result['input_overflows']} "
+              f"({result['overflow_ms']} ms lost)")
+        print(f"[info] segments {result['segments']} ({result['forced_splits']} forced splits, "
+              f"largest {result['max_segment_bytes']} B), upload {result['upload']}")
+        print(f"[info] post-processing {result['postproc']}")
+    else:
+        # follow the active session in the background instead of asking per segment
+        print("[info] Launching capture. Start a session in the browser when ready.")
+        SESSION_CACHE.start_watching()
+        capture_audio_segment()
@@ -0,0 +1,138 @@
+"""
+Retrieval over a session's resume and job description.
+
+The documents are split into short chunks when the session context is
+built and indexed with BM25 (NumPy, in memory). Documents that fit the
+token budget go into the prompt in full. Larger ones are cut down to the
+chunks most relevant to the transcript, and budget left over after those
+goes to each document's leading chunks.
+"""
+import re
+
+import numpy as np
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _ENCODING = None
+
+_TOKEN_RE = re.compile(r"[\w+#.]*\w[\w+#]*")
+
+# Too common in questions and documents alike to say anything about relevance
+STOPWORDS = frozenset("""
+a about an and are as at be been but by can could did do does for from had has have how i if in
+into is it its me my of on or our so that the their them then there these they this to was we
+were what when where which who why will with would you your
+""".split())
+
+
+def estimate_tokens(text: str) -> int:
+    """Prompt tokens for `text` (tiktoken when installed, else ~4 characters per token)."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return (len(text) + 3) // 4
+
+
+def terms(text: str) -> list:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class Chunk:
+    def __init__(self, source: str, position: int, text: str):
+        self.source = source       # "resume" or "jd"
+        self.position = position   # order within its document
+        self.text = text
+        self.tokens = estimate_tokens(text)
+
+
+def chunk_document(text: str, source: str, max_words: int = 80) -> list:
+    """
+    Pack consecutive lines into chunks of at most `max_words` words. Blank
+    lines always end a chunk, and over-long lines are cut.
+    """
+    pieces = []
+    for line in (text or "").splitlines():
+        words = line.split()
+        for i in range(0, len(words), max_words):
+            pieces.append(" ".join(words[i:i + max_words]))
+        if not words:
+            pieces.append("")
+
+    chunks, current, count = [], [], 0
+    for piece in pieces:
+        n = len(piece.split())
+        if current and (not piece or count + n > max_words):
+            chunks.append(Chunk(source, len(chunks), "\n".join(current)))
+            current, count = [], 0
+        if piece:
+            current.append(piece)
+            count += n
+    if current:
+        chunks.append(Chunk(source, len(chunks), "\n".join(current)))
+    return chunks
+
+
+class BM25Index:
+    def __init__(self, chunks: list, k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        vocab = {}
+        docs = [terms(c.text) for c in chunks]
+        for doc in docs:
+            for t in doc:
+                vocab.setdefault(t, len(vocab))
+        tf = np.zeros((len(chunks), len(vocab)), dtype=np.float32)
+        for i, doc in enumerate(docs):
+            for t in doc:
+                tf[i, vocab[t]] += 1
+        lengths = tf.sum(axis=1)
+        avg = float(lengths.mean()) if len(chunks) and lengths.mean() > 0 else 1.0
+        df = np.count_nonzero(tf, axis=0)
+        n = len(chunks)
+        self.vocab = vocab
+        self.idf = np.log(1 + (n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        # Precompute the saturated term weights; a query is then a column sum
+        norm = k1 * (1 - b + b * lengths / avg)
+        self._weights = (tf * (k1 + 1)) / (tf + norm[:, None]) * self.idf if n else tf
+
+    def scores(self, query: str) -> np.ndarray:
+        cols = [self.vocab[t] for t in set(terms(query)) if t in self.vocab]
+        if not cols or not len(self.chunks):
+            return np.zeros(len(self.chunks), dtype=np.float32)
+        return self._weights[:, cols].sum(axis=1)
+
+    def select(self, query: str, k: int = 6, budget: int = 1200) -> list:
+        """
+        Up to k chunks by BM25 score that fit in `budget` tokens, then the
+        leading chunks of each document (taking turns) in whatever budget is
+        left, so a question matching nothing in one document (e.g. "can you
+        elaborate?") still gets its opening. Returned in document order.
+        """
+        scores = self.scores(query)
+        matched = [int(i) for i in np.argsort(-scores, kind="stable") if scores[i] > 0][:k]
+        leading = sorted(range(len(self.chunks)), key=lambda i: (self.chunks[i].position, self.chunks[i].source))
+        picked, used = [], 0
+        for i in matched + [i for i in leading if i not in matched]:
+            cost = self.chunks[i].tokens
+            if used + cost > budget:
+                continue
+            picked.append(i)
+            used += cost
+        picked.sort(key=lambda i: (self.chunks[i].source != "resume", self.chunks[i].position))
+        return [self.chunks[i] for i in picked]
+
+
+def render_selected_context(chunks: list) -> str:
+    """[CONTEXT] block holding only the selected excerpts of each document."""
+    resume = "\n...\n".join(c.text for c in chunks if c.source == "resume") or "(no relevant excerpts)"
+    jd = "\n...\n".join(c.text for c in chunks if c.source == "jd") or "(no relevant excerpts)"
+    return f"""[CONTEXT]
+RESUME (relevant excerpts):
+{resume}
+
+JOB_DESCRIPTION (relevant excerpts):
+{jd}
+
+"""
@@ -0,0 +1,188 @@
+"""
+Adaptive end-of-turn detection.
+
+The segmenter ends a turn after a fixed silence (END_SILENCE_MS), so every
+answer waits at least that long. AdaptiveEndpointer ends it earlier when
+it can:
+
+  pauses   each time the speaker resumes inside a turn, the pause length
+           is recorded. Once min_samples are in, a silence longer than
+           the speaker's quantile pause (times margin) ends the turn, but
+           never before floor_ms.
+  cues     when the incremental transcript has caught up with the audio,
+           a finished question (ends with "?", or with a trailing question
+           word or tag: "...or why", "..., right") ends the turn after
+           cue_ms (300-500 ms; shorter for speakers whose pauses are
+           short). A dangling word ("and", "the", "um", a comma) keeps the
+           full timer.
+
+Anything else waits for the fixed timer, which stays the upper bound. An
+early end the speaker talks through (speech again before the fixed timer
+would have fired) is a false split. The pause is learned as a within-turn
+one, and the caller merges the two parts (see app._ws_audio_session).
+"""
+import bisect
+import re
+import threading
+from collections import deque
+
+QUESTION_WORDS = {"what", "why", "how", "when", "where", "who", "which", "whom", "whose"}
+# Tag questions and closers that end a spoken question without a question word
+QUESTION_TAGS = {"right", "correct", "yes", "no", "ok", "okay", "true", "not", "else"}
+DANGLING = {
+    "and", "or", "but", "so", "because", "if", "then", "the", "a", "an", "to", "of", "in", "on", "for",
+    "with", "about", "like", "um", "uh", "er", "erm", "hmm", "you", "your", "my", "is", "are", "was", "were",
+    "that", "this", "as", "at", "by", "from", "into", "than", "when", "while", "which",
+}
+_WORDS = re.compile(r"[a-z']+")
+
+CUE_COMPLETE = 1
+CUE_NONE = 0
+CUE_INCOMPLETE = -1
+
+
+def text_cue(text: str) -> int:
+    """Whether a partial transcript reads as a finished question, an unfinished phrase, or neither."""
+    text = (text or "").strip()
+    if not text:
+        return CUE_NONE
+    if text.endswith("?"):
+        return CUE_COMPLETE
+    if text[-1] in ",;:-" or text.endswith("..."):
+        return CUE_INCOMPLETE
+    words = _WORDS.findall(text.lower())
+    if not words:
+        return CUE_NONE
+    last = words[-1]
+    if last in DANGLING:
+        return CUE_INCOMPLETE
+    if last in QUESTION_WORDS and len(words) > 1:
+        # "...and why." / "...or how"
+        return CUE_COMPLETE
+    if last in QUESTION_TAGS and len(words) > 2 and re.search(r",\s*\w+[.!]?$", text):
+        # "..., right." -- only as a tag after a comma, not "turn right"
+        return CUE_COMPLETE
+    return CUE_NONE
+
+
+class EndpointStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.early = 0
+        self.cue_ends = 0
+        self.false_splits = 0
+        self._delays = deque(maxlen=2000)   # silence (ms) when each turn was closed
+
+    def record_end(self, silence_ms: int, early: bool, cue: bool):
+        with self._lock:
+            self.turns += 1
+            self.early += early
+            self.cue_ends += cue
+            self._delays.append(silence_ms)
+
+    def record_false_split(self):
+        with self._lock:
+            self.false_splits += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            delays = sorted(self._delays)
+            return {
+                "turns": self.turns,
+                "early": self.early,
+                "cue_ends": self.cue_ends,
+                "false_splits": self.false_splits,
+                "false_split_rate": round(self.false_splits / self.turns, 3) if self.turns else 0.0,
+                "p50_endpoint_ms": delays[len(delays) // 2] if delays else 0,
+            }
+
+
+ENDPOINT_STATS = EndpointStats()
+
+
+class AdaptiveEndpointer:
+    """
+    One per audio stream. The caller reports resumed pauses (observe_pause),
+    asks should_end() on each silent frame inside a turn, calls ended() when
+    it closes the turn, and resumed() at the next onset after an early end.
+    """
+
+    def __init__(self, frame_ms: int, max_ms: int = 1000, floor_ms: int = 500, cue_ms: int = 500,
+                 min_cue_ms: int = 300, quantile: float = 0.9, margin: float = 1.25, min_samples: int = 8,
+                 min_pause_ms: int = 150, window: int = 200, stats: EndpointStats = ENDPOINT_STATS):
+        self.frame_ms = frame_ms
+        self.max_ms = max_ms
+        # The fixed timer as the segmenter counts it, in whole frames (990 ms at 30 ms frames)
+        self.end_frames = max(1, int(max_ms / frame_ms))
+        self.end_ms = self.end_frames * frame_ms
+        self.floor_ms = min(floor_ms, max_ms)
+        self.cue_ms = min(cue_ms, max_ms)
+        self.min_cue_ms = min(min_cue_ms, self.cue_ms)
+        self.quantile = quantile
+        self.margin = margin
+        self.min_samples = min_samples
+        self.min_pause_ms = min_pause_ms
+        self.stats = stats
+        self._pauses = deque(maxlen=window)
+        self._sorted = []
+        self._threshold = max_ms
+        self._cue = None      # what closed the turn in progress: "cue", "pauses" or None
+
+    def _quantile(self, q: float) -> float:
+        return self._sorted[min(len(self._sorted) - 1, int(q * len(self._sorted)))]
+
+    def observe_pause(self, ms: int):
+        """The speaker resumed after `ms` of silence inside a turn."""
+        if ms < self.min_pause_ms:
+            return
+        if len(self._pauses) == self._pauses.maxlen:
+            self._sorted.pop(bisect.bisect_left(self._sorted, self._pauses[0]))
+        self._pauses.append(ms)
+        bisect.insort(self._sorted, ms)
+        if len(self._sorted) >= self.min_samples:
+            learned = self._quantile(self.quantile) * self.margin
+            self._threshold = int(min(self.max_ms, max(self.floor_ms, learned)))
+
+    def threshold_ms(self, text=None) -> int:
+        """Silence that ends the turn now, given the settled partial transcript (None if not caught up)."""
+        return self._threshold_for(text_cue(text) if text is not None else CUE_NONE)
+
+    def _threshold_for(self, cue: int) -> int:
+        if cue == CUE_INCOMPLETE:
+            return self.max_ms
+        if cue == CUE_COMPLETE:
+            if len(self._sorted) >= self.min_samples:
+                # A speaker who pauses briefly mid-question gets the shorter wait
+                return int(min(self.cue_ms, max(self.min_cue_ms, self._quantile(0.5))))
+            return self.cue_ms
+        return self._threshold
+
+    def should_end(self, silence_frames: int, text=None) -> bool:
+        if silence_frames >= self.end_frames:
+            return True
+        silence_ms = silence_frames * self.frame_ms
+        cue = text_cue(text) if text is not None else CUE_NONE
+        if silence_ms >= self._threshold_for(cue):
+            self._cue = "cue" if cue == CUE_COMPLETE else "pauses"
+            return True
+        return False
+
+    def ended(self, silence_frames: int) -> bool:
+        """The turn was closed after `silence_frames`; returns True if that was before the fixed timer."""
+        early = silence_frames < self.end_frames
+        self.stats.record_end(silence_frames * self.frame_ms, early, early and self._cue == "cue")
+        self._cue = None
+        return early
+
+    def resumed(self, gap_ms: int) -> bool:
+        """
+        Speech started `gap_ms` after the end of an early-closed turn.
+        Returns True when the fixed timer would not have closed it: a false
+        split, learned as a within-turn pause.
+        """
+        if gap_ms >= self.end_ms:
+            return False
+        self.stats.record_false_split()
+        self.observe_pause(gap_ms)
+        return True
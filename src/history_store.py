@@ -0,0 +1,317 @@
+"""
+Append-only chat history store.
+
+Each session keeps its turns in data/sessions/<id>/chat.jsonl, one JSON
+record per line. Appends touch only the end of the file, and the last N
+turns of every active session are kept in memory so prompt assembly never
+has to re-read or re-sort the history.
+
+Turns are numbered from 1 in file order (`seq`). The byte offset of every
+line is indexed when a session is loaded, so page(since, limit) reads only
+the requested turns (or none at all when they are still in the tail).
+
+Older sessions that still have a chat.json array are imported on first use.
+
+With a `writer` (artifact_writer.ArtifactWriter) the in-memory tail is
+updated immediately and the line is appended to disk in the background.
+Turns still queued are kept per session until the writer reports them
+written, so reads past the tail serve them from memory instead of waiting
+for the writer's whole queue (recordings included) to drain. A turn the
+writer failed to write is dropped, and the session is reloaded from disk
+on its next use.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict, deque
+from functools import partial
+from itertools import islice
+
+
+class ChatHistoryStore:
+    def __init__(self, root="data/sessions", tail_size=20, max_sessions=256, fsync=True, writer=None):
+        self.root = root
+        self.writer = writer
+        self.tail_size = tail_size
+        self.max_sessions = max_sessions
+        self.fsync = fsync
+        self._tails = OrderedDict()   # session_id -> deque of recent turns (LRU order)
+        self._counts = {}             # session_id -> total turns on disk
+        self._offsets = {}            # session_id -> byte offset of each turn's line
+        self._sizes = {}              # session_id -> file size once queued appends land
+        self._unwritten = {}          # session_id -> turns queued with the writer, oldest first
+        self._failed = set()          # sessions with a turn the writer could not write
+        self._lock = threading.Lock()
+        # Taken alone by the writer's thread, so a full writer queue can't deadlock with _lock
+        self._unwritten_lock = threading.Lock()
+
+    # ---------------------------
+    # Paths
+    # ---------------------------
+
+    def session_dir(self, session_id: str) -> str:
+        return os.path.join(self.root, session_id)
+
+    def jsonl_path(self, session_id: str) -> str:
+        return os.path.join(self.session_dir(session_id), "chat.jsonl")
+
+    def legacy_path(self, session_id: str) -> str:
+        return os.path.join(self.session_dir(session_id), "chat.json")
+
+    # ---------------------------
+    # Loading / import
+    # ---------------------------
+
+    def _iter_file(self, path):
+        """Yield records from a JSONL file, skipping a torn final line."""
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Partial write from a crash; everything before it is intact.
+                    continue
+
+    def _repair_tail(self, path):
+        """Truncate a half-written last line so the next append starts clean."""
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            # Walk back to the last newline and cut there.
+            pos = size - 1
+            while pos > 0:
+                step = min(4096, pos)
+                f.seek(pos - step)
+                chunk = f.read(step)
+                idx = chunk.rfind(b"\n")
+                if idx != -1:
+                    pos = pos - step + idx + 1
+                    break
+                pos -= step
+            f.truncate(pos)
+
+    def import_legacy(self, session_id: str) -> int:
+        """
+        Convert data/sessions/<id>/chat.json into chat.jsonl.
+        Returns the number of imported turns. chat.json is left in place.
+        """
+        legacy = self.legacy_path(session_id)
+        target = self.jsonl_path(session_id)
+        try:
+            with open(legacy, 'r', encoding='utf-8') as f:
+                history = json.load(f) or []
+        except Exception:
+            history = []
+
+        history.sort(key=lambda t: t.get("timestamp", ""))
+        tmp = target + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for turn in history:
+                f.write(json.dumps(turn, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, target)
+        return len(history)
+
+    def import_all(self) -> int:
+        """Import every session under root that has chat.json but no chat.jsonl."""
+        imported = 0
+        if not os.path.isdir(self.root):
+            return 0
+        for session_id in os.listdir(self.root):
+            if os.path.exists(self.legacy_path(session_id)) and not os.path.exists(self.jsonl_path(session_id)):
+                self.import_legacy(session_id)
+                imported += 1
+        return imported
+
+    def _load(self, session_id: str):
+        """Return the in-memory tail for a session, loading it on first use. Caller holds the lock."""
+        with self._unwritten_lock:
+            failed = session_id in self._failed
+            self._failed.discard(session_id)
+        if failed:
+            # The tail and offsets count a turn that never reached the file
+            self._drop(session_id)
+        tail = self._tails.get(session_id)
+        if tail is not None:
+            self._tails.move_to_end(session_id)
+            return tail
+
+        path = self.jsonl_path(session_id)
+        if self._queued(session_id):
+            # Evicted while appends were still queued: they must be on disk before reading
+            self.writer.flush()
+        if not os.path.exists(path) and os.path.exists(self.legacy_path(session_id)):
+            self.import_legacy(session_id)
+        self._repair_tail(path)
+
+        tail = deque(maxlen=self.tail_size)
+        offsets = []
+        size = 0
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for raw in f:
+                    start, size = size, size + len(raw)
+                    line = raw.strip()
+                    if not line:
+                        continue
+                    try:
+                        turn = json.loads(line)
+                    except ValueError:
+                        continue
+                    tail.append(turn)
+                    offsets.append(start)
+
+        self._tails[session_id] = tail
+        self._counts[session_id] = len(offsets)
+        self._offsets[session_id] = offsets
+        self._sizes[session_id] = size
+        while len(self._tails) > self.max_sessions:
+            self._drop(next(iter(self._tails)))
+        return tail
+
+    def _drop(self, session_id: str):
+        """Forget a session's in-memory state. Caller holds the lock."""
+        self._tails.pop(session_id, None)
+        self._counts.pop(session_id, None)
+        self._offsets.pop(session_id, None)
+        self._sizes.pop(session_id, None)
+
+    def _queued(self, session_id: str) -> list:
+        """Turns the writer has not written yet, oldest first."""
+        with self._unwritten_lock:
+            return list(self._unwritten.get(session_id, ()))
+
+    def _written(self, session_id: str, ok: bool):
+        """Writer callback: the oldest queued turn of the session is in the file (or failed to get there)."""
+        with self._unwritten_lock:
+            queued = self._unwritten.get(session_id)
+            if queued:
+                queued.popleft()
+                if not queued:
+                    del self._unwritten[session_id]
+            if not ok:
+                self._failed.add(session_id)
+        if not ok:
+            print(f"[error] chat turn for session {session_id} was not written; reloading its history from disk")
+
+    def _indexed(self, session_id: str, size: int) -> int:
+        """Record where the next line lands and return its seq. Caller holds the lock."""
+        self._offsets[session_id].append(self._sizes[session_id])
+        self._sizes[session_id] += size
+        self._counts[session_id] += 1
+        return self._counts[session_id]
+
+    # ---------------------------
+    # Public API
+    # ---------------------------
+
+    def append(self, session_id: str, turn: dict) -> int:
+        """
+        Append one turn: a single write to the end of chat.jsonl, then update
+        the tail. Returns the turn's seq.
+        """
+        line = json.dumps(turn, ensure_ascii=False) + "\n"
+        with self._lock:
+            tail = self._load(session_id)
+            if self.writer is not None:
+                with self._unwritten_lock:
+                    self._unwritten.setdefault(session_id, deque()).append(turn)
+                self.writer.append_line(self.jsonl_path(session_id), line,
+                                        on_written=partial(self._written, session_id))
+                tail.append(turn)
+                return self._indexed(session_id, len(line.encode('utf-8')))
+            line = line.encode('utf-8')
+            os.makedirs(self.session_dir(session_id), exist_ok=True)
+            fd = os.open(self.jsonl_path(session_id), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, line)
+                if self.fsync:
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+            tail.append(turn)
+            return self._indexed(session_id, len(line))
+
+    def tail(self, session_id: str, n: int) -> list:
+        """Last n turns in chronological order, served from memory."""
+        with self._lock:
+            tail = self._load(session_id)
+            if n <= 0:
+                return []
+            if n >= len(tail):
+                return list(tail)
+            return list(tail)[-n:]
+
+    def count(self, session_id: str) -> int:
+        with self._lock:
+            self._load(session_id)
+            return self._counts[session_id]
+
+    def page(self, session_id: str, since: int = 0, limit: int = 50):
+        """
+        Turns with seq > since, oldest first, at most limit of them, as
+        (turns, total) where each turn is a copy carrying its "seq". Served
+        from the in-memory tail when it covers the range; otherwise only
+        the requested lines are read, starting at their indexed offset.
+        """
+        with self._lock:
+            tail = self._load(session_id)
+            total = self._counts[session_id]
+            since = min(max(0, since), total)
+            n = max(0, min(limit, total - since))
+            if n == 0:
+                return [], total
+            first_in_tail = total - len(tail)
+            if since >= first_in_tail:
+                turns = list(tail)[since - first_in_tail:since - first_in_tail + n]
+            else:
+                # Lines the writer hasn't reached yet come from memory
+                queued = self._queued(session_id)
+                on_disk = total - len(queued)
+                turns = []
+                if since < on_disk:
+                    with open(self.jsonl_path(session_id), 'rb') as f:
+                        f.seek(self._offsets[session_id][since])
+                        while len(turns) < min(n, on_disk - since):
+                            raw = f.readline()
+                            if not raw:
+                                break
+                            try:
+                                turns.append(json.loads(raw))
+                            except ValueError:
+                                # Skipped when the index was built too
+                                continue
+                turns += queued[max(0, since - on_disk):max(0, since + n - on_disk)]
+        return [dict(turn, seq=since + i + 1) for i, turn in enumerate(turns)], total
+
+    def read_all(self, session_id: str) -> list:
+        """Full history in chronological order (reads the file, plus turns still queued for it)."""
+        with self._lock:
+            self._load(session_id)
+            queued = self._queued(session_id)
+            on_disk = self._counts[session_id] - len(queued)
+            return list(islice(self._iter_file(self.jsonl_path(session_id)), on_disk)) + queued
+
+    def forget(self, session_id: str):
+        """Drop a session's in-memory tail (the file is untouched)."""
+        with self._lock:
+            self._drop(session_id)
+
+
+if __name__ == "__main__":
+    # One-off migration of existing chat.json files.
+    n = ChatHistoryStore().import_all()
+    print(f"Imported {n} session(s) to chat.jsonl")
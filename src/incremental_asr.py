@@ -0,0 +1,204 @@
+"""
+Incremental transcription of a single utterance.
+
+While the speaker is still talking, audio is cut into windows at VAD pause
+points and each window is transcribed in the background. When the turn
+ends only the short tail after the last cut is still outstanding. Window
+transcripts are stitched in order, dropping the words repeated in the
+overlap between neighbouring windows. Speech that never pauses is cut
+every max_window_ms, and audio already sent (less the overlap) is
+dropped, so a transcriber holds at most one window however long the turn.
+"""
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from transcribe import transcribe_pcm
+
+# Shared across connections; windows are short so a few workers go a long way.
+# Under the gevent server the workers are greenlets, so it can be much wider.
+ASR_WORKERS = int(os.environ.get("AGENT_BOB_ASR_WORKERS", "4"))
+ASR_EXECUTOR = ThreadPoolExecutor(max_workers=ASR_WORKERS, thread_name_prefix="asr")
+
+_WORD_RE = re.compile(r"[^\w']+")
+
+
+def _norm(word: str) -> str:
+    return _WORD_RE.sub("", word.lower())
+
+
+def stitch(left: str, right: str, max_overlap_words: int = 8) -> str:
+    """
+    Join two consecutive window transcripts, removing the longest run of
+    words that ends `left` and also starts `right` (compared without case
+    or punctuation).
+    """
+    left = left.strip()
+    right = right.strip()
+    if not left:
+        return right
+    if not right:
+        return left
+
+    lw = left.split()
+    rw = right.split()
+    ln = [_norm(w) for w in lw[-max_overlap_words:]]
+    rn = [_norm(w) for w in rw[:max_overlap_words]]
+
+    overlap = 0
+    for k in range(min(len(ln), len(rn)), 0, -1):
+        if ln[-k:] == rn[:k]:
+            overlap = k
+            break
+    rest = rw[overlap:]
+    return " ".join(lw + rest) if rest else left
+
+
+def transcribe_long(pcm, sample_rate: int, transcribe_fn=transcribe_pcm, window_ms: int = 20000,
+                    overlap_ms: int = 500) -> str:
+    """
+    Transcribe audio of any length one window at a time, stitching the
+    results. `pcm` is bytes or anything with len() and slicing (a spilled
+    utterance_buffer.PCMSpool), so only one window is ever in memory.
+    """
+    window = int(sample_rate * window_ms / 1000) * 2
+    overlap = int(sample_rate * overlap_ms / 1000) * 2
+    if len(pcm) <= window:
+        return transcribe_fn(pcm[:], sample_rate)
+    out = ""
+    start = 0
+    while start < len(pcm):
+        end = min(len(pcm), start + window)
+        out = stitch(out, transcribe_fn(pcm[max(0, start - overlap):end], sample_rate) or "")
+        start = end
+    return out
+
+
+class IncrementalTranscriber:
+    """
+    Feed frames with add(); call pause() at VAD pause points and finish()
+    at the end of the turn.
+
+    min_window_ms: don't cut a window shorter than this (short windows hurt accuracy)
+    max_window_ms: cut here even without a pause
+    overlap_ms:    audio re-sent from the previous window for context
+    on_partial:    called with the stitched text whenever a window completes
+    """
+
+    def __init__(self, sample_rate: int, transcribe_fn=transcribe_pcm, executor=ASR_EXECUTOR,
+                 min_window_ms: int = 2000, max_window_ms: int = 20000, overlap_ms: int = 500,
+                 on_partial=None):
+        self.sample_rate = sample_rate
+        self.transcribe_fn = transcribe_fn
+        self.executor = executor
+        self.min_window_bytes = int(sample_rate * min_window_ms / 1000) * 2
+        self.max_window_bytes = int(sample_rate * max_window_ms / 1000) * 2
+        self.overlap_bytes = int(sample_rate * overlap_ms / 1000) * 2
+        self.on_partial = on_partial
+
+        self.pcm = bytearray()        # audio from byte offset _base of the turn on
+        self._base = 0
+        self._cut = 0                 # byte offset where the next window starts
+        self._speech_since_cut = False
+        self._futures = []            # one per window, in audio order
+        self._results = []            # transcript per window, None until done
+        self._lock = threading.Lock()
+        self.windows_sent = 0
+
+    @property
+    def _end(self) -> int:
+        return self._base + len(self.pcm)
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self.pcm)
+
+    def add(self, frame: bytes, is_speech: bool):
+        self.pcm.extend(frame)
+        if is_speech:
+            self._speech_since_cut = True
+        if self._speech_since_cut and self._end - self._cut >= self.max_window_bytes:
+            self._submit(self._end)
+
+    def _submit(self, end: int):
+        start = max(self._base, self._cut - self.overlap_bytes)
+        window = bytes(self.pcm[start - self._base:end - self._base])
+        self._cut = end
+        self._speech_since_cut = False
+        # Only the next window's overlap is needed from here back
+        keep = max(self._base, end - self.overlap_bytes)
+        del self.pcm[:keep - self._base]
+        self._base = keep
+
+        with self._lock:
+            index = len(self._results)
+            self._results.append(None)
+        future = self.executor.submit(self.transcribe_fn, window, self.sample_rate)
+        future.add_done_callback(lambda f, i=index: self._on_done(i, f))
+        self._futures.append(future)
+        self.windows_sent += 1
+
+    def _on_done(self, index: int, future):
+        try:
+            text = future.result()
+        except Exception as e:
+            print(f"[warn] incremental ASR window {index} failed: {e}")
+            text = ""
+        with self._lock:
+            self._results[index] = text or ""
+        if self.on_partial:
+            partial = self.text()
+            if partial:
+                self.on_partial(partial)
+
+    def truncate(self, size: int):
+        """Drop audio past byte `size` of the turn, as far as no window has been sent for it."""
+        size = max(size, self._cut)
+        del self.pcm[size - self._base:]
+
+    def pause(self) -> bool:
+        """Cut a window at a pause point if enough new speech has accumulated."""
+        if not self._speech_since_cut:
+            return False
+        if self._end - self._cut < self.min_window_bytes:
+            return False
+        self._submit(self._end)
+        return True
+
+    def settled(self) -> bool:
+        """True when no speech arrived since the last cut and every window is transcribed."""
+        if self._speech_since_cut or not self._futures:
+            return False
+        return all(f.done() for f in self._futures)
+
+    def text(self) -> str:
+        """Stitched transcript of the leading windows that have completed so far."""
+        with self._lock:
+            done = []
+            for r in self._results:
+                if r is None:
+                    break
+                done.append(r)
+        out = ""
+        for r in done:
+            out = stitch(out, r)
+        return out
+
+    def finish(self) -> str:
+        """Transcribe the outstanding tail, wait for every window and return the full transcript."""
+        if self._speech_since_cut and self._end > self._cut:
+            self._submit(self._end)
+        out = ""
+        for f in self._futures:
+            # Read results straight off the futures: done-callbacks may still be running.
+            try:
+                text = f.result() or ""
+            except Exception:
+                text = ""
+            out = stitch(out, text)
+        return out
+
+    def cancel(self):
+        for f in self._futures:
+            f.cancel()
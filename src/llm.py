@@ -1,5 +1,11 @@
-import openai
+from openai_client import get_client
+from scheduler import SCHEDULER, PRIORITY_INTERACTIVE
+from context_retrieval import estimate_tokens
 import os
+import threading
+
+# Tokens an answer is expected to use, charged against the tokens/minute budget up front
+EXPECTED_OUTPUT_TOKENS = int(os.environ.get("AGENT_BOB_LLM_EXPECTED_OUTPUT_TOKENS", "500"))
 
 INTERVIEW_SYSTEM_TEMPLATE = """You are my voice in a job interview.
 Speak in the first person ("I"), in a natural, conversational style — like I am sitting across the table.
@@ -19,33 +25,123 @@ Honesty: Don’t invent fake company names, dates, or facts.
 Takeaway: End with a short, natural summary of why it matters.
 """
 
+def _messages(system, prompt):
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": prompt}
+    ]
+
+def _budget_tokens(system, prompt):
+    return estimate_tokens(system) + estimate_tokens(prompt) + EXPECTED_OUTPUT_TOKENS
+
+def _scheduled_client():
+    # Retries belong to the scheduler, which knows about rate limits and other sessions
+    return get_client().with_options(max_retries=0)
+
+def llm_params(*, system=INTERVIEW_SYSTEM_TEMPLATE, model="gpt-3.5-turbo", temperature=0.4, top_p=1.0):
+    """The generation parameters that shape an answer (part of the response cache key)."""
+    return {"system": system, "model": model, "temperature": temperature, "top_p": top_p}
+
+def _prepend(first, rest):
+    yield first
+    yield from rest
+
+class LLMStream:
+    """
+    Iterator over streamed LLM tokens that can be cancelled from another
+    thread. cancel() closes the underlying HTTP response, so the server
+    stops generating and the iterating thread ends promptly.
+    """
+
+    def __init__(self, prompt, *,
+                 system=INTERVIEW_SYSTEM_TEMPLATE,
+                 model="gpt-3.5-turbo",
+                 temperature=0.4,
+                 top_p=1.0,
+                 session_id=None,
+                 priority=PRIORITY_INTERACTIVE):
+        self.prompt = prompt
+        self.session_id = session_id
+        self.priority = priority
+        self.cancelled = False
+        self._response = None
+        self._lock = threading.Lock()
+        self._tokens = _budget_tokens(system, prompt)
+        self._kwargs = dict(model=model, temperature=temperature, top_p=top_p,
+                            messages=_messages(system, prompt))
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            response = self._response
+        if response is not None:
+            try:
+                response.close()
+            except Exception:
+                pass
+
+    def _open(self):
+        """
+        Start the request and wait for its first chunk, so a scheduler hedge
+        covers the whole time to first token. Returns (response, chunks).
+        """
+        response = _scheduled_client().chat.completions.create(stream=True, **self._kwargs)
+        chunks = iter(response)
+        try:
+            first = next(chunks, None)
+        except Exception:
+            response.close()
+            raise
+        rest = chunks if first is None else _prepend(first, chunks)
+        return response, rest
+
+    def __iter__(self):
+        if self.cancelled:
+            return
+        response, chunks = SCHEDULER.call("llm", self._open, session_id=self.session_id,
+                                          priority=self.priority, tokens=self._tokens,
+                                          discard=lambda opened: opened[0].close())
+        with self._lock:
+            self._response = response
+            cancelled = self.cancelled
+        if cancelled:
+            response.close()
+            return
+        try:
+            for chunk in chunks:
+                if self.cancelled:
+                    break
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception:
+            # Reading from a response closed by cancel() raises; anything else is real.
+            if not self.cancelled:
+                raise
+        finally:
+            response.close()
+
 def get_llm_response(prompt, *,
                      system=INTERVIEW_SYSTEM_TEMPLATE,
                      model="gpt-3.5-turbo",
                      temperature=0.4,
                      top_p=1.0,
-                     stream=False):
+                     stream=False,
+                     session_id=None,
+                     priority=PRIORITY_INTERACTIVE):
     """
     Get response from LLM using OpenAI GPT-3.5-turbo
-    Returns LLM response text or generator for streaming
+    Returns LLM response text, or an LLMStream of tokens when stream=True
     """
-    client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    response = client.chat.completions.create(
+    if stream:
+        # Not a generator itself, so the non-streaming branch can return text
+        return LLMStream(prompt, system=system, model=model,
+                         temperature=temperature, top_p=top_p,
+                         session_id=session_id, priority=priority)
+    response = SCHEDULER.call("llm", lambda: _scheduled_client().chat.completions.create(
         model=model,
         temperature=temperature,
         top_p=top_p,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": prompt}
-        ],
-        stream=stream
-    )
-    
-    if stream:
-        # Return generator for streaming responses
-        for chunk in response:
-            if chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
-    else:
-        # Return full response for non-streaming
-        return response.choices[0].message.content
+        messages=_messages(system, prompt),
+        stream=False
+    ), session_id=session_id, priority=priority, tokens=_budget_tokens(system, prompt))
+    return response.choices[0].message.content
@@ -0,0 +1,191 @@
+"""
+Per-stage latency metrics.
+
+Every stage of an utterance (endpointing, queueing, WAV write, ASR, cache
+lookup, prompt build, time to first token, generation, persistence and
+the end-to-end total) is timed into a Trace. Traces feed sliding-window
+summaries per stage, overall and per session, which /metrics renders in
+the Prometheus text format with p50/p95/p99 quantiles.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Summary:
+    """Count and sum since start, plus quantiles over the last `window` samples."""
+
+    def __init__(self, window: int = 1024):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantiles(self) -> dict:
+        if not self.samples:
+            return {q: 0.0 for q in QUANTILES}
+        ordered = sorted(self.samples)
+        last = len(ordered) - 1
+        return {q: ordered[min(last, int(round(q * last)))] for q in QUANTILES}
+
+
+class StageMetrics:
+    """
+    Summaries keyed by stage, overall and per session. Only the
+    `max_sessions` most recently active sessions keep their own series.
+    """
+
+    def __init__(self, window: int = 1024, max_sessions: int = 32):
+        self.window = window
+        self.max_sessions = max_sessions
+        self._stages = {}                 # stage -> Summary
+        self._sessions = OrderedDict()    # session_id -> {stage: Summary}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, session_id: str = None):
+        with self._lock:
+            summary = self._stages.get(stage)
+            if summary is None:
+                summary = self._stages[stage] = Summary(self.window)
+            summary.observe(seconds)
+            if session_id is None:
+                return
+            per = self._sessions.get(session_id)
+            if per is None:
+                per = self._sessions[session_id] = {}
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            self._sessions.move_to_end(session_id)
+            summary = per.get(stage)
+            if summary is None:
+                summary = per[stage] = Summary(self.window)
+            summary.observe(seconds)
+
+    def as_dict(self) -> dict:
+        """Milliseconds per stage, for /stats."""
+        with self._lock:
+            out = {}
+            for stage, s in sorted(self._stages.items()):
+                q = s.quantiles()
+                out[stage] = {"count": s.count,
+                              **{f"p{int(k * 100)}_ms": round(v * 1000, 1) for k, v in q.items()}}
+            return out
+
+    def render(self, prefix: str = "agent_bob") -> str:
+        """Prometheus text exposition of every series."""
+        lines = [
+            f"# HELP {prefix}_stage_seconds Latency of each utterance stage.",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        with self._lock:
+            for stage, s in sorted(self._stages.items()):
+                _summary_lines(lines, f"{prefix}_stage_seconds", {"stage": stage}, s)
+            lines.append(f"# HELP {prefix}_session_stage_seconds Latency of each utterance stage per session.")
+            lines.append(f"# TYPE {prefix}_session_stage_seconds summary")
+            for session_id, per in self._sessions.items():
+                for stage, s in sorted(per.items()):
+                    _summary_lines(lines, f"{prefix}_session_stage_seconds",
+                                   {"session": session_id, "stage": stage}, s)
+        return "\n".join(lines) + "\n"
+
+
+def _label_str(labels: dict) -> str:
+    def esc(v):
+        return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return ",".join(f'{k}="{esc(v)}"' for k, v in labels.items())
+
+
+def _summary_lines(lines, name, labels, summary):
+    for q, v in summary.quantiles().items():
+        lines.append(f"{name}{{{_label_str({**labels, 'quantile': q})}}} {v:.6f}")
+    lines.append(f"{name}_sum{{{_label_str(labels)}}} {summary.sum:.6f}")
+    lines.append(f"{name}_count{{{_label_str(labels)}}} {summary.count}")
+
+
+def render_gauges(sections: dict, prefix: str = "agent_bob") -> str:
+    """Flatten {section: {key: number}} into untyped Prometheus samples."""
+    lines = []
+    for section, values in sections.items():
+        for key, value in values.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            lines.append(f"{prefix}_{section}_{key} {value}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+STAGE_METRICS = StageMetrics()
+
+
+class Trace:
+    """
+    Timings for one utterance. Spans are recorded into STAGE_METRICS as they
+    finish; as_dict() is the per-utterance trace record.
+    """
+
+    def __init__(self, session_id: str, source: str, started_at: float = None,
+                 metrics: StageMetrics = STAGE_METRICS):
+        self.session_id = session_id
+        self.source = source               # "ws-audio" or "process"
+        self.metrics = metrics
+        # "total" runs from here: request arrival, or the end of speech for /ws-audio
+        self.started_at = time.perf_counter() if started_at is None else started_at
+        self.wall_start = time.time() - (time.perf_counter() - self.started_at)
+        self.stages = {}                   # stage -> seconds
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self.metrics.observe(stage, seconds, self.session_id)
+
+    def span(self, stage: str):
+        return _Span(self, stage)
+
+    def mark(self, stage: str, since: float):
+        """Record the time from `since` (a perf_counter value) until now."""
+        self.record(stage, time.perf_counter() - since)
+
+    def tokens(self, tokens):
+        """Pass tokens through, recording time to first token and total generation time."""
+        start = time.perf_counter()
+        first = True
+        try:
+            for token in tokens:
+                if first:
+                    self.mark("ttft", start)
+                    first = False
+                yield token
+        finally:
+            self.mark("generate", start)
+
+    def finish(self):
+        self.mark("total", self.started_at)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "session_id": self.session_id,
+                "source": self.source,
+                "started": self.wall_start,
+                "stages_ms": {k: round(v * 1000, 2) for k, v in self.stages.items()},
+            }
+
+
+class _Span:
+    def __init__(self, trace, stage):
+        self.trace = trace
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.mark(self.stage, self.start)
+        return False
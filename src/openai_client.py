@@ -0,0 +1,132 @@
+"""
+Process-wide OpenAI client.
+
+One client (and therefore one HTTP connection pool) is shared by every
+transcription and chat call, so consecutive utterances reuse warm
+keep-alive connections instead of paying for a new pool and TLS handshake.
+
+Configuration (env, all optional):
+  OPENAI_BASE_URL                   point at a local stand-in server
+  AGENT_BOB_OPENAI_POOL_SIZE        max connections in the pool (default 20)
+  AGENT_BOB_OPENAI_KEEPALIVE        idle keep-alive expiry in seconds (default 90)
+  AGENT_BOB_OPENAI_TIMEOUT          read timeout in seconds (default 30)
+  AGENT_BOB_OPENAI_CONNECT_TIMEOUT  connect timeout in seconds (default 5)
+  AGENT_BOB_OPENAI_MAX_RETRIES      SDK retry count (default 2)
+"""
+import os
+import threading
+
+import httpx
+import openai
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return float(default)
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return int(default)
+
+
+def default_config() -> dict:
+    return {
+        "api_key": os.getenv("OPENAI_API_KEY"),
+        "base_url": os.getenv("OPENAI_BASE_URL") or None,
+        "pool_size": _env_int("AGENT_BOB_OPENAI_POOL_SIZE", 20),
+        "keepalive": _env_float("AGENT_BOB_OPENAI_KEEPALIVE", 90),
+        "timeout": _env_float("AGENT_BOB_OPENAI_TIMEOUT", 30),
+        "connect_timeout": _env_float("AGENT_BOB_OPENAI_CONNECT_TIMEOUT", 5),
+        "max_retries": _env_int("AGENT_BOB_OPENAI_MAX_RETRIES", 2),
+    }
+
+
+def build_client(config: dict) -> openai.OpenAI:
+    """Construct an OpenAI client with an explicitly sized keep-alive pool."""
+    http_client = openai.DefaultHttpxClient(
+        limits=httpx.Limits(
+            max_connections=config["pool_size"],
+            max_keepalive_connections=config["pool_size"],
+            keepalive_expiry=config["keepalive"],
+        ),
+        timeout=httpx.Timeout(config["timeout"], connect=config["connect_timeout"]),
+    )
+    kwargs = {
+        "api_key": config["api_key"],
+        "max_retries": config["max_retries"],
+        "http_client": http_client,
+    }
+    if config["base_url"]:
+        kwargs["base_url"] = config["base_url"]
+    return openai.OpenAI(**kwargs)
+
+
+_client = None
+_config = None
+_lock = threading.Lock()
+
+
+def configure(**overrides):
+    """
+    Replace the shared client, e.g. configure(base_url="http://127.0.0.1:8001/v1").
+    Unspecified settings fall back to the environment.
+    """
+    global _client, _config
+    config = default_config()
+    config.update({k: v for k, v in overrides.items() if v is not None})
+    with _lock:
+        old = _client
+        _config = config
+        _client = build_client(config)
+    if old is not None:
+        old.close()
+    return _client
+
+
+def get_client() -> openai.OpenAI:
+    """Return the shared client, creating it on first use."""
+    global _client, _config
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _config = default_config()
+                _client = build_client(_config)
+    return _client
+
+
+def close_client():
+    global _client
+    with _lock:
+        old, _client = _client, None
+    if old is not None:
+        old.close()
+
+
+def prewarm(connections: int = 2, background: bool = True):
+    """
+    Open `connections` pooled connections ahead of the first utterance
+    (called from /start-session). Each one does a cheap GET /models so DNS,
+    TCP and TLS are already done when the first transcription goes out.
+    """
+    def _warm_one():
+        try:
+            get_client().with_options(max_retries=0, timeout=10).models.list()
+        except Exception as e:
+            print(f"[warn] OpenAI pre-warm failed: {e}")
+
+    def _warm():
+        threads = [threading.Thread(target=_warm_one, daemon=True) for _ in range(max(1, connections))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    if background:
+        threading.Thread(target=_warm, daemon=True).start()
+    else:
+        _warm()
@@ -0,0 +1,336 @@
+"""
+Per-connection processing pipeline for /ws-audio.
+
+    receive/VAD  ->  segment queue  ->  ASR  ->  LLM queue  ->  LLM  ->  persist queue  ->  persistence
+
+The receive loop only does VAD and hands finished segments to the segment
+queue, so capture never stalls while a multi-second answer is streaming.
+Each downstream stage runs on its own worker thread. Queues are bounded and
+every queue has an explicit policy for what happens when it is full:
+
+  block        wait for room (used where losing work is not acceptable)
+  drop_oldest  evict the oldest queued item to admit the new one
+  drop_newest  refuse the new item
+
+The LLM stage registers the answer it is streaming with begin_answer();
+interrupt() (barge-in: the speaker started a new question) cancels it so
+the worker is free for the next segment.
+"""
+import itertools
+import queue
+import threading
+import time
+
+_STOP = object()
+_ids = itertools.count(1)
+
+
+class Segment:
+    """One utterance travelling through the pipeline. Stages attach their results as attributes."""
+
+    def __init__(self, session_id: str, sample_rate: int, pcm: bytes, **extra):
+        self.session_id = session_id
+        self.sample_rate = sample_rate
+        self.pcm = pcm
+        self.created_at = time.monotonic()
+        self.enqueued_at = self.created_at
+        self.interrupted_at = None    # perf_counter() of a barge-in that cancelled this answer
+        self.__dict__.update(extra)
+
+    @property
+    def interrupted(self) -> bool:
+        return self.interrupted_at is not None
+
+
+class StageStats:
+    def __init__(self):
+        self.processed = 0
+        self.failed = 0
+        self.wait_total = 0.0
+        self.busy_total = 0.0
+        self.busy_max = 0.0
+        self.busy_last = 0.0
+
+    def record(self, wait: float, busy: float, ok: bool):
+        self.processed += 1
+        if not ok:
+            self.failed += 1
+        self.wait_total += wait
+        self.busy_total += busy
+        self.busy_last = busy
+        self.busy_max = max(self.busy_max, busy)
+
+    def as_dict(self) -> dict:
+        n = self.processed or 1
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_queue_wait_ms": round(1000 * self.wait_total / n, 1),
+            "avg_latency_ms": round(1000 * self.busy_total / n, 1),
+            "last_latency_ms": round(1000 * self.busy_last, 1),
+            "max_latency_ms": round(1000 * self.busy_max, 1),
+        }
+
+
+class StageQueue:
+    """Bounded queue with a drop policy and depth counters."""
+
+    POLICIES = ("block", "drop_oldest", "drop_newest")
+
+    def __init__(self, name: str, maxsize: int, policy: str = "block", on_drop=None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown drop policy: {policy}")
+        self.name = name
+        self.policy = policy
+        self.on_drop = on_drop
+        self._q = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.max_depth = 0
+        self.dropped = 0
+
+    def _dropped(self, item):
+        self.dropped += 1
+        if self.on_drop is not None:
+            try:
+                self.on_drop(item)
+            except Exception as e:
+                print(f"[warn] on_drop for {self.name} failed: {e}")
+
+    def put(self, item) -> bool:
+        """Enqueue according to the policy. Returns False if `item` itself was dropped."""
+        item.enqueued_at = time.monotonic()
+        if self.policy == "block":
+            self._q.put(item)
+        else:
+            with self._lock:
+                try:
+                    self._q.put_nowait(item)
+                except queue.Full:
+                    if self.policy == "drop_newest":
+                        self._dropped(item)
+                        return False
+                    try:
+                        self._dropped(self._q.get_nowait())
+                    except queue.Empty:
+                        pass
+                    self._q.put_nowait(item)
+        self.max_depth = max(self.max_depth, self._q.qsize())
+        return True
+
+    def put_stop(self):
+        # Bypass the policy so shutdown is never dropped
+        self._q.put(_STOP)
+
+    def get(self):
+        return self._q.get()
+
+    def depth(self) -> int:
+        return self._q.qsize()
+
+    def as_dict(self) -> dict:
+        return {
+            "depth": self.depth(),
+            "max_depth": self.max_depth,
+            "capacity": self._q.maxsize,
+            "policy": self.policy,
+            "dropped": self.dropped,
+        }
+
+
+class BargeInStats:
+    """
+    Answers cut short by barge-in. Tokens saved are estimated as the mean
+    length of answers that ran to completion minus what was streamed
+    before the cancel.
+    """
+
+    def __init__(self, default_answer_tokens: int = 500):
+        self._lock = threading.Lock()
+        self.interrupted = 0
+        self.tokens_streamed = 0
+        self.tokens_saved = 0
+        self.cancel_latency_total = 0.0
+        self.cancel_latency_max = 0.0
+        self.completed = 0
+        self.completed_tokens = 0
+        self.default_answer_tokens = default_answer_tokens
+
+    def answer_completed(self, tokens: int):
+        with self._lock:
+            self.completed += 1
+            self.completed_tokens += tokens
+
+    def record(self, cancel_latency: float, tokens_streamed: int):
+        with self._lock:
+            full = self.completed_tokens / self.completed if self.completed else self.default_answer_tokens
+            self.interrupted += 1
+            self.tokens_streamed += tokens_streamed
+            self.tokens_saved += max(0, int(full) - tokens_streamed)
+            self.cancel_latency_total += cancel_latency
+            self.cancel_latency_max = max(self.cancel_latency_max, cancel_latency)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            n = self.interrupted or 1
+            return {
+                "interrupted": self.interrupted,
+                "completed": self.completed,
+                "tokens_streamed": self.tokens_streamed,
+                "tokens_saved": self.tokens_saved,
+                "avg_cancel_latency_ms": round(1000 * self.cancel_latency_total / n, 1),
+                "max_cancel_latency_ms": round(1000 * self.cancel_latency_max, 1),
+            }
+
+
+BARGE_IN_STATS = BargeInStats()
+
+
+# Live pipelines, for /stats
+PIPELINES = {}
+_registry_lock = threading.Lock()
+
+
+def pipelines_stats() -> dict:
+    with _registry_lock:
+        items = list(PIPELINES.items())
+    return {pid: p.stats() for pid, p in items}
+
+
+class ConnectionPipeline:
+    """
+    Wires the ASR, LLM and persistence stage functions together with
+    bounded queues. Stage functions take a Segment and return it (or None
+    to stop that segment from going further).
+    """
+
+    def __init__(self, session_id: str, asr_stage, llm_stage, persist_stage,
+                 segment_queue_size=4, llm_queue_size=2, persist_queue_size=64,
+                 on_drop=None):
+        self.id = f"conn-{next(_ids)}"
+        self.session_id = session_id
+        self.started_at = time.time()
+        self.segments_in = 0
+
+        self.segment_q = StageQueue("segments", segment_queue_size, "drop_oldest", on_drop)
+        self.llm_q = StageQueue("llm", llm_queue_size, "drop_oldest", on_drop)
+        self.persist_q = StageQueue("persist", persist_queue_size, "block")
+
+        self._stages = [
+            ("asr", asr_stage, self.segment_q, self.llm_q),
+            ("llm", llm_stage, self.llm_q, self.persist_q),
+            ("persist", persist_stage, self.persist_q, None),
+        ]
+        self.stage_stats = {name: StageStats() for name, _, _, _ in self._stages}
+        self._threads = []
+
+        # Outstanding persistence work; the LLM stage waits on it so each
+        # prompt sees the previous turn in chat history.
+        self._unpersisted = 0
+        self._persist_cond = threading.Condition()
+
+        # (segment, cancel) for the answer the LLM stage is streaming
+        self._active = None
+        self._active_lock = threading.Lock()
+        self.interruptions = 0
+
+    def start(self):
+        for name, fn, inq, outq in self._stages:
+            t = threading.Thread(target=self._worker, args=(name, fn, inq, outq),
+                                 name=f"{self.id}-{name}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        with _registry_lock:
+            PIPELINES[self.id] = self
+        return self
+
+    def submit(self, segment: Segment) -> bool:
+        """Called from the receive loop; never blocks (drop_oldest)."""
+        self.segments_in += 1
+        return self.segment_q.put(segment)
+
+    def wait_persisted(self, timeout: float = 5.0) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._persist_cond:
+            while self._unpersisted > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._persist_cond.wait(remaining)
+        return True
+
+    def begin_answer(self, segment: Segment, cancel):
+        """Called by the LLM stage before streaming; cancel() must stop the stream from another thread."""
+        with self._active_lock:
+            self._active = (segment, cancel)
+
+    def end_answer(self, segment: Segment):
+        with self._active_lock:
+            if self._active is not None and self._active[0] is segment:
+                self._active = None
+
+    def interrupt(self, segment: Segment = None):
+        """
+        Barge-in: cancel the answer being streamed, if any (only if it is
+        `segment`'s, when given), and return its segment.
+        """
+        with self._active_lock:
+            active = self._active
+            if active is None or (segment is not None and active[0] is not segment):
+                return None
+            self._active = None
+        segment, cancel = active
+        segment.interrupted_at = time.perf_counter()
+        self.interruptions += 1
+        try:
+            cancel()
+        except Exception as e:
+            print(f"[warn] {self.id} cancelling the answer failed: {e}")
+        return segment
+
+    def _worker(self, name, fn, inq, outq):
+        stats = self.stage_stats[name]
+        while True:
+            item = inq.get()
+            if item is _STOP:
+                if outq is not None:
+                    outq.put_stop()
+                return
+            started = time.monotonic()
+            wait = started - item.enqueued_at
+            ok = True
+            try:
+                result = fn(item)
+            except Exception as e:
+                print(f"[error] {self.id} {name} stage failed: {e}")
+                result = None
+                ok = False
+            stats.record(wait, time.monotonic() - started, ok)
+
+            if name == "persist":
+                with self._persist_cond:
+                    self._unpersisted -= 1
+                    self._persist_cond.notify_all()
+            if result is not None and outq is not None:
+                if outq is self.persist_q:
+                    with self._persist_cond:
+                        self._unpersisted += 1
+                outq.put(result)
+
+    def close(self, drain: bool = True, timeout: float = 120.0):
+        """Stop accepting work; with drain=True let queued segments finish first."""
+        self.segment_q.put_stop()
+        if drain:
+            deadline = time.monotonic() + timeout
+            for t in self._threads:
+                t.join(max(0.0, deadline - time.monotonic()))
+        with _registry_lock:
+            PIPELINES.pop(self.id, None)
+
+    def stats(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "segments_in": self.segments_in,
+            "interruptions": self.interruptions,
+            "queues": {q.name: q.as_dict() for q in (self.segment_q, self.llm_q, self.persist_q)},
+            "stages": {name: s.as_dict() for name, s in self.stage_stats.items()},
+        }
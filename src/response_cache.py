@@ -0,0 +1,333 @@
+"""
+Answer and transcript caches.
+
+  ResponseCache     exact cache keyed on the normalized transcript, the
+                    session, its context, the exchange the question
+                    follows and the model parameters, plus a per-session
+                    TF-IDF index that maps rephrased questions onto an
+                    answer already given in that session. Follow-ups that
+                    lean on the conversation ("can you elaborate on
+                    that?", "why?") are never cached
+  TranscriptCache   audio hash -> transcript, so replayed recordings skip
+                    Whisper
+
+Both are bounded LRUs whose entries also expire after `ttl` seconds.
+Hit/miss counters are kept in CACHE_STATS.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+_WORD_RE = re.compile(r"[\w']+")
+_PIECE_RE = re.compile(r"\s*\S+|\s+")
+# A question with any of these refers back to the conversation, so the same words can need another answer
+FOLLOW_UP_WORDS = {
+    "that", "this", "it", "its", "those", "these", "them", "they", "there", "he", "she", "him", "her",
+    "elaborate", "expand", "example", "again", "more", "else", "earlier", "previous", "above",
+}
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase words only: punctuation, casing and spacing don't change the key."""
+    return " ".join(_WORD_RE.findall((text or "").lower()))
+
+
+def _digest(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode('utf-8') if isinstance(part, str) else part)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _cosine(a, b) -> float:
+    """Cosine of two term lists' raw counts."""
+    ca, cb = Counter(a), Counter(b)
+    dot = sum(n * cb[t] for t, n in ca.items())
+    norm = (sum(n * n for n in ca.values()) * sum(n * n for n in cb.values())) ** 0.5
+    return dot / norm if norm else 0.0
+
+
+def replay_tokens(text: str):
+    """Split a stored answer into word-sized tokens (whitespace kept) for re-streaming."""
+    return iter(_PIECE_RE.findall(text))
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.stores = 0
+        self.audio_hits = 0
+        self.audio_misses = 0
+
+    def record(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            hits = self.exact_hits + self.near_hits
+            lookups = hits + self.misses
+            audio = self.audio_hits + self.audio_misses
+            return {
+                "exact_hits": self.exact_hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "skipped": self.skipped,
+                "stores": self.stores,
+                "hit_rate": (hits / lookups) if lookups else 0.0,
+                "audio_hits": self.audio_hits,
+                "audio_misses": self.audio_misses,
+                "audio_hit_rate": (self.audio_hits / audio) if audio else 0.0,
+            }
+
+
+CACHE_STATS = CacheStats()
+
+
+class TTLCache:
+    """Bounded LRU whose entries also expire `ttl` seconds after they were stored."""
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                self.expired += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "evictions": self.evictions, "expired": self.expired}
+
+
+class _TfidfIndex:
+    """
+    TF-IDF vectors of the questions answered in one session (and scope).
+    The weighted matrix is rebuilt lazily after an add; queries are a single
+    matrix-vector product.
+    """
+
+    def __init__(self, max_docs: int = 256):
+        self.max_docs = max_docs
+        self.docs = []        # list of (term list, cache key)
+        self._matrix = None
+        self._vocab = None
+        self._idf = None
+
+    def add(self, terms, key):
+        if any(k == key for _, k in self.docs):
+            return
+        self.docs.append((terms, key))
+        if len(self.docs) > self.max_docs:
+            self.docs.pop(0)
+        self._matrix = None
+
+    def remove(self, key):
+        self.docs = [d for d in self.docs if d[1] != key]
+        self._matrix = None
+
+    def _build(self):
+        vocab = {}
+        for terms, _ in self.docs:
+            for t in terms:
+                vocab.setdefault(t, len(vocab))
+        tf = np.zeros((len(self.docs), len(vocab)), dtype=np.float32)
+        for i, (terms, _) in enumerate(self.docs):
+            for t in terms:
+                tf[i, vocab[t]] += 1
+        n = len(self.docs)
+        df = np.count_nonzero(tf, axis=0)
+        self._idf = np.log((1 + n) / (1 + df)) + 1
+        w = tf * self._idf
+        norms = np.linalg.norm(w, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        self._matrix = w / norms
+        self._vocab = vocab
+
+    def nearest(self, terms):
+        """Return (key, cosine) of the closest stored question, or (None, 0.0)."""
+        if not self.docs or not terms:
+            return None, 0.0
+        if self._matrix is None:
+            self._build()
+        q = np.zeros(len(self._vocab), dtype=np.float32)
+        unseen = 0
+        for t in terms:
+            j = self._vocab.get(t)
+            if j is None:
+                unseen += 1
+            else:
+                q[j] += 1
+        q *= self._idf
+        # Words never seen in this session carry the maximum idf and only lower the score
+        unseen_idf = np.log(1 + len(self.docs)) + 1
+        qnorm = np.sqrt(float(np.dot(q, q)) + (unseen * unseen_idf) ** 2)
+        if qnorm == 0:
+            return None, 0.0
+        scores = self._matrix @ q / qnorm
+        best = int(np.argmax(scores))
+        return self.docs[best][1], float(scores[best])
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0, similarity: float = 0.9,
+                 min_words: int = 3, max_sessions: int = 64, stats=CACHE_STATS):
+        self.answers = TTLCache(max_entries, ttl)
+        self.similarity = similarity
+        self.min_words = min_words
+        self.max_sessions = max_sessions
+        self.stats = stats
+        self._indexes = OrderedDict()   # (session_id, scope) -> _TfidfIndex (LRU order)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def scope(session_id: str, context: str, params: dict, follows: str = "") -> str:
+        """Hash of everything besides the question that shapes the answer."""
+        return _digest(session_id or "", context or "", json.dumps(params or {}, sort_keys=True), follows)
+
+    def key(self, session_id: str, transcript: str, context: str, params: dict, history=()) -> str:
+        terms = normalize_text(transcript).split()
+        return _digest(" ".join(terms), self.scope(session_id, context, params, self.follows(terms, history)))
+
+    def cacheable(self, terms) -> bool:
+        """Short questions and ones that refer back ("why?", "elaborate on that") depend on the conversation."""
+        return len(terms) >= self.min_words and not FOLLOW_UP_WORDS.intersection(terms)
+
+    def follows(self, terms, history) -> str:
+        """
+        Digest of the exchange the question follows: the newest (question,
+        answer) in `history` that is not this question asked before, so
+        asking it again still finds the first answer.
+        """
+        for question, answer in reversed(list(history or ())):
+            asked = normalize_text(question).split()
+            if asked != terms and _cosine(asked, terms) < self.similarity:
+                return _digest(" ".join(asked), answer or "")
+        return ""
+
+    def _index(self, session_id, scope, create=False):
+        idx = self._indexes.get((session_id, scope))
+        if idx is None and create:
+            idx = self._indexes[(session_id, scope)] = _TfidfIndex()
+            while len(self._indexes) > self.max_sessions:
+                self._indexes.popitem(last=False)
+        if idx is not None:
+            self._indexes.move_to_end((session_id, scope))
+        return idx
+
+    def lookup(self, session_id: str, transcript: str, context: str, params: dict, history=()):
+        """
+        Return (answer, "exact" | "near", score) or None. `history` is the
+        session's (question, answer) turns before this one, oldest first.
+        Hits are only served within the same session and scope.
+        """
+        normalized = normalize_text(transcript)
+        terms = normalized.split()
+        if not self.cacheable(terms):
+            self.stats.record("skipped")
+            return None
+        scope = self.scope(session_id, context, params, self.follows(terms, history))
+        answer = self.answers.get(_digest(normalized, scope))
+        if answer is not None:
+            self.stats.record("exact_hits")
+            return answer, "exact", 1.0
+
+        if self.similarity < 1.0:
+            with self._lock:
+                idx = self._index(session_id, scope)
+                key, score = idx.nearest(terms) if idx is not None else (None, 0.0)
+                if key is not None and score >= self.similarity:
+                    answer = self.answers.get(key)
+                    if answer is None:
+                        # Evicted or expired behind the index's back
+                        idx.remove(key)
+            if key is not None and score >= self.similarity and answer is not None:
+                self.stats.record("near_hits")
+                return answer, "near", score
+
+        self.stats.record("misses")
+        return None
+
+    def store(self, session_id: str, transcript: str, context: str, params: dict, answer: str, history=()):
+        normalized = normalize_text(transcript)
+        terms = normalized.split()
+        if not answer or not self.cacheable(terms):
+            return
+        scope = self.scope(session_id, context, params, self.follows(terms, history))
+        key = _digest(normalized, scope)
+        self.answers.put(key, answer)
+        with self._lock:
+            self._index(session_id, scope, create=True).add(terms, key)
+        self.stats.record("stores")
+
+    def forget(self, session_id: str):
+        with self._lock:
+            for k in [k for k in self._indexes if k[0] == session_id]:
+                del self._indexes[k]
+
+    def stats_dict(self) -> dict:
+        with self._lock:
+            indexes = len(self._indexes)
+        return {**self.stats.as_dict(), **self.answers.stats(), "session_indexes": indexes}
+
+
+class TranscriptCache:
+    """Audio content hash -> transcript."""
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0, stats=CACHE_STATS):
+        self.entries = TTLCache(max_entries, ttl)
+        self.stats = stats
+
+    @staticmethod
+    def key(audio: bytes) -> str:
+        return hashlib.sha256(audio).hexdigest()
+
+    def get(self, audio: bytes):
+        text = self.entries.get(self.key(audio))
+        self.stats.record("audio_misses" if text is None else "audio_hits")
+        return text
+
+    def put(self, audio: bytes, text: str):
+        self.entries.put(self.key(audio), text)
+
+
+CACHE_TTL = float(os.getenv("AGENT_BOB_CACHE_TTL", "3600"))
+TRANSCRIPT_CACHE = TranscriptCache(
+    max_entries=int(os.getenv("AGENT_BOB_TRANSCRIPT_CACHE_SIZE", "512")),
+    ttl=CACHE_TTL,
+) if os.getenv("AGENT_BOB_TRANSCRIPT_CACHE", "1") != "0" else None
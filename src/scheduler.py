@@ -0,0 +1,376 @@
+"""
+Process-wide scheduler for OpenAI requests.
+
+Every transcription and chat request goes through SCHEDULER.call() rather
+than hitting the API directly:
+
+  concurrency  at most AGENT_BOB_OPENAI_CONCURRENCY requests in flight
+               (default: the HTTP pool size); the rest wait in a queue
+  budgets      per-kind token buckets for requests/minute and tokens/minute
+               (AGENT_BOB_LLM_RPM, AGENT_BOB_LLM_TPM, AGENT_BOB_ASR_RPM;
+               0 = unlimited). A 429 empties the bucket until the reset time
+               the API reports.
+  priority     when a slot frees up it goes to the waiter with the lowest
+               (priority, requests its session already has in flight,
+               arrival) - interactive work before speculation, and no
+               session can crowd the others out
+  retries      429s, 5xx, timeouts and connection errors are retried up to
+               AGENT_BOB_OPENAI_RETRIES times with full-jitter exponential
+               backoff, honouring Retry-After
+  hedging      with AGENT_BOB_HEDGE=1, a request still unanswered after the
+               p95 latency of its kind (AGENT_BOB_HEDGE_QUANTILE, at least
+               AGENT_BOB_HEDGE_MIN_MS) gets a second copy if a slot and
+               budget are free; whichever answers first is used
+
+For streamed chat, "answered" means the first token arrived. Queue wait is
+recorded as the `<kind>_scheduler_wait` stage; retries, 429s and hedge
+wins are counted in stats().
+"""
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import openai
+
+from metrics import STAGE_METRICS
+from openai_client import default_config
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_SPECULATIVE = 1
+
+_RESET_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset(value):
+    """'1s', '6m0s', '20ms' (x-ratelimit-reset-*) -> seconds, or None."""
+    if not value:
+        return None
+    parts = _RESET_RE.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(n) * _UNITS[unit] for n, unit in parts)
+
+
+class TokenBucket:
+    """Refills `per_minute` units a minute, holding at most a minute's worth."""
+
+    def __init__(self, per_minute: float = 0):
+        self.per_minute = per_minute
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.blocked_until = 0.0
+        self._last = time.monotonic()
+
+    def _refill(self, now):
+        if now > self._last:
+            self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.per_minute / 60.0)
+        self._last = now
+
+    def wait_time(self, n: float, now: float) -> float:
+        """Seconds until `n` units are available (0 when unlimited and not rate limited)."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if not self.per_minute:
+            return 0.0
+        self._refill(now)
+        n = min(n, self.capacity)
+        return 0.0 if self.tokens >= n else (n - self.tokens) * 60.0 / self.per_minute
+
+    def take(self, n: float):
+        if self.per_minute:
+            self.tokens -= min(n, self.capacity)
+
+    def block(self, seconds: float, now: float):
+        """Rate limited by the server: nothing goes out for `seconds`."""
+        if self.per_minute:
+            self.tokens = 0.0
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class _Waiter:
+    __slots__ = ("kind", "session_id", "priority", "tokens", "seq")
+
+    def __init__(self, kind, session_id, priority, tokens, seq):
+        self.kind = kind
+        self.session_id = session_id
+        self.priority = priority
+        self.tokens = tokens
+        self.seq = seq
+
+
+class KindStats:
+    def __init__(self, window: int = 256):
+        self.requests = 0
+        self.attempts = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.latencies = deque(maxlen=window)   # seconds per successful attempt
+
+    def quantile(self, q: float):
+        if len(self.latencies) < 20:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    def as_dict(self) -> dict:
+        p95 = self.quantile(0.95)
+        return {"requests": self.requests, "attempts": self.attempts, "retries": self.retries,
+                "rate_limited": self.rate_limited, "errors": self.errors, "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins, "p95_ms": round(1000 * p95, 1) if p95 is not None else None}
+
+
+def _retryable(e: Exception) -> bool:
+    if isinstance(e, openai.APIConnectionError):     # includes timeouts
+        return True
+    if isinstance(e, openai.APIStatusError):
+        return e.status_code in (408, 409, 429) or e.status_code >= 500
+    return False
+
+
+def _retry_after(e: Exception):
+    response = getattr(e, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000.0
+        except ValueError:
+            pass
+    return parse_reset(headers.get("retry-after"))
+
+
+class OpenAIScheduler:
+    def __init__(self, max_concurrency: int = 20, budgets: dict = None, max_retries: int = 3,
+                 backoff_base: float = 0.25, backoff_cap: float = 8.0, hedge: bool = False,
+                 hedge_quantile: float = 0.95, hedge_min: float = 0.25, metrics=STAGE_METRICS):
+        self.max_concurrency = max(1, max_concurrency)
+        # kind -> {"requests": TokenBucket, "tokens": TokenBucket}
+        self.budgets = budgets or {}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min = hedge_min
+        self.metrics = metrics
+        self.in_flight = 0
+        self._session_in_flight = {}
+        self._waiters = []
+        self._seq = 0
+        self._stats = {}
+        self._cond = threading.Condition()
+        self._hedge_pool = ThreadPoolExecutor(max_workers=2 * self.max_concurrency,
+                                              thread_name_prefix="openai-hedge")
+
+    # --- admission -------------------------------------------------------
+
+    def _kind(self, kind) -> KindStats:
+        stats = self._stats.get(kind)
+        if stats is None:
+            stats = self._stats[kind] = KindStats()
+        return stats
+
+    def _budget_wait(self, w: _Waiter, now: float) -> float:
+        budget = self.budgets.get(w.kind)
+        if not budget:
+            return 0.0
+        return max(budget["requests"].wait_time(1, now), budget["tokens"].wait_time(w.tokens, now))
+
+    def _grant(self, w: _Waiter):
+        budget = self.budgets.get(w.kind)
+        if budget:
+            budget["requests"].take(1)
+            budget["tokens"].take(w.tokens)
+        self.in_flight += 1
+        if w.session_id is not None:
+            self._session_in_flight[w.session_id] = self._session_in_flight.get(w.session_id, 0) + 1
+
+    def _order(self, w: _Waiter):
+        return w.priority, self._session_in_flight.get(w.session_id, 0), w.seq
+
+    def acquire(self, kind: str, session_id=None, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0):
+        """Block until this request may go out; returns the slot to release()."""
+        enqueued = time.perf_counter()
+        with self._cond:
+            self._seq += 1
+            w = _Waiter(kind, session_id, priority, tokens, self._seq)
+            self._waiters.append(w)
+            try:
+                while True:
+                    timeout = None
+                    if self.in_flight < self.max_concurrency:
+                        # A kind that is out of budget must not hold up the others
+                        now = time.monotonic()
+                        delays = {x: self._budget_wait(x, now) for x in self._waiters}
+                        ready = [x for x, d in delays.items() if d <= 0]
+                        if ready and min(ready, key=self._order) is w:
+                            break
+                        if not ready:
+                            timeout = min(delays.values())
+                    self._cond.wait(timeout)
+            finally:
+                self._waiters.remove(w)
+                # Whoever is next may be able to go now
+                self._cond.notify_all()
+            self._grant(w)
+        self.metrics.observe(f"{kind}_scheduler_wait", time.perf_counter() - enqueued, session_id)
+        return w
+
+    def try_acquire(self, kind: str, session_id=None, tokens: int = 0):
+        """A slot right now, or None - used for hedges, which never queue ahead of real requests."""
+        with self._cond:
+            w = _Waiter(kind, session_id, PRIORITY_SPECULATIVE, tokens, 0)
+            if self._waiters or self.in_flight >= self.max_concurrency or self._budget_wait(w, time.monotonic()) > 0:
+                return None
+            self._grant(w)
+            return w
+
+    def release(self, w: _Waiter):
+        with self._cond:
+            self.in_flight -= 1
+            if w.session_id is not None:
+                n = self._session_in_flight.get(w.session_id, 0) - 1
+                if n > 0:
+                    self._session_in_flight[w.session_id] = n
+                else:
+                    self._session_in_flight.pop(w.session_id, None)
+            self._cond.notify_all()
+
+    def _rate_limited(self, kind: str, e: Exception, delay: float):
+        """Empty the kind's buckets until the server's reset time (or the backoff delay)."""
+        budget = self.budgets.get(kind)
+        if not budget:
+            return
+        headers = e.response.headers if getattr(e, "response", None) is not None else {}
+        now = time.monotonic()
+        with self._cond:
+            for name in ("requests", "tokens"):
+                reset = parse_reset(headers.get(f"x-ratelimit-reset-{name}"))
+                budget[name].block(reset if reset is not None else delay, now)
+
+    # --- execution -------------------------------------------------------
+
+    def _attempt(self, kind, fn, w):
+        start = time.perf_counter()
+        try:
+            result = fn()
+        finally:
+            self.release(w)
+        with self._cond:
+            self._kind(kind).latencies.append(time.perf_counter() - start)
+        return result
+
+    def _hedge_delay(self, kind):
+        with self._cond:
+            q = self._kind(kind).quantile(self.hedge_quantile)
+        return None if q is None else max(self.hedge_min, q)
+
+    def _run_hedged(self, kind, fn, w, session_id, tokens, discard, delay):
+        primary = self._hedge_pool.submit(self._attempt, kind, fn, w)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        slot = self.try_acquire(kind, session_id, tokens)
+        if slot is None:
+            return primary.result()
+        with self._cond:
+            stats = self._kind(kind)
+            stats.hedges += 1
+            stats.attempts += 1
+        backup = self._hedge_pool.submit(self._attempt, kind, fn, slot)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is not None:
+                    error = f.exception()
+                    continue
+                if f is backup:
+                    with self._cond:
+                        self._kind(kind).hedge_wins += 1
+                for loser in pending:
+                    # The slower copy is not needed any more; close it when it finishes
+                    if discard is not None:
+                        loser.add_done_callback(lambda lf: lf.exception() is None and discard(lf.result()))
+                return f.result()
+        raise error
+
+    def call(self, kind: str, fn, *, session_id=None, priority: int = PRIORITY_INTERACTIVE,
+             tokens: int = 0, hedge: bool = None, discard=None):
+        """
+        Run fn() (one API request) under the scheduler and return its result.
+        discard(result) releases the result of a hedged copy that lost.
+        """
+        hedge = self.hedge if hedge is None else hedge
+        with self._cond:
+            self._kind(kind).requests += 1
+        attempt = 0
+        while True:
+            w = self.acquire(kind, session_id, priority, tokens)
+            with self._cond:
+                self._kind(kind).attempts += 1
+            try:
+                delay = self._hedge_delay(kind) if hedge else None
+                if delay is None:
+                    return self._attempt(kind, fn, w)
+                return self._run_hedged(kind, fn, w, session_id, tokens, discard, delay)
+            except Exception as e:
+                if not _retryable(e) or attempt >= self.max_retries:
+                    with self._cond:
+                        self._kind(kind).errors += 1
+                    raise
+                backoff = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+                wait_s = max(backoff, _retry_after(e) or 0.0)
+                with self._cond:
+                    stats = self._kind(kind)
+                    stats.retries += 1
+                    if isinstance(e, openai.RateLimitError):
+                        stats.rate_limited += 1
+                if isinstance(e, openai.RateLimitError):
+                    self._rate_limited(kind, e, wait_s)
+                attempt += 1
+                time.sleep(wait_s)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "queued": len(self._waiters),
+                "hedging": self.hedge,
+                "kinds": {kind: s.as_dict() for kind, s in self._stats.items()},
+            }
+
+
+def _budget(rpm_var, tpm_var=None):
+    rpm = float(os.getenv(rpm_var, "0"))
+    tpm = float(os.getenv(tpm_var, "0")) if tpm_var else 0.0
+    return {"requests": TokenBucket(rpm), "tokens": TokenBucket(tpm)}
+
+
+def build_scheduler() -> OpenAIScheduler:
+    """Scheduler configured from the environment (see the module docstring)."""
+    return OpenAIScheduler(
+        max_concurrency=int(os.getenv("AGENT_BOB_OPENAI_CONCURRENCY", str(default_config()["pool_size"]))),
+        budgets={"llm": _budget("AGENT_BOB_LLM_RPM", "AGENT_BOB_LLM_TPM"), "asr": _budget("AGENT_BOB_ASR_RPM")},
+        max_retries=int(os.getenv("AGENT_BOB_OPENAI_RETRIES", "3")),
+        hedge=os.getenv("AGENT_BOB_HEDGE", "0") == "1",
+        hedge_quantile=float(os.getenv("AGENT_BOB_HEDGE_QUANTILE", "0.95")),
+        hedge_min=float(os.getenv("AGENT_BOB_HEDGE_MIN_MS", "250")) / 1000.0,
+    )
+
+
+SCHEDULER = build_scheduler()
@@ -0,0 +1,517 @@
+"""
+Append-only per-session segment archive.
+
+With AGENT_BOB_ARTIFACT_LAYOUT=archive a turn is no longer four small
+files (recording WAV, transcript, prompt JSON, response) but one record
+appended to data/archive/<session_id>.seg, plus a 64-byte entry appended
+to <session_id>.idx that says where it starts:
+
+  record  magic "BOBS" | u8 version | u8 codec | u16 reserved |
+          u32 meta length | u64 audio length | u32 crc32(meta + audio) |
+          meta (UTF-8 JSON: uid, timestamp, transcript, response, prompt,
+          sample_rate, ...) | audio
+  index   uid (48 bytes, NUL padded) | u64 offset | u64 record length
+
+Audio is 16-bit mono PCM, FLAC-compressed PCM (lossless, about half the
+size of speech; needs PyAV) or, for /process uploads that are not PCM WAV,
+the uploaded bytes as they came. The index is derived data: a record
+whose index entry was lost in a crash is re-indexed from the .seg file on
+the next open, and a torn record at the end is cut off.
+
+ArchiveReader memory-maps the .seg file, so any turn is one dict lookup
+and a slice, without reading the rest of the session.
+
+Tooling, to and from the file-per-artifact layout:
+
+    python src/segment_archive.py import --data data [--flac] [--delete]
+    python src/segment_archive.py export --data exported/ [--session ID]
+    python src/segment_archive.py info [--session ID]
+"""
+import argparse
+import glob
+import io
+import json
+import mmap
+import os
+import struct
+import threading
+import wave
+import zlib
+from collections import OrderedDict
+
+try:
+    import av
+    import numpy as np
+except ImportError:
+    av = None
+
+MAGIC = b"BOBS"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHIQI")      # 24 bytes
+INDEX_ENTRY = struct.Struct("<48sQQ")    # 64 bytes
+UID_BYTES = 48
+
+CODEC_NONE = 0    # no audio
+CODEC_PCM = 1     # 16-bit mono little-endian PCM at meta["sample_rate"]
+CODEC_FLAC = 2    # the same PCM, FLAC-compressed
+CODEC_RAW = 3     # an upload kept as-is (meta["filename"])
+CODEC_NAMES = {CODEC_NONE: "none", CODEC_PCM: "pcm", CODEC_FLAC: "flac", CODEC_RAW: "raw"}
+
+
+class ArchiveError(Exception):
+    pass
+
+
+# ---------------------------
+# Audio codecs
+# ---------------------------
+
+def flac_encode(pcm: bytes, sample_rate: int) -> bytes:
+    if av is None:
+        raise RuntimeError("FLAC in the segment archive needs PyAV (pip install av)")
+    buf = io.BytesIO()
+    with av.open(buf, 'w', format='flac') as out:
+        stream = out.add_stream('flac', rate=sample_rate, layout='mono')
+        stream.format = 's16'
+        frame = av.AudioFrame.from_ndarray(np.frombuffer(pcm, dtype='<i2').reshape(1, -1),
+                                           format='s16', layout='mono')
+        frame.sample_rate = sample_rate
+        for packet in stream.encode(frame):
+            out.mux(packet)
+        for packet in stream.encode(None):
+            out.mux(packet)
+    return buf.getvalue()
+
+
+def flac_decode(data) -> bytes:
+    if av is None:
+        raise RuntimeError("FLAC in the segment archive needs PyAV (pip install av)")
+    chunks = []
+    with av.open(io.BytesIO(data), 'r', format='flac') as inp:
+        for frame in inp.decode(audio=0):
+            chunks.append(frame.to_ndarray().reshape(-1).astype('<i2').tobytes())
+    return b"".join(chunks)
+
+
+def pcm_from_wav(data: bytes):
+    """(pcm, sample_rate) for 16-bit mono WAV bytes, else None."""
+    try:
+        with wave.open(io.BytesIO(data), 'rb') as wf:
+            if wf.getsampwidth() != 2 or wf.getnchannels() != 1:
+                return None
+            return wf.readframes(wf.getnframes()), wf.getframerate()
+    except (wave.Error, EOFError):
+        return None
+
+
+def wav_from_pcm(pcm: bytes, sample_rate: int) -> bytes:
+    # Same container artifact_writer writes, so an export matches the file layout byte for byte
+    from artifact_writer import wav_bytes
+    return wav_bytes(pcm, sample_rate)
+
+
+# ---------------------------
+# Records
+# ---------------------------
+
+def encode_record(turn: dict, flac: bool = False) -> bytes:
+    """
+    turn: uid, plus any of timestamp, transcript, response, prompt, flags,
+    and audio as either pcm + sample_rate or upload (bytes) + filename.
+    """
+    meta = {k: v for k, v in turn.items() if k not in ("pcm", "upload")}
+    if len(turn["uid"].encode()) > UID_BYTES:
+        raise ArchiveError(f"uid longer than {UID_BYTES} bytes: {turn['uid']}")
+    if turn.get("pcm") is not None:
+        audio = turn["pcm"][:]   # a spilled PCMSpool is read back here
+        codec = CODEC_PCM
+        if flac and audio:
+            audio, codec = flac_encode(audio, turn["sample_rate"]), CODEC_FLAC
+        meta["samples"] = len(turn["pcm"]) // 2
+    elif turn.get("upload") is not None:
+        audio, codec = turn["upload"], CODEC_RAW
+    else:
+        audio, codec = b"", CODEC_NONE
+    meta = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+    crc = zlib.crc32(audio, zlib.crc32(meta))
+    return HEADER.pack(MAGIC, VERSION, codec, 0, len(meta), len(audio), crc) + meta + audio
+
+
+def decode_header(buf, offset: int):
+    """(codec, meta_len, audio_len, crc) of the record at offset; raises ArchiveError."""
+    if offset + HEADER.size > len(buf):
+        raise ArchiveError("truncated header")
+    magic, version, codec, _, meta_len, audio_len, crc = HEADER.unpack_from(buf, offset)
+    if magic != MAGIC or version != VERSION:
+        raise ArchiveError(f"no record at offset {offset}")
+    if offset + HEADER.size + meta_len + audio_len > len(buf):
+        raise ArchiveError("truncated record")
+    return codec, meta_len, audio_len, crc
+
+
+class Turn:
+    """One archived turn; `audio` is a zero-copy view into the mapped file."""
+
+    def __init__(self, meta: dict, codec: int, audio):
+        self.meta = meta
+        self.codec = codec
+        self.audio = audio
+
+    @property
+    def uid(self) -> str:
+        return self.meta["uid"]
+
+    def pcm(self) -> bytes:
+        """16-bit mono PCM (decoding FLAC); None for raw uploads and turns without audio."""
+        if self.codec == CODEC_PCM:
+            return bytes(self.audio)
+        if self.codec == CODEC_FLAC:
+            return flac_decode(self.audio)
+        return None
+
+    def recording(self) -> bytes:
+        """The recording as it would be stored on its own: WAV, or the upload as it came."""
+        if self.codec == CODEC_RAW:
+            return bytes(self.audio)
+        pcm = self.pcm()
+        return wav_from_pcm(pcm, self.meta["sample_rate"]) if pcm is not None else None
+
+
+def read_record(buf, offset: int, verify: bool = False) -> Turn:
+    codec, meta_len, audio_len, crc = decode_header(buf, offset)
+    start = offset + HEADER.size
+    meta = bytes(buf[start:start + meta_len])
+    audio = memoryview(buf)[start + meta_len:start + meta_len + audio_len]
+    if verify and zlib.crc32(audio, zlib.crc32(meta)) != crc:
+        raise ArchiveError(f"checksum mismatch at offset {offset}")
+    return Turn(json.loads(meta), codec, audio)
+
+
+def scan(buf, offset: int = 0):
+    """Yield (offset, length, uid) of the intact records from offset on; stops at the first bad one."""
+    while offset < len(buf):
+        try:
+            _, meta_len, audio_len, _ = decode_header(buf, offset)
+            turn = read_record(buf, offset, verify=True)
+        except (ArchiveError, ValueError):
+            return
+        turn.audio.release()
+        length = HEADER.size + meta_len + audio_len
+        yield offset, length, turn.uid
+        offset += length
+
+
+# ---------------------------
+# Archive
+# ---------------------------
+
+class SegmentArchive:
+    def __init__(self, root: str = "data/archive", flac: bool = False, max_open: int = 64):
+        self.root = root
+        self.flac = flac
+        self.max_open = max_open
+        self._open = OrderedDict()     # session_id -> (seg file, idx file), LRU
+        self._lock = threading.Lock()
+        self.records = 0
+        self.bytes_written = 0
+
+    def seg_path(self, session_id: str) -> str:
+        return os.path.join(self.root, f"{session_id}.seg")
+
+    def idx_path(self, session_id: str) -> str:
+        return os.path.join(self.root, f"{session_id}.idx")
+
+    def sessions(self) -> list:
+        return sorted(os.path.basename(p)[:-4] for p in glob.glob(os.path.join(self.root, "*.seg")))
+
+    def _recover(self, session_id: str):
+        """Make the index cover every intact record and cut a torn record off the end."""
+        seg, idx = self.seg_path(session_id), self.idx_path(session_id)
+        size = os.path.getsize(seg)
+        idx_size = os.path.getsize(idx) if os.path.exists(idx) else 0
+        # A torn index entry is rewritten from the records
+        entries = idx_size // INDEX_ENTRY.size
+        end = 0
+        if entries:
+            with open(idx, 'rb') as f:
+                f.seek((entries - 1) * INDEX_ENTRY.size)
+                _, offset, length = INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))
+            end = offset + length
+        if end == size and idx_size == entries * INDEX_ENTRY.size:
+            return
+        missing = []
+        if size > end:
+            with open(seg, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    for offset, length, uid in scan(buf, end):
+                        missing.append(INDEX_ENTRY.pack(uid.encode(), offset, length))
+                        end = offset + length
+        with open(idx, 'r+b' if os.path.exists(idx) else 'wb') as f:
+            f.truncate(entries * INDEX_ENTRY.size)
+            f.seek(0, os.SEEK_END)
+            f.write(b"".join(missing))
+        if end < size:
+            print(f"[warn] segment archive {seg}: dropping {size - end} bytes of torn record")
+            with open(seg, 'r+b') as f:
+                f.truncate(end)
+
+    def _files(self, session_id: str):
+        """Open append handles for a session. Caller holds the lock."""
+        files = self._open.get(session_id)
+        if files is not None:
+            self._open.move_to_end(session_id)
+            return files
+        os.makedirs(self.root, exist_ok=True)
+        if os.path.exists(self.seg_path(session_id)):
+            self._recover(session_id)
+        files = (open(self.seg_path(session_id), 'ab'), open(self.idx_path(session_id), 'ab'))
+        self._open[session_id] = files
+        while len(self._open) > self.max_open:
+            _, old = self._open.popitem(last=False)
+            for f in old:
+                f.close()
+        return files
+
+    def append(self, session_id: str, turn: dict, fsync: bool = False):
+        """Append one turn (see encode_record); returns (offset, length)."""
+        record = encode_record(turn, flac=self.flac)
+        with self._lock:
+            seg, idx = self._files(session_id)
+            offset = seg.tell()
+            seg.write(record)
+            seg.flush()
+            # Index after data: a crash in between leaves a record that _recover re-indexes
+            idx.write(INDEX_ENTRY.pack(turn["uid"].encode(), offset, len(record)))
+            idx.flush()
+            if fsync:
+                os.fsync(seg.fileno())
+                os.fsync(idx.fileno())
+            self.records += 1
+            self.bytes_written += len(record) + INDEX_ENTRY.size
+        return offset, len(record)
+
+    def sync(self, session_id: str):
+        with self._lock:
+            files = self._open.get(session_id)
+            if files is not None:
+                for f in files:
+                    os.fsync(f.fileno())
+
+    def close(self):
+        with self._lock:
+            for files in self._open.values():
+                for f in files:
+                    f.close()
+            self._open.clear()
+
+    def reader(self, session_id: str) -> "ArchiveReader":
+        with self._lock:
+            files = self._open.get(session_id)
+            if files is None and os.path.exists(self.seg_path(session_id)):
+                self._recover(session_id)
+        return ArchiveReader(self.seg_path(session_id), self.idx_path(session_id))
+
+    def stats(self) -> dict:
+        return {"records": self.records, "bytes_written": self.bytes_written, "open_sessions": len(self._open),
+                "flac": self.flac}
+
+
+class ArchiveReader:
+    """Random access to one session's turns through a memory map of its .seg file."""
+
+    def __init__(self, seg_path: str, idx_path: str):
+        self.seg_path = seg_path
+        self.idx_path = idx_path
+        self._file = None
+        self._buf = None
+        self.uids = []
+        self._where = {}
+        self.refresh()
+
+    def refresh(self):
+        """Pick up turns appended since the reader was opened."""
+        with open(self.idx_path, 'rb') as f:
+            data = f.read()
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        self.uids, self._where = [], {}
+        for raw_uid, offset, length in INDEX_ENTRY.iter_unpack(data[:usable]):
+            uid = raw_uid.rstrip(b"\0").decode()
+            self.uids.append(uid)
+            self._where[uid] = offset
+        self._unmap()
+        self._file = open(self.seg_path, 'rb')
+        if os.fstat(self._file.fileno()).st_size:
+            self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.uids)
+
+    def __contains__(self, uid):
+        return uid in self._where
+
+    def get(self, uid: str, verify: bool = False) -> Turn:
+        if uid not in self._where:
+            self.refresh()
+            if uid not in self._where:
+                raise KeyError(uid)
+        if self._buf is None or self._where[uid] >= len(self._buf):
+            self.refresh()
+        return read_record(self._buf, self._where[uid], verify=verify)
+
+    def __iter__(self):
+        for uid in list(self.uids):
+            yield self.get(uid)
+
+    def _unmap(self):
+        # Views handed out by get() keep the map alive until they are released
+        if self._buf is not None:
+            try:
+                self._buf.close()
+            except BufferError:
+                pass
+            self._buf = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        self._unmap()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------------------------
+# Import / export
+# ---------------------------
+
+LAYOUT = (("recording", "recordings", ".wav"), ("transcript", "transcripts", ".txt"),
+          ("response", "responses", ".txt"), ("prompt", "prompts", ".json"))
+
+
+def layout_paths(data_dir: str, uid: str) -> dict:
+    return {kind: os.path.join(data_dir, sub, uid + ext) for kind, sub, ext in LAYOUT}
+
+
+def turn_from_files(data_dir: str, uid: str):
+    """(session_id, turn dict, paths read) from the file-per-artifact layout."""
+    paths = layout_paths(data_dir, uid)
+    turn, read = {"uid": uid}, []
+    prompt = None
+    if os.path.exists(paths["prompt"]):
+        with open(paths["prompt"], 'r', encoding='utf-8') as f:
+            prompt = json.load(f)
+        turn["prompt"] = prompt
+        turn["timestamp"] = prompt.get("timestamp")
+        read.append(paths["prompt"])
+    for kind in ("transcript", "response"):
+        if os.path.exists(paths[kind]):
+            with open(paths[kind], 'r', encoding='utf-8') as f:
+                turn[kind] = f.read()
+            read.append(paths[kind])
+    if os.path.exists(paths["recording"]):
+        with open(paths["recording"], 'rb') as f:
+            data = f.read()
+        decoded = pcm_from_wav(data)
+        if decoded is not None and wav_from_pcm(*decoded) == data:
+            turn["pcm"], turn["sample_rate"] = decoded
+        else:
+            # Keep anything that would not round-trip (uploads, other WAV flavours) byte for byte
+            turn["upload"], turn["filename"] = data, os.path.basename(paths["recording"])
+        read.append(paths["recording"])
+    session_id = (prompt or {}).get("session_id") or "unknown"
+    return session_id, turn, read
+
+
+def import_files(data_dir: str, archive: SegmentArchive, delete: bool = False) -> int:
+    """Move turns from data/<kind>/<uid>.* into the archive; returns how many were added."""
+    uids = set()
+    for _, sub, ext in LAYOUT:
+        for p in glob.glob(os.path.join(data_dir, sub, f"*{ext}")):
+            name = os.path.basename(p)[:-len(ext)]
+            if not name.endswith(".trace"):
+                uids.add(name)
+    readers, added, done = {}, 0, []
+    for uid in sorted(uids):
+        session_id, turn, read = turn_from_files(data_dir, uid)
+        if session_id not in readers:
+            idx = archive.idx_path(session_id)
+            readers[session_id] = ArchiveReader(archive.seg_path(session_id), idx) if os.path.exists(idx) else None
+        reader = readers[session_id]
+        if reader is None or uid not in reader:
+            archive.append(session_id, turn)
+            added += 1
+        done.extend(read)
+    for session_id in readers:
+        archive.sync(session_id)
+        if readers[session_id] is not None:
+            readers[session_id].close()
+    archive.close()
+    if delete:
+        for p in done:
+            os.remove(p)
+    return added
+
+
+def export_files(archive: SegmentArchive, data_dir: str, sessions=None) -> int:
+    """Write archived turns back out as data/<kind>/<uid>.*; returns the number of turns."""
+    for _, sub, _ in LAYOUT:
+        os.makedirs(os.path.join(data_dir, sub), exist_ok=True)
+    n = 0
+    for session_id in sessions or archive.sessions():
+        with archive.reader(session_id) as reader:
+            for turn in reader:
+                paths = layout_paths(data_dir, turn.uid)
+                recording = turn.recording()
+                if recording is not None:
+                    with open(paths["recording"], 'wb') as f:
+                        f.write(recording)
+                for kind in ("transcript", "response"):
+                    if kind in turn.meta:
+                        with open(paths[kind], 'w', encoding='utf-8') as f:
+                            f.write(turn.meta[kind])
+                if "prompt" in turn.meta:
+                    with open(paths["prompt"], 'w', encoding='utf-8') as f:
+                        f.write(json.dumps(turn.meta["prompt"], ensure_ascii=False, indent=2))
+                turn.audio.release()
+                n += 1
+    return n
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Segment archive tooling.")
+    ap.add_argument("--archive", default="data/archive")
+    sub = ap.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="file-per-artifact layout -> archive")
+    imp.add_argument("--data", default="data")
+    imp.add_argument("--flac", action="store_true", help="FLAC-compress PCM recordings")
+    imp.add_argument("--delete", action="store_true", help="remove the imported files afterwards")
+    exp = sub.add_parser("export", help="archive -> file-per-artifact layout")
+    exp.add_argument("--data", required=True)
+    exp.add_argument("--session", action="append", default=None)
+    info = sub.add_parser("info", help="turns and size per session")
+    info.add_argument("--session", action="append", default=None)
+    args = ap.parse_args()
+
+    if args.command == "import":
+        archive = SegmentArchive(args.archive, flac=args.flac)
+        print(f"Imported {import_files(args.data, archive, delete=args.delete)} turn(s) into {args.archive}")
+    elif args.command == "export":
+        print(f"Exported {export_files(SegmentArchive(args.archive), args.data, args.session)} turn(s) to {args.data}")
+    else:
+        archive = SegmentArchive(args.archive)
+        for session_id in args.session or archive.sessions():
+            with archive.reader(session_id) as reader:
+                codecs = {}
+                for turn in reader:
+                    codecs[CODEC_NAMES[turn.codec]] = codecs.get(CODEC_NAMES[turn.codec], 0) + 1
+                    turn.audio.release()
+                size = os.path.getsize(archive.seg_path(session_id))
+                print(f"{session_id}  {len(reader)} turns  {size / 1e6:.1f} MB  {codecs}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Post-processing of finished segments, between segmentation and ASR.
+
+  trim     leading/trailing silence beyond pad_ms is cut (frame RMS with
+           NumPy; the endpointer's 1-2 s of trailing silence no longer
+           goes to Whisper)
+  drop     segments with less than min_speech_ms of energetic audio, or
+           an RMS below min_rms, are noise blips: no ASR call, no answer
+  merge    a short segment (under merge_below_ms of speech) is held for
+           merge_gap_ms; if speech starts again in that time it is
+           prepended to the next segment, so "So..." + pause + "tell me
+           about X" is one question
+
+Both capture paths use it: /ws-audio per connection and
+src/audio_capture.py before upload (/process trims and drops only, it
+sees one upload at a time). Counters for /stats and /metrics are kept in
+POSTPROC_STATS.
+
+Segments longer than max_analyse_ms, or already spilled to disk
+(utterance_buffer.PCMSpool), are passed through as they are: they are not
+blips, and reading one back just to trim a second off would cost more
+than it saves.
+"""
+import threading
+
+import numpy as np
+
+# Frames are "energetic" above max(silence_rms, this fraction of the segment's loud frames)
+RELATIVE_THRESHOLD = 0.1
+
+
+class PostProcStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.segments = 0
+        self.submitted = 0
+        self.dropped_short = 0
+        self.dropped_quiet = 0
+        self.merged = 0
+        self.audio_s_in = 0.0
+        self.audio_s_trimmed = 0.0
+        self.audio_s_dropped = 0.0
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "segments": self.segments,
+                "submitted": self.submitted,
+                "dropped_short": self.dropped_short,
+                "dropped_quiet": self.dropped_quiet,
+                "merged": self.merged,
+                # Every dropped or merged segment is a Whisper request (and an answer) not made
+                "asr_calls_avoided": self.dropped_short + self.dropped_quiet + self.merged,
+                "audio_s_in": round(self.audio_s_in, 1),
+                "audio_s_saved": round(self.audio_s_trimmed + self.audio_s_dropped, 1),
+                "audio_s_trimmed": round(self.audio_s_trimmed, 1),
+                "audio_s_dropped": round(self.audio_s_dropped, 1),
+            }
+
+
+POSTPROC_STATS = PostProcStats()
+
+
+class Trimmed:
+    """A segment after trimming: the kept audio and its byte range in the original."""
+
+    def __init__(self, pcm, start: int, end: int, speech_ms: int, rms: float):
+        self.pcm = pcm
+        self.start = start
+        self.end = end
+        self.speech_ms = speech_ms
+        self.rms = rms
+
+
+class SegmentPostProcessor:
+    """
+    One per audio stream. Call end() when the segmenter finishes a segment,
+    start() at the next speech onset, poll() once per frame (releases a
+    held segment once merge_gap_ms has passed) and flush() at the end of
+    the stream. Times are frame counts of the caller's VAD stream.
+    """
+
+    def __init__(self, sample_rate: int, frame_ms: int = 30, pad_ms: int = 150, silence_rms: float = 150.0,
+                 min_speech_ms: int = 250, min_rms: float = 200.0, merge_gap_ms: int = 0,
+                 merge_below_ms: int = 1500, max_analyse_ms: int = 30000, stats: PostProcStats = POSTPROC_STATS):
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_bytes = int(sample_rate * frame_ms / 1000) * 2
+        self.pad_bytes = int(pad_ms / frame_ms) * self.frame_bytes
+        self.silence_rms = silence_rms
+        self.min_speech_ms = min_speech_ms
+        self.min_rms = min_rms
+        self.merge_gap_frames = int(merge_gap_ms / frame_ms)
+        self.merge_below_ms = merge_below_ms
+        self.max_analyse_bytes = int(sample_rate * max_analyse_ms / 1000) * 2
+        self.stats = stats
+        self._held = None       # (Trimmed, frame the segment ended at)
+
+    @property
+    def holding(self) -> bool:
+        """True while a short segment waits to be merged (end() returned None without dropping it)."""
+        return self._held is not None
+
+    def _seconds(self, nbytes: int) -> float:
+        return nbytes / 2 / self.sample_rate
+
+    def trim(self, pcm) -> Trimmed:
+        """Cut silence off both ends, keeping pad_ms next to the speech."""
+        if len(pcm) > self.max_analyse_bytes or not isinstance(pcm, (bytes, bytearray)):
+            return Trimmed(pcm, 0, len(pcm), len(pcm) // 2 * 1000 // self.sample_rate, float("inf"))
+        n = len(pcm) // self.frame_bytes
+        if n == 0:
+            return Trimmed(b"", 0, 0, 0, 0.0)
+        x = np.frombuffer(pcm, dtype='<i2', count=n * self.frame_bytes // 2).astype(np.float32)
+        rms = np.sqrt(np.mean(x.reshape(n, -1) ** 2, axis=1))
+        threshold = max(self.silence_rms, RELATIVE_THRESHOLD * float(np.percentile(rms, 95)))
+        loud = np.flatnonzero(rms >= threshold)
+        if not len(loud):
+            return Trimmed(b"", 0, 0, 0, float(np.sqrt(np.mean(x ** 2))))
+        start = max(0, int(loud[0]) * self.frame_bytes - self.pad_bytes)
+        end = min(len(pcm), (int(loud[-1]) + 1) * self.frame_bytes + self.pad_bytes)
+        level = float(np.sqrt(np.mean(rms[loud[0]:loud[-1] + 1] ** 2)))
+        return Trimmed(bytes(pcm[start:end]), start, end, len(loud) * self.frame_ms, level)
+
+    def end(self, pcm, frame: int):
+        """
+        A segment finished at `frame`. Returns the Trimmed segment to send
+        to ASR now, or None when it was dropped or is held for merging.
+        """
+        t = self.trim(pcm)
+        self.stats.add(segments=1, audio_s_in=self._seconds(len(pcm)),
+                       audio_s_trimmed=self._seconds(len(pcm) - len(t.pcm)))
+        if t.speech_ms < self.min_speech_ms or t.rms < self.min_rms:
+            self.stats.add(audio_s_dropped=self._seconds(len(t.pcm)),
+                           **{"dropped_short" if t.speech_ms < self.min_speech_ms else "dropped_quiet": 1})
+            return None
+        if self.merge_gap_frames and t.speech_ms < self.merge_below_ms:
+            self._held = (t, frame)
+            return None
+        return self._release(t)
+
+    def start(self, frame: int):
+        """
+        Speech started at `frame`. Returns the held segment's audio if it
+        ended within merge_gap_ms, to be prepended to the new segment, else
+        None. Call poll() for the frame first.
+        """
+        if self._held is None or frame - self._held[1] > self.merge_gap_frames:
+            return None
+        held, self._held = self._held[0], None
+        # Its audio is counted again as part of the segment it joins
+        self.stats.add(merged=1, audio_s_in=-self._seconds(len(held.pcm)))
+        return held.pcm
+
+    def poll(self, frame: int):
+        """Returns the held segment once its merge window has passed with no new speech."""
+        if self._held is not None and frame - self._held[1] > self.merge_gap_frames:
+            held, self._held = self._held[0], None
+            return self._release(held)
+        return None
+
+    def flush(self):
+        """End of the stream: returns the held segment, if any."""
+        held, self._held = self._held, None
+        return self._release(held[0]) if held is not None else None
+
+    def _release(self, t: Trimmed) -> Trimmed:
+        self.stats.add(submitted=1)
+        return t
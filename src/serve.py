@@ -0,0 +1,87 @@
+"""
+Production entrypoint: gevent WSGI server instead of the debug dev server.
+
+The standard library is monkey-patched before the app is imported, so the
+blocking OpenAI/httpx calls, the per-connection pipeline workers, the ASR
+pool and the Socket.IO machinery all run as green threads: an in-flight
+request or an open /ws-audio session costs a greenlet, not an OS thread.
+
+On SIGTERM/SIGINT the server drains: /healthz turns 503, new /ws-audio
+sessions and /process requests are refused, open sessions answer what
+they already heard and close, and the process exits once nothing is in
+flight (or after AGENT_BOB_DRAIN_TIMEOUT seconds). Queued artifact writes
+are flushed at exit.
+
+    python src/serve.py            # or: python run.py --production
+
+AGENT_BOB_HOST / AGENT_BOB_PORT      listen address (127.0.0.1:5000)
+AGENT_BOB_MAX_CONNECTIONS            open HTTP/WebSocket connections (1000)
+AGENT_BOB_MAX_WS_SESSIONS            concurrent /ws-audio sessions (0 = unlimited)
+AGENT_BOB_MAX_PROCESS                concurrent /process requests (0 = unlimited)
+AGENT_BOB_DRAIN_TIMEOUT              seconds to wait for in-flight work (30)
+AGENT_BOB_ASR_WORKERS                concurrent ASR calls (64 here, 4 on the dev server)
+AGENT_BOB_OPENAI_POOL_SIZE           pooled OpenAI connections (128 here, 20 on the dev server)
+"""
+import os
+
+os.environ.setdefault("AGENT_BOB_ASYNC_MODE", "gevent")
+# Pool workers are greenlets here, so ASR concurrency is bounded by the HTTP pool, not by threads
+os.environ.setdefault("AGENT_BOB_ASR_WORKERS", "64")
+os.environ.setdefault("AGENT_BOB_OPENAI_POOL_SIZE", "128")
+
+from gevent import monkey  # noqa: E402
+
+monkey.patch_all()
+
+import signal  # noqa: E402
+import sys  # noqa: E402
+
+# httpcore imports trio when it is installed, and trio's import needs select.epoll,
+# which the patched select module no longer has. Nothing here runs on trio.
+sys.modules.setdefault("trio", None)
+
+import gevent  # noqa: E402
+from gevent.pool import Pool  # noqa: E402
+from gevent.pywsgi import WSGIServer  # noqa: E402
+
+import app as agent_app  # noqa: E402
+
+
+def main():
+    host = os.environ.get("AGENT_BOB_HOST", "127.0.0.1")
+    port = int(os.environ.get("AGENT_BOB_PORT", "5000"))
+    max_connections = int(os.environ.get("AGENT_BOB_MAX_CONNECTIONS", "1000"))
+    drain_timeout = float(os.environ.get("AGENT_BOB_DRAIN_TIMEOUT", "30"))
+
+    # Past max_connections the pool stops accepting until a connection closes
+    server = WSGIServer((host, port), agent_app.app, spawn=Pool(max_connections), log=None)
+
+    def shutdown():
+        if agent_app.drain.draining:
+            return
+        print(f"Draining: {agent_app.drain.in_flight()} request(s) in flight")
+        agent_app.drain.begin()
+        if not agent_app.drain.wait_idle(drain_timeout):
+            print(f"[warn] drain timed out with {agent_app.drain.in_flight()} request(s) still running")
+        # Give the final `complete` events a moment to reach the clients
+        server.stop(timeout=2)
+
+    gevent.signal_handler(signal.SIGTERM, lambda: gevent.spawn(shutdown))
+    gevent.signal_handler(signal.SIGINT, lambda: gevent.spawn(shutdown))
+
+    # Build the client, import the SDK's lazily loaded resource modules and open a
+    # connection before accepting traffic: imports block the whole hub under gevent.
+    agent_app.openai_client.prewarm(connections=1, background=False)
+    client = agent_app.openai_client.get_client()
+    client.audio.transcriptions, client.chat.completions  # noqa: B018
+    # A local ASR model is loaded before the first session, not inside it
+    agent_app.asr_backend.warm(background=False)
+
+    print(f"Serving on http://{host}:{port} (gevent, up to {max_connections} connections)")
+    server.serve_forever()
+    agent_app.openai_client.close_client()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Per-session prompt context cache.
+
+Holds each session's resume, job description and the pre-rendered static
+[CONTEXT] block so per-turn prompt assembly does no file I/O. Entries are
+revalidated against the files' mtimes and evicted with a bounded LRU.
+Each context also carries a BM25 index over chunks of both documents for
+retrieval-based prompts (see context_retrieval).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from context_retrieval import BM25Index, chunk_document, estimate_tokens
+
+
+def render_context_prefix(resume: str, jd: str) -> str:
+    """The static head of every prompt for a session."""
+    return f"""[CONTEXT]
+RESUME:
+{resume}
+
+JOB_DESCRIPTION:
+{jd}
+
+"""
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _read(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+class SessionContext:
+    def __init__(self, session_id: str, resume: str, jd: str, resume_mtime=None, jd_mtime=None):
+        self.session_id = session_id
+        self.resume = resume
+        self.jd = jd
+        self.resume_mtime = resume_mtime
+        self.jd_mtime = jd_mtime
+        self.prefix = render_context_prefix(resume, jd)
+        self.prefix_tokens = estimate_tokens(self.prefix)
+        self.index = BM25Index(chunk_document(resume, "resume") + chunk_document(jd, "jd"))
+        self.checked_at = time.monotonic()
+
+
+class SessionContextCache:
+    """
+    Bounded LRU of SessionContext objects.
+
+    mtimes are re-checked at most every `revalidate_after` seconds, so a hot
+    session costs one dict lookup per turn and an occasional stat().
+    """
+
+    def __init__(self, root="data/sessions", max_entries=64, revalidate_after=5.0):
+        self.root = root
+        self.max_entries = max_entries
+        self.revalidate_after = revalidate_after
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _paths(self, session_id: str):
+        session_dir = os.path.join(self.root, session_id)
+        return (os.path.join(session_dir, "resume.txt"),
+                os.path.join(session_dir, "job_description.txt"))
+
+    def _load(self, session_id: str) -> SessionContext:
+        resume_path, jd_path = self._paths(session_id)
+        resume_mtime, jd_mtime = _mtime(resume_path), _mtime(jd_path)
+        return SessionContext(session_id, _read(resume_path), _read(jd_path), resume_mtime, jd_mtime)
+
+    def _store(self, ctx: SessionContext):
+        """Insert under the lock and evict the least recently used entries."""
+        self._entries[ctx.session_id] = ctx
+        self._entries.move_to_end(ctx.session_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def put(self, session_id: str, resume: str, jd: str) -> SessionContext:
+        """Register a freshly created session (called from /start-session after the files are written)."""
+        resume_path, jd_path = self._paths(session_id)
+        ctx = SessionContext(session_id, resume, jd, _mtime(resume_path), _mtime(jd_path))
+        with self._lock:
+            self._store(ctx)
+        return ctx
+
+    def get(self, session_id: str) -> SessionContext:
+        """Return the cached context, reloading it if missing or if either file changed."""
+        with self._lock:
+            ctx = self._entries.get(session_id)
+            if ctx is not None:
+                self._entries.move_to_end(session_id)
+                if time.monotonic() - ctx.checked_at < self.revalidate_after:
+                    return ctx
+
+        if ctx is not None:
+            resume_path, jd_path = self._paths(session_id)
+            if _mtime(resume_path) == ctx.resume_mtime and _mtime(jd_path) == ctx.jd_mtime:
+                ctx.checked_at = time.monotonic()
+                return ctx
+
+        ctx = self._load(session_id)
+        with self._lock:
+            self._store(ctx)
+        return ctx
+
+    def invalidate(self, session_id: str):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,130 @@
+"""
+Speculative LLM generation on partial transcripts.
+
+Once the incremental transcript of a question has settled (the speaker has
+paused and every window is transcribed), generation starts on it while the
+endpointer is still waiting out the silence timer. Tokens are held
+server-side. If the final transcript matches the speculative one closely
+enough they are released immediately; otherwise the stream is cancelled
+and the caller starts a fresh one.
+"""
+import difflib
+import re
+import threading
+import time
+
+from llm import LLMStream
+
+_WORD_RE = re.compile(r"[\w']+")
+
+
+def similarity(a: str, b: str) -> float:
+    """Word-level similarity in [0, 1], ignoring case and punctuation."""
+    aw = _WORD_RE.findall(a.lower())
+    bw = _WORD_RE.findall(b.lower())
+    if not aw and not bw:
+        return 1.0
+    return difflib.SequenceMatcher(None, aw, bw, autojunk=False).ratio()
+
+
+class SpeculationStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+        self.latency_saved = 0.0   # seconds of head start delivered on hits
+
+    def record(self, field: str, saved: float = 0.0):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+            self.latency_saved += saved
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            resolved = self.hits + self.misses
+            return {
+                "started": self.started,
+                "hits": self.hits,
+                "misses": self.misses,
+                "cancelled": self.cancelled,
+                "hit_rate": (self.hits / resolved) if resolved else 0.0,
+                "latency_saved_s": round(self.latency_saved, 3),
+                "avg_latency_saved_s": round(self.latency_saved / self.hits, 3) if self.hits else 0.0,
+            }
+
+
+SPECULATION_STATS = SpeculationStats()
+
+
+class SpeculativeAnswer:
+    """Runs one LLM stream in the background and buffers its tokens."""
+
+    def __init__(self, transcript: str, prompt: str, stream_factory=LLMStream, stats=SPECULATION_STATS):
+        self.transcript = transcript
+        self.prompt = prompt
+        self.stats = stats
+        self.started_at = time.monotonic()
+        self.first_token_at = None
+        self.tokens = []
+        self.finished = False
+        self.error = None
+        self._cond = threading.Condition()
+        self._stream = stream_factory(prompt)
+        stats.record("started")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            for token in self._stream:
+                with self._cond:
+                    if self.first_token_at is None:
+                        self.first_token_at = time.monotonic()
+                    self.tokens.append(token)
+                    self._cond.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self._cond:
+                self.finished = True
+                self._cond.notify_all()
+
+    def matches(self, final_transcript: str, threshold: float) -> bool:
+        return similarity(self.transcript, final_transcript) >= threshold
+
+    def cancel(self, record_as="cancelled"):
+        """
+        Abort the stream; record_as is 'cancelled' (speech resumed), 'misses'
+        (final text differed) or None (a released hit cut short by barge-in).
+        """
+        self._stream.cancel()
+        if record_as:
+            self.stats.record(record_as)
+
+    def release(self):
+        """
+        Record a hit and yield the held tokens, then the rest as they arrive.
+        Raises the stream's error if it failed, also after some tokens: a
+        truncated answer must not be cached or recorded as complete.
+        """
+        # The first token reaches the user earlier by however long the
+        # speculative stream had been running before it produced one (or until now).
+        now = time.monotonic()
+        ready = min(now, self.first_token_at) if self.first_token_at is not None else now
+        self.stats.record("hits", saved=ready - self.started_at)
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self.tokens) and not self.finished:
+                    self._cond.wait()
+                pending = self.tokens[i:]
+                finished = self.finished
+            for token in pending:
+                yield token
+            i += len(pending)
+            if finished and i >= len(self.tokens):
+                break
+        if self.error is not None:
+            raise self.error
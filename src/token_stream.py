@@ -0,0 +1,136 @@
+"""
+Coalesced token frames for streamed answers.
+
+Instead of one Socket.IO message per LLM delta, tokens are batched into
+frames that are flushed when they reach `max_chars` or have waited
+`max_delay` seconds. Each frame of an answer carries a sequence number
+starting at 0 so the UI can spot gaps.
+
+Time budgets of every coalescer are kept by one shared flusher thread, so
+a streamed answer costs no thread of its own.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+
+class CoalesceStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tokens = 0
+        self.frames = 0
+
+    def add(self, tokens: int, frames: int):
+        with self._lock:
+            self.tokens += tokens
+            self.frames += frames
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "tokens": self.tokens,
+                "frames": self.frames,
+                "tokens_per_frame": round(self.tokens / self.frames, 2) if self.frames else 0.0,
+            }
+
+
+COALESCE_STATS = CoalesceStats()
+
+
+class _Flusher:
+    """Flushes coalescers whose oldest pending token has waited max_delay. Started on first use."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._due = []                  # heap of (deadline, n, coalescer)
+        self._n = itertools.count()
+        self._thread = None
+
+    def schedule(self, coalescer, deadline: float):
+        with self._cond:
+            heapq.heappush(self._due, (deadline, next(self._n), coalescer))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="token-flusher", daemon=True)
+                self._thread.start()
+            if self._due[0][2] is coalescer:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._due or self._due[0][0] > time.monotonic():
+                    self._cond.wait(self._due[0][0] - time.monotonic() if self._due else None)
+                deadline, _, coalescer = heapq.heappop(self._due)
+            coalescer._flush_due(deadline)
+
+
+_FLUSHER = _Flusher()
+
+
+class TokenCoalescer:
+    """
+    emit_frame(payload) is called with {'token': <text>, 'seq': <n>}.
+    Use as a context manager or call close() to flush the final frame.
+    """
+
+    def __init__(self, emit_frame, max_delay: float = 0.03, max_chars: int = 64, stats=COALESCE_STATS):
+        self.emit_frame = emit_frame
+        self.max_delay = max_delay
+        self.max_chars = max_chars
+        self.stats = stats
+        self.seq = 0
+        self._pending = []
+        self._pending_chars = 0
+        self._pending_tokens = 0
+        self._deadline = None     # when the pending frame's time budget runs out
+        self._lock = threading.Lock()
+
+    def push(self, token: str):
+        with self._lock:
+            now = time.monotonic()
+            if self._deadline is not None and now >= self._deadline:
+                # Overdue and the flusher hasn't got to it yet
+                self._flush_locked()
+            self._pending.append(token)
+            self._pending_chars += len(token)
+            self._pending_tokens += 1
+            if self._pending_chars >= self.max_chars:
+                self._flush_locked()
+            elif self._deadline is None:
+                # Time budget: a stalled stream still delivers what it has
+                self._deadline = now + self.max_delay
+                _FLUSHER.schedule(self, self._deadline)
+
+    def _flush_due(self, deadline: float):
+        """Flusher callback: flush if the frame scheduled for `deadline` is still pending."""
+        with self._lock:
+            if self._deadline == deadline:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        self._deadline = None
+        if not self._pending:
+            return
+        text = ''.join(self._pending)
+        self.emit_frame({'token': text, 'seq': self.seq})
+        self.stats.add(self._pending_tokens, 1)
+        self.seq += 1
+        self._pending.clear()
+        self._pending_chars = 0
+        self._pending_tokens = 0
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> int:
+        """Flush what is left; returns the number of frames sent."""
+        self.flush()
+        return self.seq
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
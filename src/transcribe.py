@@ -1,16 +1,39 @@
-import openai
+from asr_backends import get_backend
+from artifact_writer import wav_bytes
+from response_cache import TRANSCRIPT_CACHE
 import os
 
-def transcribe_audio(audio_path):
+def transcribe_audio(audio, filename="audio.wav", cache=TRANSCRIPT_CACHE, backend=None, session_id=None):
     """
-    Transcribe audio file to text using OpenAI Whisper
+    Transcribe audio to text with `backend` (default: the configured ASR
+    backend, OpenAI Whisper unless AGENT_BOB_ASR_BACKEND says otherwise).
+    `audio` may be a file path, the bytes of an audio file (e.g. WAV),
+    or a binary file-like object; nothing is written to disk.
+    Identical audio is answered from `cache` (keyed on a content hash).
     Returns transcribed text
     """
-    client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    with open(audio_path, "rb") as f:
-        transcript = client.audio.transcriptions.create(
-            model="whisper-1",
-            file=f,
-            language="en"
-        )
-    return transcript.text
+    if isinstance(audio, (str, os.PathLike)):
+        filename = os.path.basename(audio)
+        with open(audio, "rb") as f:
+            audio = f.read()
+    elif isinstance(audio, (bytes, bytearray, memoryview)):
+        audio = bytes(audio)
+    else:
+        audio = audio.read()
+
+    if cache is not None:
+        text = cache.get(audio)
+        if text is not None:
+            return text
+
+    text = (backend or get_backend()).transcribe(audio, filename, session_id=session_id)
+    if cache is not None:
+        cache.put(audio, text)
+    return text
+
+def transcribe_pcm(pcm: bytes, sample_rate: int, session_id=None) -> str:
+    """
+    Transcribe raw 16-bit mono PCM (wrapped in an in-memory WAV).
+    Returns transcribed text
+    """
+    return transcribe_audio(wav_bytes(pcm, sample_rate), session_id=session_id)
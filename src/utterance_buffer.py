@@ -0,0 +1,149 @@
+"""
+Bounded-memory audio buffers for utterances.
+
+  PCMSpool       utterance audio in memory up to max_memory bytes (None:
+                 no limit), the rest in an anonymous temp file. Supports
+                 len() and slicing like bytes, so the ASR, WAV and archive
+                 paths take either.
+  BufferStats    per-connection buffer sizes for /stats and /metrics
+
+A stuck-open mic or a long monologue used to grow the utterance buffer
+(and the incremental transcriber's copy of it) without limit. Now the
+segmenter force-splits at AGENT_BOB_MAX_UTTERANCE_S, only
+AGENT_BOB_UTTERANCE_MEM_KB of each utterance stays in RAM, and audio
+past that is read back from disk a window at a time.
+"""
+import tempfile
+import threading
+
+READ_CHUNK = 1 << 16
+
+
+class PCMSpool:
+    def __init__(self, max_memory=None):
+        self.max_memory = max_memory
+        self._mem = bytearray()
+        self._file = None
+        self._size = 0
+        self._lock = threading.Lock()   # file reads seek; the writer and ASR threads may share one
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._mem)
+
+    @property
+    def spilled_bytes(self) -> int:
+        return self._size if self._file is not None else 0
+
+    def extend(self, data):
+        with self._lock:
+            if (self._file is None and self.max_memory is not None
+                    and len(self._mem) + len(data) > self.max_memory):
+                self._file = tempfile.TemporaryFile(prefix="agent_bob_utt_")
+                self._file.write(self._mem)
+                self._mem = bytearray()
+            if self._file is None:
+                self._mem.extend(data)
+            else:
+                self._file.seek(0, 2)
+                self._file.write(data)
+            self._size += len(data)
+
+    def __getitem__(self, key) -> bytes:
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError("PCMSpool only supports contiguous slices")
+        start, stop, _ = key.indices(self._size)
+        if stop <= start:
+            return b""
+        with self._lock:
+            if self._file is None:
+                return bytes(self._mem[start:stop])
+            self._file.seek(start)
+            return self._file.read(stop - start)
+
+    def chunks(self, size: int = READ_CHUNK):
+        """Yield the audio in order, `size` bytes at a time."""
+        for start in range(0, self._size, size):
+            yield self[start:start + size]
+
+    def truncate(self, size: int):
+        """Keep only the first `size` bytes."""
+        with self._lock:
+            size = max(0, min(size, self._size))
+            if self._file is None:
+                del self._mem[size:]
+            else:
+                self._file.truncate(size)
+            self._size = size
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._mem = bytearray()
+            self._size = 0
+
+
+class BufferStats:
+    """
+    Live audio buffers per connection. Each connection registers a callable
+    returning (bytes in memory, bytes spilled to disk) and the most it may
+    hold in memory; gauges are computed when read, so the audio path only
+    pays for the split/spill counters.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._live = {}
+        self.splits = 0
+        self.spills = 0
+        self.spilled_bytes_total = 0
+
+    def register(self, key, sizes, memory_cap: int):
+        with self._lock:
+            self._live[key] = (sizes, memory_cap)
+
+    def unregister(self, key):
+        with self._lock:
+            self._live.pop(key, None)
+
+    def record_split(self):
+        with self._lock:
+            self.splits += 1
+
+    def record_spill(self, size: int):
+        with self._lock:
+            self.spills += 1
+            self.spilled_bytes_total += size
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            live = list(self._live.values())
+            out = {
+                "connections": len(live),
+                "memory_cap_bytes": max((cap for _, cap in live), default=0),
+                "splits": self.splits,
+                "spills": self.spills,
+                "spilled_bytes_total": self.spilled_bytes_total,
+            }
+        sizes = []
+        for fn, _ in live:
+            try:
+                sizes.append(fn())
+            except Exception:
+                continue
+        out["memory_bytes"] = sum(m for m, _ in sizes)
+        out["memory_bytes_max"] = max((m for m, _ in sizes), default=0)
+        out["spilled_bytes"] = sum(s for _, s in sizes)
+        return out
+
+
+BUFFER_STATS = BufferStats()
@@ -0,0 +1,292 @@
+"""
+VAD front-end for /ws-audio.
+
+  FrameReslicer        re-chunks whatever frame size the client sends into
+                       VAD-legal frames (10/20/30 ms), resampling to 16 kHz
+                       when the client rate is not one webrtcvad accepts
+  EnergyGate           NumPy RMS / zero-crossing check; obvious silence
+                       never reaches webrtcvad
+  VADFrontEnd          reslicer + gate + webrtcvad + hangover smoothing
+  UtteranceSegmenter   pre-roll, pause and end-of-turn detection over the
+                       (frame, is_speech) stream, with a forced split of
+                       over-long utterances at the quietest recent frame
+"""
+from collections import deque
+
+import numpy as np
+import webrtcvad
+
+from utterance_buffer import PCMSpool
+
+VAD_RATES = (8000, 16000, 32000, 48000)
+VAD_FRAME_MS = (10, 20, 30)
+
+
+class FrameReslicer:
+    """Accumulates arbitrary 16-bit mono chunks and emits fixed VAD-legal frames."""
+
+    def __init__(self, in_rate: int, frame_ms: int = 30):
+        if frame_ms not in VAD_FRAME_MS:
+            frame_ms = 30
+        self.in_rate = in_rate
+        self.out_rate = in_rate if in_rate in VAD_RATES else 16000
+        self.frame_ms = frame_ms
+        self.frame_bytes = int(self.out_rate * frame_ms / 1000) * 2
+        self._buf = bytearray()
+        self._odd = b""          # a dangling byte from an odd-length chunk
+        self._step = in_rate / self.out_rate
+        self._t = 0.0            # next output position, in input samples after _prev
+        self._prev = None        # last input sample of the previous chunk
+
+    def _resample(self, data: bytes) -> bytes:
+        x = np.frombuffer(data, dtype='<i2').astype(np.float32)
+        if self._prev is not None:
+            x = np.concatenate(([self._prev], x))
+        last = len(x) - 1
+        if last < self._t:
+            n = 0
+        else:
+            n = int((last - self._t) // self._step) + 1
+        pos = self._t + self._step * np.arange(n)
+        y = np.interp(pos, np.arange(len(x)), x)
+        # Carry the phase over: the current last sample becomes index 0 next time
+        self._t = self._t + self._step * n - last
+        self._prev = x[-1]
+        return np.clip(np.rint(y), -32768, 32767).astype('<i2').tobytes()
+
+    def feed_block(self, chunk: bytes):
+        """Return (block, n): n complete frames as one contiguous bytes object."""
+        if self._odd:
+            chunk = self._odd + chunk
+            self._odd = b""
+        if len(chunk) % 2:
+            self._odd = chunk[-1:]
+            chunk = chunk[:-1]
+        if self.out_rate != self.in_rate:
+            chunk = self._resample(chunk)
+        self._buf.extend(chunk)
+
+        n = len(self._buf) // self.frame_bytes
+        if not n:
+            return b"", 0
+        end = n * self.frame_bytes
+        block = bytes(self._buf[:end])
+        del self._buf[:end]
+        return block, n
+
+    def feed(self, chunk: bytes):
+        """Return the list of complete frames now available."""
+        block, n = self.feed_block(chunk)
+        fb = self.frame_bytes
+        return [block[i * fb:(i + 1) * fb] for i in range(n)]
+
+
+class EnergyGate:
+    """
+    Classifies frames as obvious silence from RMS level and zero-crossing
+    rate, vectorized over a block of frames. Quiet frames, and low-energy
+    hiss with a high crossing rate, are rejected without running webrtcvad;
+    everything else goes to the VAD.
+    """
+
+    def __init__(self, floor_dbfs: float = -55.0, noise_dbfs: float = -45.0, noise_zcr: float = 0.35):
+        self.floor_dbfs = floor_dbfs
+        self.noise_dbfs = noise_dbfs
+        self.noise_zcr = noise_zcr
+        # Compare mean-square power directly; no per-frame log10
+        self._floor_power = (32768.0 * 10 ** (floor_dbfs / 20)) ** 2
+        self._noise_power = (32768.0 * 10 ** (noise_dbfs / 20)) ** 2
+
+    def silent_mask(self, frames: np.ndarray) -> np.ndarray:
+        """frames: (n, samples) array. Returns a bool array, True = skip the VAD."""
+        x = frames.astype(np.float32)
+        if x.shape[0] == 1:
+            # Live streaming mostly yields one frame per chunk; a dot product beats einsum there
+            power = np.array([np.dot(x[0], x[0]) / x.shape[1]])
+        else:
+            power = np.einsum('ij,ij->i', x, x) / x.shape[1]
+        silent = power < self._floor_power
+        marginal = ~silent & (power < self._noise_power)
+        if marginal.any():
+            signs = np.signbit(frames[marginal])
+            zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (x.shape[1] - 1)
+            silent[marginal] = zcr > self.noise_zcr
+        return silent
+
+    def is_silence(self, frame: bytes) -> bool:
+        return bool(self.silent_mask(np.frombuffer(frame, dtype='<i2').reshape(1, -1))[0])
+
+
+class VADFrontEnd:
+    """
+    feed(chunk) -> [(frame, is_speech), ...] at `sample_rate` (the VAD rate).
+
+    hangover_ms keeps is_speech true for a little while after the VAD drops,
+    bridging the short gaps between words.
+    """
+
+    def __init__(self, in_rate: int, frame_ms: int = 30, aggressiveness: int = 2,
+                 gate: EnergyGate = None, hangover_ms: int = 150, use_gate: bool = True):
+        self.reslicer = FrameReslicer(in_rate, frame_ms)
+        self.sample_rate = self.reslicer.out_rate
+        self.frame_ms = self.reslicer.frame_ms
+        self.frame_bytes = self.reslicer.frame_bytes
+        self.vad = webrtcvad.Vad(aggressiveness)
+        self.gate = gate or EnergyGate()
+        self.use_gate = use_gate
+        self.hangover_frames = int(hangover_ms / self.frame_ms)
+        self._hang = 0
+        self.frames = 0
+        self.vad_calls = 0
+        self.gated = 0
+
+    def _smooth(self, raw: bool) -> bool:
+        if raw:
+            self._hang = self.hangover_frames
+            return True
+        if self._hang > 0:
+            self._hang -= 1
+            return True
+        return False
+
+    def classify(self, frame: bytes) -> bool:
+        self.frames += 1
+        if self.use_gate and self.gate.is_silence(frame):
+            self.gated += 1
+            return self._smooth(False)
+        self.vad_calls += 1
+        return self._smooth(self.vad.is_speech(frame, self.sample_rate))
+
+    def feed(self, chunk: bytes):
+        block, n = self.reslicer.feed_block(chunk)
+        if not n:
+            return []
+        fb = self.frame_bytes
+        if self.use_gate:
+            silent = self.gate.silent_mask(np.frombuffer(block, dtype='<i2').reshape(n, -1))
+        else:
+            silent = np.zeros(n, dtype=bool)
+
+        out = []
+        for i in range(n):
+            frame = block[i * fb:(i + 1) * fb]
+            if silent[i]:
+                self.gated += 1
+                raw = False
+            else:
+                self.vad_calls += 1
+                raw = self.vad.is_speech(frame, self.sample_rate)
+            out.append((frame, self._smooth(raw)))
+        self.frames += n
+        return out
+
+    def stats(self) -> dict:
+        return {"frames": self.frames, "vad_calls": self.vad_calls, "gated": self.gated}
+
+
+# Segmenter events
+SEG_IDLE = 0      # outside an utterance, frame kept only as pre-roll
+SEG_START = 1     # speech onset; audio holds pre-roll + this frame
+SEG_FRAME = 2     # frame appended to the current utterance
+SEG_PAUSE = 3     # silence inside the utterance just reached pause_ms
+SEG_END = 4       # silence reached end_silence_ms; take() the utterance
+SEG_SPLIT = 5     # utterance reached max_utterance_ms; take() returns the part up to the split
+
+
+def frame_rms(frame) -> float:
+    x = np.frombuffer(frame, dtype='<i2').astype(np.float32)
+    return float(np.sqrt(np.mean(x * x))) if len(x) else 0.0
+
+
+class UtteranceSegmenter:
+    """
+    max_utterance_ms: force a split once an utterance is this long (0: never).
+                      The cut goes after the quietest frame of the last
+                      split_search_ms, preferring frames VAD called silence.
+    max_memory:       bytes of utterance audio held in RAM; the rest spills
+                      to a temp file (None: no limit)
+    """
+
+    def __init__(self, frame_ms: int, preroll_ms: int = 300, pause_ms: int = 300, end_silence_ms: int = 1000,
+                 max_utterance_ms: int = 0, split_search_ms: int = 2000, max_memory=None):
+        self.frame_ms = frame_ms
+        self.pause_frames = max(1, int(pause_ms / frame_ms))
+        self.end_frames = max(1, int(end_silence_ms / frame_ms))
+        self.max_frames = int(max_utterance_ms / frame_ms) if max_utterance_ms else 0
+        self.max_memory = max_memory
+        self._preroll = deque(maxlen=max(0, int(preroll_ms / frame_ms)))
+        # (frame index, end offset in audio, is_speech, rms) of the frames a split may cut after
+        self._recent = deque(maxlen=max(1, int(split_search_ms / frame_ms)))
+        self._split = None     # (byte offset, first frame index) of the pending split
+        self.audio = PCMSpool(max_memory)
+        self.in_utterance = False
+        self.silence_frames = 0
+        self.resumed_after = 0  # silent frames before this one, when speech resumed inside the utterance
+        self.frames_seen = 0
+        self.start_frame = 0   # index of the utterance's first frame (incl. pre-roll)
+
+    @property
+    def split_offset(self):
+        """Byte offset in audio of the split announced by SEG_SPLIT, until take()."""
+        return self._split[0] if self._split is not None else None
+
+    def push(self, frame: bytes, is_speech: bool) -> int:
+        self.frames_seen += 1
+        self.resumed_after = 0
+        if not self.in_utterance:
+            if not is_speech:
+                self._preroll.append(frame)
+                return SEG_IDLE
+            self.in_utterance = True
+            self.start_frame = self.frames_seen - 1 - len(self._preroll)
+            for f in self._preroll:
+                self.audio.extend(f)
+            self._preroll.clear()
+            self.audio.extend(frame)
+            self.silence_frames = 0
+            return SEG_START
+
+        self.audio.extend(frame)
+        if self.max_frames:
+            self._recent.append((self.frames_seen - 1, len(self.audio), is_speech, frame_rms(frame)))
+        if is_speech:
+            self.resumed_after, self.silence_frames = self.silence_frames, 0
+        else:
+            self.silence_frames += 1
+            if self.silence_frames >= self.end_frames:
+                return SEG_END
+        if self.max_frames and self.frames_seen - self.start_frame >= self.max_frames:
+            index, offset, _, _ = min(self._recent, key=lambda r: (r[2], r[3]))
+            self._split = (offset, index + 1)
+            return SEG_SPLIT
+        if not is_speech and self.silence_frames == self.pause_frames:
+            return SEG_PAUSE
+        return SEG_FRAME
+
+    def prepend(self, pcm):
+        """Put audio (e.g. a held fragment of the same question) in front of the current utterance."""
+        audio, self.audio = self.audio, PCMSpool(self.max_memory)
+        self.audio.extend(pcm[:])
+        self.audio.extend(audio[:])
+
+    def take(self):
+        """
+        Return the finished utterance and reset for the next one. After
+        SEG_SPLIT only the audio up to the split is returned; the rest starts
+        the next utterance, which stays open. The audio is bytes, or the
+        PCMSpool itself once it has spilled to disk.
+        """
+        audio, split = self.audio, self._split
+        self.audio = PCMSpool(self.max_memory)
+        self._recent.clear()
+        self._split = None
+        if split is None:
+            self.in_utterance = False
+            self.silence_frames = 0
+        else:
+            cut, self.start_frame = split
+            self.audio.extend(audio[cut:])
+            audio.truncate(cut)
+        if audio.spilled:
+            return audio
+        return audio[:]
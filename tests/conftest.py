@@ -0,0 +1,67 @@
+import os
+import sys
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# src/ ahead of bench/: bench scripts share names with src modules (scheduler, endpointer, ...)
+sys.path.insert(0, os.path.join(HERE, "..", "bench"))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import fake_openai  # noqa: E402
+
+
+class ScriptedOpenAI(fake_openai.FakeOpenAI):
+    """
+    bench/fake_openai.py with scripted failures: each POST takes the next
+    entry of `refusals` (None to serve it, or (status, headers)) and of
+    `slowdowns` (delay multiplier); past the end of a script it is served
+    normally.
+    """
+
+    def __init__(self, addr, args):
+        super().__init__(addr, args)
+        self.refusals = []
+        self.slowdowns = []
+
+    def admit(self):
+        with self.lock:
+            refused = self.refusals.pop(0) if self.refusals else None
+            if refused is not None:
+                self.requests["rate_limited" if refused[0] == 429 else "errors"] += 1
+        return refused
+
+    def slowdown(self) -> float:
+        with self.lock:
+            return self.slowdowns.pop(0) if self.slowdowns else 1.0
+
+
+@pytest.fixture
+def fake_openai_server():
+    args = SimpleNamespace(asr_delay=0.0, asr_rtf=0.0, ttft=0.01, tokens_per_s=0, tokens=5, jitter=0.0,
+                           rpm=0, error_rate=0.0, slow_rate=0.0, slow_factor=1.0)
+    server = ScriptedOpenAI(("127.0.0.1", 0), args)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture(scope="session")
+def flask_app(tmp_path_factory):
+    """src/app.py imported in a scratch directory (it creates data/ on import), without the SQLite index."""
+    os.environ.setdefault("AGENT_BOB_ARTIFACT_INDEX", "0")
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("app"))
+    try:
+        import app
+    finally:
+        os.chdir(cwd)
+    return app
@@ -0,0 +1,18 @@
+from artifact_writer import ArtifactWriter
+
+
+def test_append_line_reports_each_write(tmp_path):
+    writer = ArtifactWriter(fsync="never")
+    results = []
+    good = tmp_path / "a" / "chat.jsonl"
+    (tmp_path / "file").write_text("")
+    # A path under a regular file can't be created
+    bad = tmp_path / "file" / "chat.jsonl"
+    writer.append_line(str(good), "one\n", on_written=lambda ok: results.append(("one", ok)))
+    writer.append_line(str(bad), "two\n", on_written=lambda ok: results.append(("two", ok)))
+    writer.append_line(str(good), "three\n", on_written=lambda ok: results.append(("three", ok)))
+    assert writer.flush(5)
+    assert results == [("one", True), ("two", False), ("three", True)]
+    assert good.read_text() == "one\nthree\n"
+    assert writer.errors == 1
+    writer.close()
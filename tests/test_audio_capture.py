@@ -0,0 +1,89 @@
+import threading
+from types import SimpleNamespace
+
+import audio_capture
+from audio_capture import PCMRingBuffer, CaptureStats, capture_loop, CHUNK_SIZE, RATE
+
+
+def test_ring_reads_frames_in_order():
+    ring = PCMRingBuffer(16)
+    assert ring.write(bytes(range(10))) == 10
+    assert bytes(ring.read_frame(4)) == bytes(range(4))
+    assert ring.available() == 6
+    assert bytes(ring.read_frame(4)) == bytes(range(4, 8))
+
+
+def test_ring_frame_across_the_wrap_is_contiguous():
+    ring = PCMRingBuffer(10)
+    ring.write(bytes(range(8)))
+    ring.read_frame(6)
+    assert bytes(ring.read_frame(2)) == bytes(range(6, 8))
+    assert ring.write(bytes(range(8, 14))) == 6
+    # Bytes 8..13 sit at ring offsets 8..9 and 0..3
+    assert bytes(ring.read_frame(6)) == bytes(range(8, 14))
+
+
+def test_ring_drops_and_counts_what_does_not_fit():
+    ring = PCMRingBuffer(8)
+    assert ring.write(bytes(6)) == 6
+    assert ring.write(bytes(5)) == 2
+    assert ring.overflow_bytes == 3
+    assert ring.available() == 8
+
+
+def test_ring_keeps_the_lent_frame_until_the_next_read():
+    ring = PCMRingBuffer(8)
+    ring.write(b"abcdefgh")
+    frame = ring.read_frame(4)
+    # The frame is still lent out: the producer may not overwrite it
+    assert ring.write(b"XXXX") == 0
+    assert bytes(frame) == b"abcd"
+    ring.read_frame(4)
+    assert ring.write(b"XXXX") == 4
+
+
+def test_ring_read_returns_none_on_timeout_and_close():
+    ring = PCMRingBuffer(8)
+    assert ring.read_frame(4, timeout=0.01) is None
+    threading.Timer(0.05, ring.close).start()
+    assert ring.read_frame(4, timeout=5.0) is None
+
+
+class StallingStream:
+    """An input stream on a fake clock: each read advances it by one chunk, plus any scripted stall."""
+
+    def __init__(self, clock, reads, stalls):
+        self.clock = clock
+        self.reads = reads
+        self.stalls = stalls
+
+    def get_read_available(self):
+        return 0
+
+    def read(self, num_frames, exception_on_overflow=True):
+        assert not exception_on_overflow, "an overflow exception discards the chunk read"
+        if not self.reads:
+            raise EOFError
+        self.reads -= 1
+        self.clock.now += num_frames / RATE + self.stalls.pop(0)
+        return bytes(num_frames * 2)
+
+
+def test_capture_counts_overruns_and_keeps_the_audio(monkeypatch):
+    clock = SimpleNamespace(now=100.0)
+    monkeypatch.setattr(audio_capture, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    stalls = [0.0] * 10 + [1.0] + [0.0] * 10 + [0.05] + [0.0] * 9
+    reads = len(stalls)
+    stream = StallingStream(clock, reads, stalls)
+    ring = PCMRingBuffer(reads * CHUNK_SIZE * 2)
+    stats = CaptureStats()
+
+    capture_loop(stream, ring, stats, threading.Event())
+
+    # The one-second stall is an overrun; the 50 ms one is within the slack
+    assert stats.input_overflows == 1
+    assert 950 <= stats.overflow_ms <= 1050
+    assert stats.chunks_read == reads
+    assert ring.available() == reads * CHUNK_SIZE * 2
+    assert ring.overflow_bytes == 0
+    assert ring.closed
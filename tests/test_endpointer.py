@@ -0,0 +1,100 @@
+import pytest
+
+from endpointer import AdaptiveEndpointer, EndpointStats, text_cue, CUE_COMPLETE, CUE_NONE, CUE_INCOMPLETE
+from vad_frontend import UtteranceSegmenter, SEG_END
+
+
+@pytest.mark.parametrize("text, cue", [
+    ("How did you test that?", CUE_COMPLETE),
+    ("Tell me what you changed and why", CUE_COMPLETE),
+    ("You used Kafka there, right.", CUE_COMPLETE),
+    ("So tell me about the", CUE_INCOMPLETE),
+    ("We had three regions and", CUE_INCOMPLETE),
+    ("Walk me through the failover,", CUE_INCOMPLETE),
+    ("I was thinking...", CUE_INCOMPLETE),
+    ("So um", CUE_INCOMPLETE),
+    ("At the second light turn right", CUE_NONE),
+    ("The cluster was running on Kubernetes.", CUE_NONE),
+    ("Why", CUE_NONE),
+    ("", CUE_NONE),
+    (None, CUE_NONE),
+])
+def test_text_cue(text, cue):
+    assert text_cue(text) == cue
+
+
+def _endpointer(**kw):
+    return AdaptiveEndpointer(30, max_ms=1000, floor_ms=500, cue_ms=500, stats=EndpointStats(), **kw)
+
+
+def test_fixed_timer_until_enough_pauses():
+    ep = _endpointer()
+    for _ in range(7):
+        ep.observe_pause(200)
+    assert ep.threshold_ms() == 1000
+    ep.observe_pause(200)
+    # Learned pauses never end a turn before the floor
+    assert ep.threshold_ms() == 500
+
+
+def test_learned_threshold_follows_the_speaker():
+    ep = _endpointer()
+    for ms in [400, 480, 520, 560, 600, 640, 680, 720, 100]:
+        ep.observe_pause(ms)
+    # 100 ms is below min_pause_ms and not learned; 0.9 quantile is 720, times 1.25
+    assert ep.threshold_ms() == 900
+
+
+def test_text_cues_move_the_threshold():
+    ep = _endpointer()
+    assert ep.threshold_ms("Could you explain the rollout?") == 500
+    assert ep.threshold_ms("Could you explain the") == 1000
+    for _ in range(8):
+        ep.observe_pause(200)
+    # A speaker with short pauses waits less after a finished question, but not below min_cue_ms
+    assert ep.threshold_ms("Could you explain the rollout?") == 300
+    # A dangling word keeps the full timer whatever was learned
+    assert ep.threshold_ms("Could you explain the") == 1000
+
+
+def test_should_end_and_stats():
+    stats = EndpointStats()
+    ep = AdaptiveEndpointer(30, max_ms=1000, cue_ms=500, stats=stats)
+    assert not ep.should_end(10, "How did you test that?")
+    assert ep.should_end(17, "How did you test that?")
+    assert ep.ended(17)
+    assert not ep.should_end(20, "and then the")
+    assert ep.should_end(34, "and then the")
+    assert not ep.ended(34)
+    out = stats.as_dict()
+    assert out["turns"] == 2 and out["early"] == 1 and out["cue_ends"] == 1
+
+
+def test_resumed_after_an_early_end_is_a_false_split():
+    stats = EndpointStats()
+    ep = AdaptiveEndpointer(30, max_ms=1000, stats=stats, min_samples=1)
+    assert ep.resumed(650)
+    assert not ep.resumed(1500)
+    assert stats.as_dict()["false_splits"] == 1
+    # The gap is learned as a within-turn pause
+    assert ep.threshold_ms() == int(650 * 1.25)
+
+
+def test_fixed_timer_end_is_not_early_at_30ms_frames():
+    # 1000 ms is 33 frames (990 ms) to the segmenter: that close is the fixed timer, not an early one
+    stats = EndpointStats()
+    ep = AdaptiveEndpointer(30, max_ms=1000, stats=stats)
+    seg = UtteranceSegmenter(30, preroll_ms=0, end_silence_ms=1000)
+    frame = bytes(960)
+    for _ in range(10):
+        seg.push(frame, True)
+    event = None
+    while event != SEG_END:
+        event = seg.push(frame, False)
+        if event != SEG_END:
+            assert not ep.should_end(seg.silence_frames)
+    assert seg.silence_frames * 30 == 990
+    assert not ep.ended(seg.silence_frames)
+    # Speech 990 ms after an early end: the fixed timer would have closed the turn too
+    assert not ep.resumed(990)
+    assert stats.as_dict() == dict(stats.as_dict(), turns=1, early=0, cue_ends=0, false_splits=0)
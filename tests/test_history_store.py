@@ -0,0 +1,177 @@
+import json
+import os
+
+import pytest
+
+from history_store import ChatHistoryStore
+
+
+class HeldWriter:
+    """An ArtifactWriter stand-in that writes queued lines only when told to, and must never be flushed."""
+
+    def __init__(self):
+        self.queued = []
+
+    def append_line(self, path, line, on_written=None):
+        self.queued.append((path, line, on_written))
+
+    def release(self, n, ok=True):
+        """Write the next n lines, or with ok=False fail them the way ArtifactWriter reports a failed write."""
+        for path, line, on_written in self.queued[:n]:
+            if ok:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            on_written(ok)
+        del self.queued[:n]
+
+    def flush(self, timeout=None):
+        raise AssertionError("reads must not wait for the writer")
+
+
+def _turn(i):
+    return {"timestamp": f"t{i:03d}", "user": f"q{i}", "assistant": f"a{i}"}
+
+
+def _store(tmp_path, **kw):
+    return ChatHistoryStore(str(tmp_path), tail_size=5, fsync=False, **kw)
+
+
+def _seqs(turns):
+    return [t["seq"] for t in turns]
+
+
+def test_append_numbers_turns_and_keeps_a_tail(tmp_path):
+    store = _store(tmp_path)
+    assert [store.append("s1", _turn(i)) for i in range(1, 8)] == list(range(1, 8))
+    assert store.count("s1") == 7
+    assert [t["user"] for t in store.tail("s1", 3)] == ["q5", "q6", "q7"]
+    with open(store.jsonl_path("s1"), encoding="utf-8") as f:
+        assert [json.loads(line)["user"] for line in f] == [f"q{i}" for i in range(1, 8)]
+
+
+def test_page_walks_the_cursor_from_disk_into_the_tail(tmp_path):
+    store = _store(tmp_path)
+    for i in range(1, 13):
+        store.append("s1", _turn(i))
+    store.forget("s1")   # reload: turns 1-7 only on disk, 8-12 in the tail
+    seen, since = [], 0
+    while True:
+        turns, total = store.page("s1", since, 4)
+        if not turns:
+            break
+        seen += turns
+        since = turns[-1]["seq"]
+    assert total == 12
+    assert _seqs(seen) == list(range(1, 13))
+    assert [t["user"] for t in seen] == [f"q{i}" for i in range(1, 13)]
+
+
+def test_page_past_the_end(tmp_path):
+    store = _store(tmp_path)
+    store.append("s1", _turn(1))
+    assert store.page("s1", 1, 10) == ([], 1)
+    assert store.page("s1", 99, 10) == ([], 1)
+    assert store.page("other", 0, 10) == ([], 0)
+
+
+def test_reads_serve_queued_turns_without_flushing(tmp_path):
+    writer = HeldWriter()
+    store = _store(tmp_path, writer=writer)
+    for i in range(1, 13):
+        store.append("s1", _turn(i))
+    writer.release(6)
+    # 1-6 written, 7-12 still queued; the tail only covers 8-12
+    turns, total = store.page("s1", 2, 8)
+    assert total == 12
+    assert _seqs(turns) == list(range(3, 11))
+    assert [t["user"] for t in turns] == [f"q{i}" for i in range(3, 11)]
+    assert _seqs(store.page("s1", 0, 3)[0]) == [1, 2, 3]
+    assert [t["user"] for t in store.read_all("s1")] == [f"q{i}" for i in range(1, 13)]
+
+    writer.release(6)
+    store.forget("s1")
+    assert [t["user"] for t in store.read_all("s1")] == [f"q{i}" for i in range(1, 13)]
+
+
+def test_failed_write_is_not_served_as_persisted(tmp_path):
+    writer = HeldWriter()
+    store = _store(tmp_path, writer=writer)
+    for i in range(1, 5):
+        store.append("s1", _turn(i))
+    writer.release(3)
+    writer.release(1, ok=False)
+    # Turn 4 never reached the file: reads reflect the file, not the lost turn
+    assert [t["user"] for t in store.tail("s1", 5)] == ["q1", "q2", "q3"]
+    assert store.count("s1") == 3
+    assert store.append("s1", _turn(5)) == 4
+    turns, total = store.page("s1", 0, 10)
+    assert total == 4
+    assert [t["user"] for t in turns] == ["q1", "q2", "q3", "q5"]
+    assert [t["user"] for t in store.read_all("s1")] == ["q1", "q2", "q3", "q5"]
+    writer.release(1)
+    store.forget("s1")
+    assert [t["user"] for t in store.page("s1", 2, 10)[0]] == ["q3", "q5"]
+
+
+def test_torn_last_line_is_repaired(tmp_path):
+    store = _store(tmp_path)
+    store.append("s1", _turn(1))
+    with open(store.jsonl_path("s1"), "a", encoding="utf-8") as f:
+        f.write('{"user": "half')
+    store.forget("s1")
+    assert store.append("s1", _turn(2)) == 2
+    assert [t["user"] for t in store.read_all("s1")] == ["q1", "q2"]
+
+
+def test_legacy_chat_json_is_imported(tmp_path):
+    store = _store(tmp_path)
+    (tmp_path / "s1").mkdir()
+    (tmp_path / "s1" / "chat.json").write_text(json.dumps([_turn(2), _turn(1)]))
+    assert [t["user"] for t in store.read_all("s1")] == ["q1", "q2"]
+    assert store.count("s1") == 2
+
+
+@pytest.fixture
+def history_client(flask_app, tmp_path, monkeypatch):
+    monkeypatch.setattr(flask_app, "history_store", _store(tmp_path))
+    return flask_app.app.test_client(), flask_app.history_store
+
+
+def test_chat_history_cursor(history_client):
+    client, store = history_client
+    for i in range(1, 8):
+        store.append("s1", _turn(i))
+    headers = {"X-Session-Id": "s1"}
+    body = client.get("/chat_history?limit=3", headers=headers).get_json()
+    assert _seqs(body["turns"]) == [1, 2, 3]
+    assert (body["next"], body["total"], body["has_more"]) == (3, 7, True)
+    body = client.get(f"/chat_history?since={body['next']}&limit=10", headers=headers).get_json()
+    assert _seqs(body["turns"]) == [4, 5, 6, 7]
+    assert (body["next"], body["has_more"]) == (7, False)
+    body = client.get("/chat_history?since=7", headers=headers).get_json()
+    assert (body["turns"], body["next"], body["has_more"]) == ([], 7, False)
+
+
+def test_chat_history_etag(history_client):
+    client, store = history_client
+    store.append("s1", _turn(1))
+    headers = {"X-Session-Id": "s1"}
+    first = client.get("/chat_history", headers=headers)
+    etag = first.headers["ETag"]
+    assert etag == '"s1-1"'
+    again = client.get("/chat_history", headers=dict(headers, **{"If-None-Match": etag}))
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    store.append("s1", _turn(2))
+    changed = client.get("/chat_history", headers=dict(headers, **{"If-None-Match": etag}))
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] == '"s1-2"'
+    assert changed.get_json()["total"] == 2
+
+
+def test_chat_history_rejects_bad_input(history_client):
+    client, _ = history_client
+    assert client.get("/chat_history").status_code == 400
+    assert client.get("/chat_history", headers={"X-Session-Id": "../etc"}).status_code == 400
+    assert client.get("/chat_history?since=x", headers={"X-Session-Id": "s1"}).status_code == 400
@@ -0,0 +1,66 @@
+import numpy as np
+
+from incremental_asr import stitch, transcribe_long
+from utterance_buffer import PCMSpool
+
+
+def test_stitch_removes_the_repeated_words():
+    assert stitch("tell me about the", "about the last outage") == "tell me about the last outage"
+
+
+def test_stitch_ignores_case_and_punctuation():
+    assert stitch("How did you test that,", "That? And the rollout.") == "How did you test that, And the rollout."
+
+
+def test_stitch_prefers_the_longest_overlap():
+    assert stitch("a b a b", "a b a b c") == "a b a b c"
+
+
+def test_stitch_without_overlap_or_text():
+    assert stitch("first part", "second part") == "first part second part"
+    assert stitch("", " only right ") == "only right"
+    assert stitch("only left", "") == "only left"
+    assert stitch("same words", "same words") == "same words"
+
+
+def test_stitch_overlap_is_bounded():
+    left = " ".join(f"w{i}" for i in range(12))
+    # Overlap longer than max_overlap_words is not looked for
+    assert stitch(left, left, max_overlap_words=4) == left + " " + left
+
+
+def _blocks(n, block):
+    """PCM whose sample values are the index of their `block`-sample block."""
+    return np.repeat(np.arange(n, dtype='<i2'), block).tobytes()
+
+
+def _words(pcm, rate):
+    """A transcriber that hears one word per block of _blocks()."""
+    samples = np.frombuffer(pcm, dtype='<i2')
+    return " ".join(f"w{i}" for i in dict.fromkeys(samples.tolist()))
+
+
+def test_transcribe_long_stitches_overlapping_windows():
+    calls = []
+
+    def transcribe(pcm, rate):
+        calls.append(len(pcm))
+        return _words(pcm, rate)
+
+    # 1000 Hz: 1 s windows are 2000 bytes; 100 ms of overlap is one block
+    pcm = _blocks(25, 100)
+    text = transcribe_long(pcm, 1000, transcribe, window_ms=1000, overlap_ms=100)
+    assert text == " ".join(f"w{i}" for i in range(25))
+    assert calls == [2000, 2200, 1200]
+
+
+def test_transcribe_long_reads_a_spilled_spool_window_by_window():
+    spool = PCMSpool(max_memory=1000)
+    spool.extend(_blocks(25, 100))
+    assert spool.spilled
+    text = transcribe_long(spool, 1000, _words, window_ms=1000, overlap_ms=100)
+    assert text == " ".join(f"w{i}" for i in range(25))
+
+
+def test_transcribe_long_short_audio_is_one_call():
+    assert transcribe_long(_blocks(3, 100), 1000, _words, window_ms=1000) == "w0 w1 w2"
@@ -0,0 +1,180 @@
+import threading
+import time
+
+import openai
+import pytest
+
+import llm
+import openai_client
+from scheduler import OpenAIScheduler, TokenBucket, PRIORITY_INTERACTIVE, PRIORITY_SPECULATIVE, parse_reset
+
+
+def _client(server):
+    return openai.OpenAI(api_key="sk-test", base_url=server.base_url, max_retries=0)
+
+
+def _chat(client):
+    return client.chat.completions.create(
+        model="gpt-3.5-turbo", messages=[{"role": "user", "content": "hi"}]).choices[0].message.content
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_parse_reset():
+    assert parse_reset("1s") == 1.0
+    assert parse_reset("6m0s") == 360.0
+    assert parse_reset("20ms") == pytest.approx(0.02)
+    assert parse_reset("2.5") == 2.5
+    assert parse_reset("") is None
+    assert parse_reset("soon") is None
+
+
+def test_retries_5xx_until_served(fake_openai_server):
+    fake_openai_server.refusals = [(503, {}), (503, {})]
+    sched = OpenAIScheduler(max_concurrency=2, max_retries=3, backoff_base=0.001)
+    client = _client(fake_openai_server)
+
+    assert sched.call("llm", lambda: _chat(client))
+    stats = sched.stats()["kinds"]["llm"]
+    assert (stats["requests"], stats["attempts"], stats["retries"], stats["errors"]) == (1, 3, 2, 0)
+    assert fake_openai_server.requests["errors"] == 2
+    assert fake_openai_server.requests["chat"] == 1
+
+
+def test_gives_up_after_max_retries(fake_openai_server):
+    fake_openai_server.refusals = [(503, {})] * 5
+    sched = OpenAIScheduler(max_concurrency=2, max_retries=2, backoff_base=0.001)
+    client = _client(fake_openai_server)
+
+    with pytest.raises(openai.InternalServerError):
+        sched.call("llm", lambda: _chat(client))
+    stats = sched.stats()["kinds"]["llm"]
+    assert (stats["attempts"], stats["retries"], stats["errors"]) == (3, 2, 1)
+    assert sched.stats()["in_flight"] == 0
+
+
+def test_client_errors_are_not_retried(fake_openai_server):
+    fake_openai_server.refusals = [(400, {})]
+    sched = OpenAIScheduler(max_concurrency=2, max_retries=3, backoff_base=0.001)
+    client = _client(fake_openai_server)
+
+    with pytest.raises(openai.BadRequestError):
+        sched.call("llm", lambda: _chat(client))
+    assert sched.stats()["kinds"]["llm"]["attempts"] == 1
+
+
+def test_429_honours_retry_after(fake_openai_server):
+    fake_openai_server.refusals = [(429, {"retry-after-ms": "300", "x-ratelimit-reset-requests": "300ms",
+                                          "x-ratelimit-reset-tokens": "300ms"})]
+    budget = {"requests": TokenBucket(600), "tokens": TokenBucket(0)}
+    sched = OpenAIScheduler(max_concurrency=2, max_retries=3, backoff_base=0.001, budgets={"llm": budget})
+    client = _client(fake_openai_server)
+
+    start, start_mono = time.perf_counter(), time.monotonic()
+    assert sched.call("llm", lambda: _chat(client))
+    assert time.perf_counter() - start >= 0.3
+    # The bucket was emptied until the reset the server reported
+    assert budget["requests"].blocked_until >= start_mono + 0.3
+    stats = sched.stats()["kinds"]["llm"]
+    assert (stats["rate_limited"], stats["retries"], stats["errors"]) == (1, 1, 0)
+
+
+def test_hedge_wins_over_a_slow_request(fake_openai_server):
+    sched = OpenAIScheduler(max_concurrency=4, hedge=True, hedge_min=0.05, backoff_base=0.001)
+    client = _client(fake_openai_server)
+    # No hedging until the scheduler has seen enough latencies to know the p95
+    for _ in range(20):
+        sched.call("llm", lambda: _chat(client))
+    assert sched.stats()["kinds"]["llm"]["hedges"] == 0
+
+    fake_openai_server.slowdowns = [100.0]      # the next request takes a second to answer
+    start = time.perf_counter()
+    assert sched.call("llm", lambda: _chat(client))
+    assert time.perf_counter() - start < 0.5
+    stats = sched.stats()["kinds"]["llm"]
+    assert (stats["hedges"], stats["hedge_wins"]) == (1, 1)
+
+
+def test_interactive_requests_go_before_speculative(fake_openai_server):
+    sched = OpenAIScheduler(max_concurrency=1)
+    client = _client(fake_openai_server)
+    gate = threading.Event()
+    order = []
+
+    def request(name):
+        def fn():
+            order.append(name)
+            return _chat(client)
+        return fn
+
+    def hold():
+        gate.wait(5)
+        return _chat(client)
+
+    threads = [threading.Thread(target=sched.call, args=("llm", hold))]
+    threads[0].start()
+    _wait_for(lambda: sched.stats()["in_flight"] == 1)
+    for i, (name, priority) in enumerate([("speculative-1", PRIORITY_SPECULATIVE),
+                                          ("speculative-2", PRIORITY_SPECULATIVE),
+                                          ("interactive", PRIORITY_INTERACTIVE)]):
+        t = threading.Thread(target=sched.call, args=("llm", request(name)),
+                             kwargs={"priority": priority, "session_id": f"s{i}"})
+        t.start()
+        threads.append(t)
+        _wait_for(lambda: sched.stats()["queued"] == i + 1)
+    gate.set()
+    for t in threads:
+        t.join(5)
+    assert order == ["interactive", "speculative-1", "speculative-2"]
+
+
+def test_busy_session_yields_to_others(fake_openai_server):
+    sched = OpenAIScheduler(max_concurrency=2)
+    client = _client(fake_openai_server)
+    hold_a, hold_x, order = threading.Event(), threading.Event(), []
+
+    def held(gate):
+        def fn():
+            gate.wait(5)
+            return _chat(client)
+        return fn
+
+    def request(name):
+        def fn():
+            order.append(name)
+            return _chat(client)
+        return fn
+
+    threads = [threading.Thread(target=sched.call, args=("llm", held(hold_a)), kwargs={"session_id": "a"}),
+               threading.Thread(target=sched.call, args=("llm", held(hold_x)), kwargs={"session_id": "x"})]
+    for t in threads:
+        t.start()
+    _wait_for(lambda: sched.stats()["in_flight"] == 2)
+    for i, session in enumerate(["a", "b"]):
+        t = threading.Thread(target=sched.call, args=("llm", request(session)), kwargs={"session_id": session})
+        t.start()
+        threads.append(t)
+        _wait_for(lambda: sched.stats()["queued"] == i + 1)
+    # One slot frees up while session a still has a request in flight: b arrived later but goes first
+    hold_x.set()
+    _wait_for(lambda: order)
+    hold_a.set()
+    for t in threads:
+        t.join(5)
+    assert order == ["b", "a"]
+
+
+def test_get_llm_response_returns_text_or_tokens(fake_openai_server):
+    openai_client.configure(base_url=fake_openai_server.base_url, max_retries=0)
+    try:
+        text = llm.get_llm_response("hi", stream=False)
+        assert isinstance(text, str) and text
+        tokens = list(llm.get_llm_response("hi", stream=True))
+        assert "".join(tokens) == text
+    finally:
+        openai_client.configure()
@@ -0,0 +1,53 @@
+import pytest
+
+from speculation import SpeculationStats, SpeculativeAnswer, similarity
+
+
+class ScriptedStream:
+    """An LLMStream stand-in: yields `tokens`, then raises `error` if given."""
+
+    def __init__(self, tokens, error=None):
+        self.tokens = tokens
+        self.error = error
+        self.cancelled = False
+
+    def __iter__(self):
+        yield from self.tokens
+        if self.error is not None:
+            raise self.error
+
+    def cancel(self):
+        self.cancelled = True
+
+
+def _answer(tokens, error=None):
+    return SpeculativeAnswer("How did you test that", "prompt",
+                             stream_factory=lambda prompt: ScriptedStream(tokens, error), stats=SpeculationStats())
+
+
+def test_similarity():
+    assert similarity("How did you test that?", "how did you test that") == 1.0
+    assert similarity("", "") == 1.0
+    assert similarity("How did you test that", "Why did you pick Kafka") < 0.5
+
+
+def test_release_yields_the_whole_answer():
+    answer = _answer(["We ", "used ", "canaries."])
+    assert "".join(answer.release()) == "We used canaries."
+    assert answer.stats.as_dict()["hits"] == 1
+
+
+def test_release_raises_a_failure_mid_answer():
+    answer = _answer(["We ", "used "], RuntimeError("stream reset"))
+    got = []
+    with pytest.raises(RuntimeError, match="stream reset"):
+        for token in answer.release():
+            got.append(token)
+    # The tokens before the failure were delivered, but the answer is not passed off as complete
+    assert got == ["We ", "used "]
+
+
+def test_release_raises_a_failure_before_any_token():
+    answer = _answer([], RuntimeError("refused"))
+    with pytest.raises(RuntimeError, match="refused"):
+        list(answer.release())
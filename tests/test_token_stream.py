@@ -0,0 +1,49 @@
+import threading
+import time
+
+from token_stream import CoalesceStats, TokenCoalescer
+
+
+def _coalescer(**kw):
+    frames = []
+    return TokenCoalescer(frames.append, stats=CoalesceStats(), **kw), frames
+
+
+def test_frames_flush_at_max_chars():
+    c, frames = _coalescer(max_delay=60, max_chars=6)
+    for token in ["ab", "cd", "ef", "g"]:
+        c.push(token)
+    assert frames == [{'token': "abcdef", 'seq': 0}]
+    assert c.close() == 2
+    assert frames[-1] == {'token': "g", 'seq': 1}
+    assert c.stats.as_dict() == {"tokens": 4, "frames": 2, "tokens_per_frame": 2.0}
+
+
+def test_stalled_stream_is_flushed_by_the_deadline():
+    c, frames = _coalescer(max_delay=0.02, max_chars=1000)
+    c.push("Hel")
+    c.push("lo")
+    deadline = time.monotonic() + 2
+    while not frames and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert frames == [{'token': "Hello", 'seq': 0}]
+    c.push(" there")
+    assert c.close() == 2
+    assert frames[-1] == {'token': " there", 'seq': 1}
+
+
+def test_windows_do_not_start_threads(monkeypatch):
+    c, frames = _coalescer(max_delay=0.001, max_chars=1000)
+    c.push("warm")
+    time.sleep(0.05)
+    started = []
+    start = threading.Thread.start
+    monkeypatch.setattr(threading.Thread, "start", lambda self: started.append(self) or start(self))
+    for i in range(50):
+        c.push(f"t{i} ")
+        time.sleep(0.002)
+    c.close()
+    assert started == []
+    assert "".join(f["token"] for f in frames) == "warm" + "".join(f"t{i} " for i in range(50))
+    assert [f["seq"] for f in frames] == list(range(len(frames)))
+    assert len(frames) > 10
@@ -0,0 +1,82 @@
+import pytest
+
+from utterance_buffer import PCMSpool, BufferStats
+from vad_frontend import UtteranceSegmenter, SEG_START, SEG_END
+
+
+def test_spool_stays_in_memory_under_the_cap():
+    spool = PCMSpool(max_memory=10)
+    spool.extend(b"abcd")
+    spool.extend(b"efgh")
+    assert not spool.spilled
+    assert spool.memory_bytes == 8 and spool.spilled_bytes == 0
+    assert spool[:] == b"abcdefgh"
+
+
+def test_spool_spills_to_disk_past_the_cap():
+    spool = PCMSpool(max_memory=10)
+    spool.extend(b"abcdefgh")
+    spool.extend(b"ijkl")
+    assert spool.spilled
+    assert spool.memory_bytes == 0 and spool.spilled_bytes == 12
+    assert len(spool) == 12
+    assert spool[:] == b"abcdefghijkl"
+    assert spool[6:10] == b"ghij"
+    assert spool[-2:] == b"kl"
+    assert spool[5:5] == b""
+    assert list(spool.chunks(5)) == [b"abcde", b"fghij", b"kl"]
+    spool.close()
+    assert len(spool) == 0 and not spool.spilled
+
+
+def test_spool_without_a_cap_never_spills():
+    spool = PCMSpool()
+    spool.extend(bytes(1 << 20))
+    assert not spool.spilled
+
+
+@pytest.mark.parametrize("cap", [None, 4])
+def test_spool_truncate(cap):
+    spool = PCMSpool(max_memory=cap)
+    spool.extend(b"abcdefgh")
+    spool.truncate(3)
+    spool.extend(b"XY")
+    assert spool[:] == b"abcXY"
+
+
+def test_spool_rejects_indexing_and_strides():
+    spool = PCMSpool()
+    spool.extend(b"abcd")
+    with pytest.raises(TypeError):
+        spool[0]
+    with pytest.raises(TypeError):
+        spool[::2]
+
+
+def test_segmenter_hands_over_a_spilled_utterance():
+    frame = b"\x01\x00" * 240
+    seg = UtteranceSegmenter(30, preroll_ms=0, end_silence_ms=90, max_memory=len(frame) * 4)
+    events = [seg.push(frame, True) for _ in range(10)]
+    assert events[0] == SEG_START
+    assert seg.audio.spilled
+    while seg.push(bytes(len(frame)), False) != SEG_END:
+        pass
+    audio = seg.take()
+    assert isinstance(audio, PCMSpool)
+    assert audio[:len(frame) * 10] == frame * 10
+    assert not seg.audio.spilled and len(seg.audio) == 0
+
+
+def test_buffer_stats_reads_live_gauges():
+    stats = BufferStats()
+    spool = PCMSpool(max_memory=4)
+    stats.register("conn", lambda: (spool.memory_bytes, spool.spilled_bytes), 4)
+    spool.extend(b"abcdef")
+    stats.record_spill(6)
+    out = stats.as_dict()
+    assert out["connections"] == 1
+    assert out["memory_cap_bytes"] == 4
+    assert out["spills"] == 1 and out["spilled_bytes_total"] == 6
+    assert out["memory_bytes"] == 0 and out["spilled_bytes"] == 6
+    stats.unregister("conn")
+    assert stats.as_dict()["connections"] == 0
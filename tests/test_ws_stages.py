@@ -0,0 +1,59 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from metrics import StageMetrics, Trace
+from pipeline import Segment
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.paths = []
+
+    def write_wav(self, path, pcm, sample_rate):
+        self.paths.append(path)
+
+    write_text = write_json = write_bytes = write_wav
+
+
+@pytest.fixture
+def stages(flask_app, monkeypatch):
+    writer = RecordingWriter()
+    monkeypatch.setattr(flask_app, "artifacts", writer)
+    monkeypatch.setattr(flask_app, "archive", None)
+    return flask_app, writer
+
+
+def _segment(text, final):
+    seg = Segment("s1", 16000, bytes(3200), trace=Trace("s1", "ws-audio", metrics=StageMetrics()),
+                  queued_at=time.perf_counter(), retracted=False, final=threading.Event(),
+                  speculative=None, transcriber=SimpleNamespace(finish=lambda: text, cancel=lambda: None))
+    if final:
+        seg.final.set()
+    return seg
+
+
+def test_asr_stage_leaves_the_recording_to_the_persist_stage(stages):
+    app, writer = stages
+    seg = _segment("How did you test that?", final=True)
+    assert app.ws_asr_stage(seg) is seg
+    assert writer.paths == []
+
+
+def test_retracted_segment_is_never_written(stages):
+    app, writer = stages
+    seg = _segment("So tell me about", final=False)
+    app.ws_asr_stage(seg)
+    done = []
+    persist = threading.Thread(target=lambda: done.append(app.ws_persist_stage(seg)))
+    persist.start()
+    persist.join(0.1)
+    # Still retractable: the persist stage waits for the next onset to settle it
+    assert persist.is_alive()
+    seg.retracted = True
+    seg.final.set()
+    persist.join(5)
+    assert done == [None]
+    assert writer.paths == []